@@ -5,7 +5,8 @@ from langchain.memory import ConversationBufferMemory
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.tools import Tool
 import os
-from langchain_community.llms import LlamaCpp
+
+from local_llm import make_llm, server_url
 import wikipedia
 
 # Load environment variables
@@ -13,11 +14,11 @@ load_dotenv()
 
 # Get model path
 model_path = os.getenv("MODEL_PATH")
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
 # Initialize LLM with a smaller max_tokens to avoid context overflow
-llm = LlamaCpp(
+llm = make_llm(
     model_path=model_path,
     temperature=0.3,
     max_tokens=100,  # Further reduced for safety
@@ -1,12 +1,13 @@
 from langchain.prompts import PromptTemplate
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain_core.tools import Tool
-from langchain_community.llms import LlamaCpp
 from langchain.agents.output_parsers import ReActSingleInputOutputParser
 import datetime
 import os
 from dotenv import load_dotenv
 
+from local_llm import make_llm, server_url
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -14,12 +15,12 @@ load_dotenv()
 model_path = os.getenv("MODEL_PATH")
 
 # Check if the model path is loaded correctly
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
 print(f"Model path loaded: {model_path}")
 
-llm = LlamaCpp(
+llm = make_llm(
     model_path=model_path,
     temperature=0.3,  # Lower temperature for deterministic output
     max_tokens=200,
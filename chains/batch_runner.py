@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import time
+
+DEFAULT_CHUNK_SIZE = 32
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+def input_fingerprint(item):
+    """Stable hash of an input, so a resumed run can tell whether the inputs changed."""
+    payload = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_checkpoint(checkpoint_path, fingerprints):
+    """Return ``{index: record}`` of finished items whose input is unchanged.
+
+    Later lines win, so an item that failed and then succeeded on a resumed
+    run counts as done.
+    """
+    done = {}
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write leaves a partial last line
+                continue
+            index = record.get("index")
+            if isinstance(index, int) and index < len(fingerprints):
+                if record.get("input") == fingerprints[index]:
+                    done[index] = record
+    return done
+
+
+def _error_text(error):
+    return f"{type(error).__name__}: {error}"
+
+
+def run_batch(
+    chain,
+    inputs,
+    checkpoint_path=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    retry_errors=True,
+    config=None,
+    on_progress=None,
+):
+    """Run a chain over many inputs, in input order, isolating failures and checkpointing.
+
+    Inputs go through ``chain.batch`` ``chunk_size`` at a time with
+    ``max_concurrency`` bounding each step's parallelism. A
+    ``RunnableSequence`` batches step by step, so the model step receives the
+    whole chunk at once: ``BaseLLM.batch`` makes one ``generate`` call per
+    ``max_concurrency`` prompts, which the shared model server
+    (``local_llm``, ``LLM_SERVER_URL``) decodes as one batch. A local
+    ``LlamaCpp`` still generates them one after another. Pass a model without
+    streaming callbacks, or the answers interleave on the terminal.
+
+    A failing item does not fail the run: its result is the exception. When an
+    exception took down a whole model call, the chunk's failed items are
+    retried one at a time to find the ones actually at fault.
+
+    With ``checkpoint_path``, every finished item is appended to a JSONL file
+    (``index``, ``input`` fingerprint, ``output`` or ``error``), and a rerun
+    skips the items already done with unchanged input (failed ones too unless
+    ``retry_errors``). Resumed results come back as stored in the checkpoint.
+    Returns the results in input order.
+    """
+    inputs = list(inputs)
+    fingerprints = [input_fingerprint(item) for item in inputs]
+    done = load_checkpoint(checkpoint_path, fingerprints)
+    results = [None] * len(inputs)
+    for index, record in done.items():
+        if "error" in record and retry_errors:
+            continue
+        results[index] = (
+            RuntimeError(record["error"]) if "error" in record else record.get("output")
+        )
+    pending = [
+        i for i in range(len(inputs)) if i not in done or ("error" in done[i] and retry_errors)
+    ]
+
+    config = dict(config or {})
+    config["max_concurrency"] = max_concurrency
+    checkpoint = None
+    if checkpoint_path:
+        os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+        checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+    started = time.perf_counter()
+    finished = 0
+    try:
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            outputs = chain.batch([inputs[i] for i in chunk], config, return_exceptions=True)
+            failed = [n for n, output in enumerate(outputs) if isinstance(output, Exception)]
+            if len(chunk) > 1 and len(failed) > 1:
+                for n in failed:
+                    outputs[n] = chain.batch([inputs[chunk[n]]], config, return_exceptions=True)[0]
+
+            for i, output in zip(chunk, outputs):
+                results[i] = output
+                if checkpoint is None:
+                    continue
+                record = {"index": i, "input": fingerprints[i]}
+                if isinstance(output, Exception):
+                    record["error"] = _error_text(output)
+                else:
+                    record["output"] = output
+                checkpoint.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            if checkpoint is not None:
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+            finished += len(chunk)
+            if on_progress is not None:
+                on_progress(finished, len(pending), time.perf_counter() - started)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    return results
+
+
+def print_progress(finished, total, seconds):
+    rate = finished / seconds if seconds else 0.0
+    print(f"{finished}/{total} done ({rate:.2f} items/s)")
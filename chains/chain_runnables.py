@@ -1,10 +1,12 @@
 from langchain.prompts import ChatPromptTemplate
-from langchain_community.llms.llamacpp import LlamaCpp
 from langchain_core.callbacks import CallbackManager, StreamingStdOutCallbackHandler
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnableLambda, RunnableSequence
 import os
 from dotenv import load_dotenv
 
+from local_llm import configure_llm_cache, make_llm, server_url
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -12,14 +14,14 @@ load_dotenv()
 model_path = os.getenv("MODEL_PATH")
 
 # Check if the model path is loaded correctly
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
 print(f"Model path loaded: {model_path}")
 
 callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
 
-llm = LlamaCpp(
+llm = make_llm(
     model_path=model_path,
     temperature=0.5,
     max_tokens=500,
@@ -28,6 +30,8 @@ llm = LlamaCpp(
     streaming=True
 )
 
+llm_cache = configure_llm_cache()
+
 # Define messages for the ChatPromptTemplate
 messages = [
     ('system', "You are a system design expert."),
@@ -39,11 +43,45 @@ prompt_template = ChatPromptTemplate.from_messages(messages)
 
 # Define the chain components
 format_prompt = RunnableLambda(lambda x: prompt_template.format(**x))
-invoke_model = RunnableLambda(lambda x: llm.invoke([x]))
-parse_output = RunnableLambda(lambda x: x[0])  # Assuming LlamaCpp outputs a list of responses
+# Same call as llm.invoke([x]), but as a sequence ending in the LLM itself, so a batch
+# of prompts reaches the model as one generate call instead of one call per prompt
+invoke_model = RunnableLambda(lambda x: [x]) | llm
+# The LLM returns the completion as a single string; x[0] would keep only its first character
+parse_output = StrOutputParser()
 
 # Build the chain
 chain = RunnableSequence(first=format_prompt, middle=[invoke_model], last=parse_output)
 
 # Invoke the chain
 response = chain.invoke({"design_question": "to build a website"})
+
+# Optionally (DESIGN_QUESTIONS=questions.txt, one per line) run the chain over a file
+# of questions; finished items are checkpointed so an interrupted run resumes
+questions_path = os.getenv("DESIGN_QUESTIONS")
+if questions_path:
+    from batch_runner import print_progress, run_batch
+
+    with open(questions_path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    # Same model without token streaming or the stdout handler, so answers are not
+    # interleaved on the terminal (the copy shares the already loaded model)
+    batch_llm = llm.model_copy(update={"streaming": False, "callbacks": None})
+    batch_chain = RunnableSequence(
+        first=format_prompt,
+        middle=[RunnableLambda(lambda x: [x]) | batch_llm],
+        last=parse_output,
+    )
+    if not server_url():
+        # LlamaCpp generates the prompts of a batch one after another
+        print("Note: questions are decoded one at a time; set LLM_SERVER_URL to batch them.")
+    results = run_batch(
+        batch_chain,
+        [{"design_question": question} for question in questions],
+        checkpoint_path=questions_path + ".checkpoint.jsonl",
+        on_progress=print_progress,
+    )
+    failures = sum(isinstance(result, Exception) for result in results)
+    print(f"Answered {len(results) - failures} of {len(results)} questions ({failures} failed)")
+
+if llm_cache is not None:
+    print(f"LLM cache: {llm_cache.stats()}")
@@ -1,9 +1,10 @@
-from langchain_community.llms import LlamaCpp
 from langchain_core.callbacks import CallbackManager, StreamingStdOutCallbackHandler
 from langchain_core.prompts import PromptTemplate
 import os
 from dotenv import load_dotenv
 
+from local_llm import make_llm, server_url
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -11,7 +12,7 @@ load_dotenv()
 model_path = os.getenv("MODEL_PATH")
 
 # Check if the model path is loaded correctly
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
 print(f"Model path loaded: {model_path}")
@@ -27,7 +28,7 @@ Answer: Let's work this out in a step by step way to be sure we have the right a
 prompt = PromptTemplate.from_template(template)
 
 # Initialize the LLM 
-llm = LlamaCpp(
+llm = make_llm(
     model_path=model_path,
     temperature=0.75,
     max_tokens=13000,
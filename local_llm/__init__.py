@@ -0,0 +1,19 @@
+"""Shared local model server and the LangChain client that talks to it.
+
+Start the server once (``python -m local_llm.server``), set ``LLM_SERVER_URL``
+and every script built with ``make_llm`` sends its completions there instead
+of loading its own copy of the model. ``configure_llm_cache`` (``LLM_CACHE=1``)
+adds a persistent response cache in front of either.
+"""
+
+from local_llm.client import DEFAULT_SERVER_URL, LocalServerLLM, make_llm, server_url
+from local_llm.response_cache import SQLiteResponseCache, configure_llm_cache
+
+__all__ = [
+    "DEFAULT_SERVER_URL",
+    "LocalServerLLM",
+    "SQLiteResponseCache",
+    "configure_llm_cache",
+    "make_llm",
+    "server_url",
+]
@@ -0,0 +1,226 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Iterator
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from pydantic import PrivateAttr
+
+DEFAULT_SERVER_URL = "http://127.0.0.1:8090"
+# /health is local and cheap; a server that does not answer this fast is down
+HEALTH_TIMEOUT = 5.0
+# Seconds a /health answer is reused; one generate call reads it several times
+MODEL_TTL = 2.0
+
+
+def server_url():
+    """The shared model server to use (``LLM_SERVER_URL``), or None to load the model locally."""
+    return os.getenv("LLM_SERVER_URL")
+
+
+class LocalServerLLM(LLM):
+    """LangChain LLM that sends completions to a shared ``local_llm.server`` process.
+
+    Takes the same sampling parameters as ``LlamaCpp``, so chains, agents and
+    streaming callbacks work unchanged, but the model is loaded once in the
+    server instead of in every script. ``batch()`` calls and other multi-prompt
+    generations go out as one request, which the server decodes in a single
+    batch.
+    """
+
+    base_url: str = DEFAULT_SERVER_URL
+    temperature: float = 0.8
+    max_tokens: int | None = 256
+    top_p: float = 0.95
+    top_k: int = 40
+    repeat_penalty: float = 1.1
+    stop: list[str] | None = None
+    seed: int | None = None
+    streaming: bool = False
+    timeout: float = 600.0
+
+    # (monotonic time of the last /health check, model it reported)
+    _served: tuple = PrivateAttr(default=(None, None))
+
+    @property
+    def _llm_type(self):
+        return "local_llm_server"
+
+    def served_model(self):
+        """File name of the model the server has loaded (``/health``), or None if it is unreachable.
+
+        Re-checked once ``MODEL_TTL`` has passed rather than remembered for good,
+        so restarting the server with another GGUF changes the LLM string the
+        response cache keys on.
+        """
+        checked_at, model = self._served
+        if checked_at is not None and time.monotonic() - checked_at < MODEL_TTL:
+            return model
+        try:
+            with urllib.request.urlopen(
+                f"{self.base_url.rstrip('/')}/health", timeout=HEALTH_TIMEOUT
+            ) as response:
+                model = json.loads(response.read()).get("model")
+        except (OSError, ValueError):
+            model = None
+        self._served = (time.monotonic(), model)
+        return model
+
+    def _uncached(self):
+        # Without a model name, responses of different models would share cache keys
+        if self.cache is not False and self.served_model() is None:
+            return self.model_copy(update={"cache": False})
+        return None
+
+    def generate(self, prompts, stop=None, callbacks=None, **kwargs):
+        uncached = self._uncached()
+        if uncached is not None:
+            return uncached.generate(prompts, stop, callbacks, **kwargs)
+        return super().generate(prompts, stop, callbacks, **kwargs)
+
+    async def agenerate(self, prompts, stop=None, callbacks=None, **kwargs):
+        uncached = self._uncached()
+        if uncached is not None:
+            return await uncached.agenerate(prompts, stop, callbacks, **kwargs)
+        return await super().agenerate(prompts, stop, callbacks, **kwargs)
+
+    @property
+    def _identifying_params(self):
+        return {
+            "base_url": self.base_url,
+            "model": self.served_model(),
+            "seed": self.seed,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "repeat_penalty": self.repeat_penalty,
+        }
+
+    def _payload(self, prompt, stop, **kwargs):
+        if self.stop and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        payload = {
+            "prompt": prompt,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "repeat_penalty": self.repeat_penalty,
+            "stop": self.stop or stop or [],
+            "seed": self.seed,
+        }
+        payload.update(kwargs)
+        return payload
+
+    def _post(self, payload):
+        request = urllib.request.Request(
+            f"{self.base_url.rstrip('/')}/v1/completions",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error")
+            except ValueError:
+                message = None
+            raise RuntimeError(
+                f"Model server returned HTTP {e.code}: {message or e.reason}"
+            ) from None
+
+    def get_num_tokens(self, text):
+        """Count tokens with the served model's tokenizer (``/tokenize``)."""
+        request = urllib.request.Request(
+            f"{self.base_url.rstrip('/')}/tokenize",
+            data=json.dumps({"content": text}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())["counts"][0]
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return self._generate([prompt], stop, run_manager, **kwargs).generations[0][0].text
+
+    def _generate(self, prompts, stop=None, run_manager=None, **kwargs):
+        if self.streaming and len(prompts) == 1:
+            text = ""
+            finish_reason = None
+            for chunk in self._stream(prompts[0], stop, run_manager, **kwargs):
+                text += chunk.text
+                finish_reason = (chunk.generation_info or {}).get("finish_reason", finish_reason)
+            info = {"finish_reason": finish_reason}
+            return LLMResult(generations=[[Generation(text=text, generation_info=info)]])
+
+        # Every prompt in one request, so the server batches them together
+        with self._post(self._payload(prompts, stop, **kwargs)) as response:
+            body = json.loads(response.read())
+        choices = sorted(body["choices"], key=lambda choice: choice["index"])
+        if any(choice["finish_reason"] == "error" for choice in choices):
+            raise RuntimeError("Model server failed while decoding; see the server log")
+        generations = [
+            [
+                Generation(
+                    text=choice["text"], generation_info={"finish_reason": choice["finish_reason"]}
+                )
+            ]
+            for choice in choices
+        ]
+        return LLMResult(generations=generations, llm_output={"token_usage": body.get("usage")})
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        with self._post(self._payload(prompt, stop, stream=True, **kwargs)) as response:
+            for line in response:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: ") :]
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if "error" in event:
+                    raise RuntimeError(f"Model server failed while decoding: {event['error']}")
+                choice = event["choices"][0]
+                if choice["finish_reason"] == "error":
+                    raise RuntimeError("Model server failed while decoding; see the server log")
+                chunk = GenerationChunk(
+                    text=choice["text"], generation_info={"finish_reason": choice["finish_reason"]}
+                )
+                if run_manager and chunk.text:
+                    run_manager.on_llm_new_token(token=chunk.text, verbose=self.verbose)
+                yield chunk
+
+
+def make_llm(**llamacpp_kwargs):
+    """Return the LLM for a script: the shared server if ``LLM_SERVER_URL`` is set, else LlamaCpp.
+
+    Takes ``LlamaCpp``'s keyword arguments; with a server, the sampling ones
+    are forwarded and the loading ones (``model_path``, ``n_ctx``, ...) are
+    ignored because the server has already loaded the model. A local model
+    reuses KV state for recurring prompt prefixes (``LLM_PREFIX_CACHE_MB``,
+    see ``prefix_cache``).
+    """
+    url = server_url()
+    if not url:
+        from local_llm.prefix_cache import PrefixCachedLlamaCpp, prefix_cache_bytes
+
+        capacity = prefix_cache_bytes()
+        if capacity > 0:
+            return PrefixCachedLlamaCpp(prefix_cache_bytes=capacity, **llamacpp_kwargs)
+        from langchain_community.llms.llamacpp import LlamaCpp
+
+        return LlamaCpp(**llamacpp_kwargs)
+    fields = set(LocalServerLLM.model_fields)
+    kwargs = {key: value for key, value in llamacpp_kwargs.items() if key in fields}
+    return LocalServerLLM(base_url=url, **kwargs)
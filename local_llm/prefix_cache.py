@@ -0,0 +1,159 @@
+import os
+from collections import OrderedDict, deque
+from typing import Any
+
+from langchain_community.llms.llamacpp import LlamaCpp
+from pydantic import PrivateAttr
+
+# 1 GiB holds the KV state of a few thousand prompt tokens of a 7B model (f16 KV)
+DEFAULT_CAPACITY_BYTES = 1024**3
+# Shorter shared prefixes are cheaper to re-evaluate than to snapshot
+DEFAULT_MIN_PREFIX_TOKENS = 32
+# Recent prompts a new one is compared against to find a shared prefix
+DEFAULT_HISTORY = 8
+
+
+def prefix_cache_bytes():
+    """Memory cap for prompt-prefix states (``LLM_PREFIX_CACHE_MB``, 0 turns the cache off)."""
+    return int(float(os.getenv("LLM_PREFIX_CACHE_MB", DEFAULT_CAPACITY_BYTES / 1024**2)) * 1024**2)
+
+
+def common_prefix_length(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def state_size(state):
+    return len(state.llama_state) + state.input_ids.nbytes + state.scores.nbytes
+
+
+class PrefixStateCache:
+    """LRU cache of llama.cpp context states taken right after shared prompt prefixes.
+
+    Prompts built from the same template (a fixed system prompt, a ReAct
+    preamble) share a long token prefix that llama.cpp would otherwise
+    re-evaluate on every call whenever the previous call used a different
+    prompt. Before each completion, ``prepare`` compares the prompt's tokens
+    with recent prompts; the first time a prefix of at least
+    ``min_prefix_tokens`` recurs, it is evaluated and the context state saved
+    (``Llama.save_state``). Later prompts starting with a saved prefix get
+    the state restored (``Llama.load_state``), and ``Llama.generate``'s own
+    prefix match then evaluates only the remaining tokens.
+
+    States are keyed by the prefix tokens and kept in LRU order within
+    ``capacity_bytes``. The prompt's last token is never part of a prefix,
+    because generation needs it evaluated to produce logits.
+    """
+
+    def __init__(
+        self,
+        capacity_bytes=DEFAULT_CAPACITY_BYTES,
+        min_prefix_tokens=DEFAULT_MIN_PREFIX_TOKENS,
+        history=DEFAULT_HISTORY,
+    ):
+        self.capacity_bytes = capacity_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+        self.states = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.snapshots = 0
+        self.evictions = 0
+        self.tokens_reused = 0
+        self._recent = deque(maxlen=history)
+
+    def _lookup(self, tokens):
+        best = None
+        for key in self.states:
+            if len(key) <= len(tokens) and (best is None or len(key) > len(best)):
+                if tuple(tokens[: len(key)]) == key:
+                    best = key
+        return best
+
+    def _store(self, key, state, keep_scores):
+        if not keep_scores:
+            # Only the last row of logits is ever read after a prefix match
+            state.scores = state.scores[-1:].copy()
+        size = state_size(state)
+        if size > self.capacity_bytes:
+            return
+        self.states[key] = state
+        self.total_bytes += size
+        self.snapshots += 1
+        while self.total_bytes > self.capacity_bytes:
+            _, evicted = self.states.popitem(last=False)
+            self.total_bytes -= state_size(evicted)
+            self.evictions += 1
+
+    def prepare(self, client, prompt):
+        """Restore or snapshot prefix state in ``client`` (a ``llama_cpp.Llama``) for ``prompt``."""
+        # Tokenized exactly as Llama.create_completion does
+        tokens = client.tokenize(prompt.encode("utf-8"), special=True)[:-1]
+        evaluated = common_prefix_length(client.input_ids[: client.n_tokens], tokens)
+
+        key = self._lookup(tokens)
+        if key is not None:
+            self.states.move_to_end(key)
+            if len(key) > evaluated:
+                client.load_state(self.states[key])
+                evaluated = len(key)
+            self.hits += 1
+            self.tokens_reused += len(key)
+        else:
+            self.misses += 1
+
+        # A prefix shared with a recent prompt is likely a template: save it
+        shared = max((common_prefix_length(tokens, recent) for recent in self._recent), default=0)
+        self._recent.append(tokens)
+        if shared < self.min_prefix_tokens or (key is not None and len(key) >= shared):
+            return
+        if evaluated > shared:
+            # The context already holds more of this prompt than the prefix
+            return
+        client.n_tokens = evaluated
+        client.eval(tokens[evaluated:shared])
+        self._store(tuple(tokens[:shared]), client.save_state(), client.context_params.logits_all)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "snapshots": self.snapshots,
+            "evictions": self.evictions,
+            "tokens_reused": self.tokens_reused,
+            "states": len(self.states),
+            "bytes": self.total_bytes,
+        }
+
+
+class PrefixCachedLlamaCpp(LlamaCpp):
+    """``LlamaCpp`` that restores saved KV state for prompt prefixes it has seen before.
+
+    See ``PrefixStateCache``; ``prefix_cache_bytes`` caps the memory the saved
+    states take.
+    """
+
+    prefix_cache_bytes: int = DEFAULT_CAPACITY_BYTES
+    min_prefix_tokens: int = DEFAULT_MIN_PREFIX_TOKENS
+
+    _prefix_cache: Any = PrivateAttr(default=None)
+
+    @property
+    def prefix_cache(self):
+        if self._prefix_cache is None:
+            self._prefix_cache = PrefixStateCache(self.prefix_cache_bytes, self.min_prefix_tokens)
+        return self._prefix_cache
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        if not self.streaming:
+            # Streaming calls go through _stream, which prepares the prefix itself
+            self.prefix_cache.prepare(self.client, prompt)
+        return super()._call(prompt, stop, run_manager, **kwargs)
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.prefix_cache.prepare(self.client, prompt)
+        yield from super()._stream(prompt, stop, run_manager, **kwargs)
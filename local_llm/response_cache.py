@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(current_dir, "cache", "llm_responses.sqlite")
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_SIMILARITY = 0.95
+DEFAULT_SEMANTIC_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# LLM strings are str(sorted(params.items())) for LLMs and JSON for chat models
+_TEMPERATURE = re.compile(r"""['"]temperature['"]\s*[,:]\s*(-?[0-9.]+(?:[eE][-+]?[0-9]+)?)""")
+
+
+def llm_temperature(llm_string):
+    """The sampling temperature recorded in an LLM string, or None if it has none."""
+    match = _TEMPERATURE.search(llm_string)
+    return float(match.group(1)) if match else None
+
+
+def _dump_generation(generation):
+    payload = {"text": generation.text, "generation_info": generation.generation_info}
+    if isinstance(generation, ChatGeneration):
+        payload["message"] = message_to_dict(generation.message)
+    return payload
+
+
+def _load_generation(payload):
+    if "message" in payload:
+        (message,) = messages_from_dict([payload["message"]])
+        return ChatGeneration(message=message, generation_info=payload["generation_info"])
+    return Generation(text=payload["text"], generation_info=payload["generation_info"])
+
+
+class SQLiteResponseCache(BaseCache):
+    """Persistent LLM response cache with an optional embedding-similarity tier.
+
+    Entries are keyed on the LLM string, which LangChain builds from the model's
+    parameters (model path, temperature, top_p, max_tokens, stop, ...), plus
+    the fully rendered prompt. A generation sampled at a non-zero temperature is
+    a single draw, not *the* answer, so those are only cached when
+    ``cache_nonzero_temperature`` is set.
+
+    With ``embeddings`` given, an exact miss falls back to the most similar
+    cached prompt for the same LLM string, if its cosine similarity is at least
+    ``similarity``; prompt vectors are stored with the entries and searched in
+    memory. Entries expire ``ttl`` seconds after they were written, and past
+    ``max_entries`` the least recently used are evicted.
+    """
+
+    def __init__(
+        self,
+        cache_path=None,
+        ttl=None,
+        max_entries=None,
+        embeddings=None,
+        similarity=DEFAULT_SIMILARITY,
+        cache_nonzero_temperature=False,
+    ):
+        self.cache_path = cache_path or os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self.embeddings = embeddings
+        self.similarity = similarity
+        self.cache_nonzero_temperature = cache_nonzero_temperature
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # llm_string -> (keys, unit vectors) of its entries, loaded on first use
+        self._vectors = {}
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key BLOB PRIMARY KEY, llm_string TEXT NOT NULL, prompt TEXT NOT NULL, "
+            "generations TEXT NOT NULL, vector BLOB, created REAL NOT NULL, "
+            "last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_llm_string ON responses(llm_string)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).digest()
+
+    def _cacheable(self, llm_string):
+        if self.cache_nonzero_temperature:
+            return True
+        temperature = llm_temperature(llm_string)
+        return temperature is None or temperature <= 0
+
+    def _expired_before(self):
+        return time.time() - self.ttl if self.ttl else None
+
+    def _embed(self, prompt):
+        vector = np.asarray(self.embeddings.embed_query(prompt), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _semantic_index(self, llm_string):
+        if llm_string not in self._vectors:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM responses WHERE llm_string = ? AND vector IS NOT NULL",
+                (llm_string,),
+            ).fetchall()
+            keys = [key for key, _ in rows]
+            vectors = [np.frombuffer(blob, dtype=np.float32) for _, blob in rows]
+            matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+            self._vectors[llm_string] = (keys, matrix)
+        return self._vectors[llm_string]
+
+    def _fetch(self, key):
+        row = self._conn.execute(
+            "SELECT generations, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        expired_before = self._expired_before()
+        if expired_before is not None and row[1] < expired_before:
+            self._delete([key])
+            return None
+        self._conn.execute(
+            "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?",
+            (time.time(), key),
+        )
+        return [_load_generation(payload) for payload in json.loads(row[0])]
+
+    def _delete(self, keys):
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in keys])
+        # Rebuilt from the table on the next semantic lookup
+        self._vectors.clear()
+
+    def lookup(self, prompt, llm_string):
+        if not self._cacheable(llm_string):
+            self.skipped += 1
+            return None
+        with self._lock:
+            generations = self._fetch(self._key(prompt, llm_string))
+            self._conn.commit()
+        if generations is not None:
+            self.hits += 1
+            return generations
+
+        if self.embeddings is not None:
+            vector = self._embed(prompt)
+            with self._lock:
+                keys, matrix = self._semantic_index(llm_string)
+                if len(keys):
+                    scores = matrix @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        generations = self._fetch(keys[best])
+                self._conn.commit()
+            if generations is not None:
+                self.semantic_hits += 1
+                return generations
+        self.misses += 1
+        return None
+
+    def update(self, prompt, llm_string, return_val):
+        if not self._cacheable(llm_string):
+            return
+        key = self._key(prompt, llm_string)
+        vector = self._embed(prompt) if self.embeddings is not None else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, llm_string, prompt, generations, vector, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    llm_string,
+                    prompt,
+                    json.dumps([_dump_generation(generation) for generation in return_val]),
+                    vector.tobytes() if vector is not None else None,
+                    now,
+                    now,
+                ),
+            )
+            if vector is not None and llm_string in self._vectors:
+                keys, matrix = self._vectors[llm_string]
+                if key not in keys:
+                    matrix = np.vstack([matrix, vector]) if len(keys) else vector[None, :]
+                    self._vectors[llm_string] = (keys + [key], matrix)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones past ``max_entries``."""
+        victims = set()
+        expired_before = self._expired_before()
+        if expired_before is not None:
+            victims.update(
+                key
+                for (key,) in self._conn.execute(
+                    "SELECT key FROM responses WHERE created < ?", (expired_before,)
+                )
+            )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - len(victims) - self.max_entries
+        if excess > 0:
+            # Evict down to 90% so we do not evict on every subsequent insert
+            excess += self.max_entries // 10
+            for (key,) in self._conn.execute("SELECT key FROM responses ORDER BY last_access"):
+                if excess <= 0:
+                    break
+                if key not in victims:
+                    victims.add(key)
+                    excess -= 1
+        if victims:
+            self._delete(victims)
+            self.evictions += len(victims)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._vectors.clear()
+
+    def stats(self):
+        (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "skipped_nonzero_temperature": self.skipped,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+
+def configure_llm_cache():
+    """Install a ``SQLiteResponseCache`` as LangChain's global LLM cache if ``LLM_CACHE`` is set.
+
+    ``LLM_CACHE_PATH``, ``LLM_CACHE_TTL`` (seconds) and ``LLM_CACHE_MAX_ENTRIES``
+    tune it; ``LLM_CACHE_SEMANTIC=1`` adds the similarity tier (threshold
+    ``LLM_CACHE_SIMILARITY``) and ``LLM_CACHE_ANY_TEMPERATURE=1`` opts in to
+    caching sampled (non-zero temperature) generations. Returns the cache, or None.
+    """
+    if not os.getenv("LLM_CACHE"):
+        return None
+    embeddings = None
+    if os.getenv("LLM_CACHE_SEMANTIC"):
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        embeddings = HuggingFaceEmbeddings(model_name=DEFAULT_SEMANTIC_MODEL)
+    ttl = os.getenv("LLM_CACHE_TTL")
+    cache = SQLiteResponseCache(
+        ttl=float(ttl) if ttl else None,
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+        embeddings=embeddings,
+        similarity=float(os.getenv("LLM_CACHE_SIMILARITY", DEFAULT_SIMILARITY)),
+        cache_nonzero_temperature=bool(os.getenv("LLM_CACHE_ANY_TEMPERATURE")),
+    )
+    set_llm_cache(cache)
+    return cache
@@ -0,0 +1,542 @@
+import argparse
+import codecs
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8090
+# Concurrent sequences decoded together, and the context window each one gets
+DEFAULT_N_PARALLEL = 4
+DEFAULT_N_CTX = 2048
+DEFAULT_N_BATCH = 512
+# Tokens the repeat penalty looks back over (llama.cpp's default)
+REPEAT_LAST_N = 64
+
+
+def sample_token(logits, rng, temperature=0.8, top_k=40, top_p=0.95, repeat_penalty=1.1, recent=()):
+    """Pick the next token from one row of logits (llama.cpp's sampling order).
+
+    Repeat penalty on the ``recent`` tokens, then greedy at ``temperature`` <= 0,
+    otherwise top-k, temperature, top-p (nucleus) and a draw from what is left.
+    """
+    logits = np.array(logits, dtype=np.float64)
+    if repeat_penalty != 1.0 and len(recent):
+        ids = np.unique(np.asarray(recent, dtype=np.int64))
+        values = logits[ids]
+        logits[ids] = np.where(values > 0, values / repeat_penalty, values * repeat_penalty)
+    if temperature <= 0:
+        return int(np.argmax(logits))
+
+    if 0 < top_k < len(logits):
+        candidates = np.argpartition(logits, -top_k)[-top_k:]
+    else:
+        candidates = np.arange(len(logits))
+    scaled = logits[candidates] / temperature
+    order = np.argsort(-scaled)
+    candidates, scaled = candidates[order], scaled[order]
+    probs = np.exp(scaled - scaled[0])
+    probs /= probs.sum()
+    if top_p < 1.0:
+        keep = int(np.searchsorted(np.cumsum(probs), top_p)) + 1
+        candidates, probs = candidates[:keep], probs[:keep] / probs[:keep].sum()
+    return int(rng.choice(candidates, p=probs))
+
+
+def kv_seq_rm_function(llama_cpp):
+    """``(ctx, seq_id, p0, p1)`` KV-cache removal for the installed llama-cpp-python.
+
+    The call was renamed across releases: ``llama_kv_cache_seq_rm`` (0.3.6),
+    ``llama_kv_self_seq_rm``, then ``llama_memory_seq_rm`` on the context's
+    memory handle (0.3.16).
+    """
+    if hasattr(llama_cpp, "llama_memory_seq_rm") and hasattr(llama_cpp, "llama_get_memory"):
+
+        def seq_rm(ctx, seq_id, p0, p1):
+            return llama_cpp.llama_memory_seq_rm(llama_cpp.llama_get_memory(ctx), seq_id, p0, p1)
+
+        return seq_rm
+    for name in ("llama_kv_self_seq_rm", "llama_kv_cache_seq_rm"):
+        if hasattr(llama_cpp, name):
+            return getattr(llama_cpp, name)
+    raise RuntimeError(
+        f"llama-cpp-python {getattr(llama_cpp, '__version__', '?')} has no KV-cache removal call"
+    )
+
+
+class Sequence:
+    """One completion request: its prompt, sampling settings and progress."""
+
+    def __init__(
+        self, prompt_tokens, max_tokens, temperature, top_k, top_p, repeat_penalty, stop, seed
+    ):
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.repeat_penalty = repeat_penalty
+        self.stop = [s for s in (stop or []) if s]
+        self.rng = np.random.default_rng(seed)
+
+        self.slot = None
+        self.n_past = 0  # tokens already in this sequence's KV cache
+        self.tokens = []  # generated tokens
+        self.text = ""
+        self.emitted = 0  # characters of ``text`` already handed to the client
+        self.finish_reason = None
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # ("text", piece) while generating, then ("done", finish_reason)
+        self.events = queue.Queue()
+
+    def _held_back(self):
+        """Length of the tail of ``text`` that could still become a stop string."""
+        longest = 0
+        for stop in self.stop:
+            for n in range(min(len(stop) - 1, len(self.text)), longest, -1):
+                if self.text.endswith(stop[:n]):
+                    longest = n
+                    break
+        return longest
+
+    def add_piece(self, piece):
+        """Append decoded text; returns True when a stop string was hit."""
+        start = max(0, len(self.text) - max((len(s) for s in self.stop), default=0))
+        self.text += piece
+        hits = [i for i in (self.text.find(s, start) for s in self.stop) if i >= 0]
+        if hits:
+            self.text = self.text[: min(hits)]
+            return True
+        end = len(self.text) - self._held_back()
+        if end > self.emitted:
+            self.events.put(("text", self.text[self.emitted : end]))
+            self.emitted = end
+        return False
+
+    def finish(self, reason):
+        self.finish_reason = reason
+        if self.finish_reason != "stop":
+            self.text += self.decoder.decode(b"", final=True)
+        if len(self.text) > self.emitted:
+            self.events.put(("text", self.text[self.emitted :]))
+            self.emitted = len(self.text)
+        self.events.put(("done", reason))
+
+
+class BatchScheduler:
+    """Owns one llama.cpp context and decodes every active sequence in shared batches.
+
+    The model is loaded once; the context holds ``n_parallel`` sequences of up
+    to ``n_ctx`` tokens each in one KV cache. A single thread runs the decode
+    loop: each step admits queued requests into free sequence slots, packs one
+    batch with the next token of every generating sequence plus prompt chunks
+    of newly admitted ones (up to ``n_batch`` tokens), decodes it with one
+    ``llama_decode`` call and samples a token for each sequence that needs one.
+    Requests therefore join and leave the batch between steps (continuous
+    batching) instead of waiting for the whole batch to finish.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        n_parallel=DEFAULT_N_PARALLEL,
+        n_ctx=DEFAULT_N_CTX,
+        n_batch=DEFAULT_N_BATCH,
+        n_threads=None,
+        n_gpu_layers=0,
+    ):
+        import llama_cpp
+
+        self._llama_cpp = llama_cpp
+        # Resolved up front, so an unsupported version fails here and not in the decode loop
+        self._seq_rm = kv_seq_rm_function(llama_cpp)
+        self.model_path = model_path
+        self.n_parallel = n_parallel
+        self.n_ctx = n_ctx
+        self.n_batch = max(n_batch, n_parallel)
+        # The high-level wrapper loads the weights and provides the tokenizer;
+        # its own small context is unused
+        self.llama = llama_cpp.Llama(
+            model_path=model_path,
+            n_ctx=min(n_ctx, 512),
+            n_threads=n_threads,
+            n_gpu_layers=n_gpu_layers,
+            verbose=False,
+        )
+        self.n_vocab = self.llama.n_vocab()
+        self.eos = self.llama.token_eos()
+
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_ctx * n_parallel
+        params.n_batch = self.n_batch
+        params.n_ubatch = min(self.n_batch, DEFAULT_N_BATCH)
+        params.n_seq_max = n_parallel
+        params.n_threads = self.llama.n_threads
+        params.n_threads_batch = self.llama.n_threads_batch
+        new_context = getattr(llama_cpp, "llama_init_from_model", None)
+        self.ctx = (new_context or llama_cpp.llama_new_context_with_model)(self.llama.model, params)
+        if not self.ctx:
+            raise RuntimeError(f"Could not create a {n_parallel}-sequence context for {model_path}")
+        self.batch = llama_cpp.llama_batch_init(self.n_batch, 0, n_parallel)
+
+        self.pending = queue.Queue()
+        self.slots = [None] * n_parallel
+        self.steps = 0
+        self.tokens_decoded = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="decode-loop", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        prompt,
+        max_tokens=256,
+        temperature=0.8,
+        top_k=40,
+        top_p=0.95,
+        repeat_penalty=1.1,
+        stop=None,
+        seed=None,
+    ):
+        """Queue a completion and return its ``Sequence`` (read results from ``events``)."""
+        tokens = self.llama.tokenize(prompt.encode("utf-8"), add_bos=True, special=True)
+        if len(tokens) >= self.n_ctx:
+            raise ValueError(
+                f"Prompt has {len(tokens)} tokens; the server's context window is {self.n_ctx}"
+            )
+        # Like LlamaCpp, a generation is cut short when the window fills up
+        max_tokens = min(max_tokens or self.n_ctx, self.n_ctx - len(tokens))
+        sequence = Sequence(
+            tokens, max_tokens, temperature, top_k, top_p, repeat_penalty, stop, seed
+        )
+        self.pending.put(sequence)
+        return sequence
+
+    def status(self):
+        return {
+            "model": os.path.basename(self.model_path),
+            "n_parallel": self.n_parallel,
+            "n_ctx": self.n_ctx,
+            "active": sum(slot is not None for slot in self.slots),
+            "queued": self.pending.qsize(),
+            "steps": self.steps,
+            "tokens_decoded": self.tokens_decoded,
+        }
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._llama_cpp.llama_batch_free(self.batch)
+        self._llama_cpp.llama_free(self.ctx)
+
+    def _admit(self, block):
+        for slot, sequence in enumerate(self.slots):
+            if sequence is not None:
+                continue
+            try:
+                sequence = self.pending.get(block=block, timeout=0.1)
+            except queue.Empty:
+                return
+            block = False
+            # Take the slot first, so a failure below still finishes the sequence
+            sequence.slot = slot
+            self.slots[slot] = sequence
+            self._seq_rm(self.ctx, slot, -1, -1)
+
+    def _fill_batch(self):
+        """Pack the next batch; returns ``[(batch index, sequence), ...]`` that need sampling."""
+        batch = self.batch
+        n = 0
+        sample_at = []
+
+        def add(token, pos, slot, logits):
+            batch.token[n] = token
+            batch.pos[n] = pos
+            batch.n_seq_id[n] = 1
+            batch.seq_id[n][0] = slot
+            batch.logits[n] = logits
+
+        # Generating sequences first: one token each keeps their latency flat
+        for sequence in self.slots:
+            if sequence is not None and sequence.n_past >= len(sequence.prompt_tokens):
+                add(sequence.tokens[-1], sequence.n_past, sequence.slot, True)
+                sample_at.append((n, sequence))
+                n += 1
+        # Then prompt chunks of sequences still prefilling, with what room is left
+        for sequence in self.slots:
+            if sequence is None or sequence.n_past >= len(sequence.prompt_tokens):
+                continue
+            start = sequence.n_past
+            end = min(len(sequence.prompt_tokens), start + self.n_batch - n)
+            for pos in range(start, end):
+                last = pos == len(sequence.prompt_tokens) - 1
+                add(sequence.prompt_tokens[pos], pos, sequence.slot, last)
+                if last:
+                    sample_at.append((n, sequence))
+                n += 1
+            if n == self.n_batch:
+                break
+        batch.n_tokens = n
+        return sample_at
+
+    def _step(self):
+        sample_at = self._fill_batch()
+        n_tokens = self.batch.n_tokens
+        if not n_tokens:
+            return
+        status = self._llama_cpp.llama_decode(self.ctx, self.batch)
+        if status != 0:
+            # 1: no room in the KV cache for this batch; fail what was in it
+            logger.error("llama_decode returned %d for a %d-token batch", status, n_tokens)
+            self._fail_all()
+            return
+        self.steps += 1
+        self.tokens_decoded += n_tokens
+
+        # Advance the KV position of every sequence that had tokens in the batch
+        for i in range(n_tokens):
+            sequence = self.slots[self.batch.seq_id[i][0]]
+            sequence.n_past = self.batch.pos[i] + 1
+
+        for i, sequence in sample_at:
+            logits = np.ctypeslib.as_array(
+                self._llama_cpp.llama_get_logits_ith(self.ctx, i), shape=(self.n_vocab,)
+            )
+            recent = (sequence.prompt_tokens + sequence.tokens)[-REPEAT_LAST_N:]
+            token = sample_token(
+                logits,
+                sequence.rng,
+                sequence.temperature,
+                sequence.top_k,
+                sequence.top_p,
+                sequence.repeat_penalty,
+                recent,
+            )
+            if token == self.eos:
+                self._release(sequence.slot, "stop")
+                continue
+            piece = self.llama.detokenize(
+                [token], prev_tokens=sequence.prompt_tokens + sequence.tokens
+            )
+            sequence.tokens.append(token)
+            if sequence.add_piece(sequence.decoder.decode(piece)):
+                self._release(sequence.slot, "stop")
+            elif len(sequence.tokens) >= sequence.max_tokens:
+                self._release(sequence.slot, "length")
+
+    def _release(self, slot, reason):
+        sequence = self.slots[slot]
+        self.slots[slot] = None
+        try:
+            self._seq_rm(self.ctx, slot, -1, -1)
+        finally:
+            # Whoever waits on the sequence must hear back even if the KV call fails
+            sequence.finish(reason)
+
+    def _fail_all(self):
+        for slot, sequence in enumerate(self.slots):
+            if sequence is None:
+                continue
+            try:
+                self._release(slot, "error")
+            except Exception:
+                # The slot is cleared again on admission
+                logger.exception("Could not clear KV cache of sequence %d", slot)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Sleep on the queue only when there is nothing to decode
+                self._admit(block=all(slot is None for slot in self.slots))
+                self._step()
+            except Exception:
+                logger.exception("Decode step failed")
+                self._fail_all()
+
+
+def _completion_params(body):
+    stop = body.get("stop")
+    return {
+        "max_tokens": int(body.get("max_tokens", 256)),
+        "temperature": float(body.get("temperature", 0.8)),
+        "top_k": int(body.get("top_k", 40)),
+        "top_p": float(body.get("top_p", 0.95)),
+        "repeat_penalty": float(body.get("repeat_penalty", 1.1)),
+        "stop": [stop] if isinstance(stop, str) else stop,
+        "seed": body.get("seed"),
+    }
+
+
+def make_handler(scheduler):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/health":
+                self._send_json(200, scheduler.status())
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") == "/tokenize":
+                self._tokenize()
+                return
+            if self.path.rstrip("/") != "/v1/completions":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                prompts = body["prompt"]
+                prompts = [prompts] if isinstance(prompts, str) else list(prompts)
+                params = _completion_params(body)
+                # All prompts of a request are queued at once and decoded together
+                sequences = [scheduler.submit(prompt, **params) for prompt in prompts]
+            except (KeyError, TypeError, ValueError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+            started = time.time()
+            if body.get("stream"):
+                if len(sequences) != 1:
+                    self._send_json(400, {"error": "Streaming takes a single prompt"})
+                    return
+                self._stream(sequences[0])
+                return
+
+            for sequence in sequences:
+                while sequence.events.get()[0] != "done":
+                    pass
+            if any(sequence.finish_reason == "error" for sequence in sequences):
+                # Partial text from a failed decode is not an answer
+                self._send_json(500, {"error": "Decoding failed; see the server log"})
+                return
+            choices = []
+            for index, sequence in enumerate(sequences):
+                choices.append(
+                    {"index": index, "text": sequence.text, "finish_reason": sequence.finish_reason}
+                )
+            self._send_json(
+                200,
+                {
+                    "object": "text_completion",
+                    "created": int(started),
+                    "model": os.path.basename(scheduler.model_path),
+                    "choices": choices,
+                    "usage": {
+                        "prompt_tokens": sum(len(s.prompt_tokens) for s in sequences),
+                        "completion_tokens": sum(len(s.tokens) for s in sequences),
+                    },
+                },
+            )
+
+        def _tokenize(self):
+            """Token counts for ``content`` (a string or list), as the model tokenizes prompts."""
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                texts = body["content"]
+                texts = [texts] if isinstance(texts, str) else list(texts)
+            except (KeyError, TypeError, ValueError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            counts = [
+                len(scheduler.llama.tokenize(text.encode("utf-8"), add_bos=True, special=True))
+                for text in texts
+            ]
+            self._send_json(200, {"counts": counts})
+
+        def _stream(self, sequence):
+            """Server-sent events, one ``data:`` line per text piece, then ``[DONE]``.
+
+            A failed decode ends the stream with an ``{"error": ...}`` event
+            instead of a finish reason.
+            """
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            while True:
+                kind, value = sequence.events.get()
+                if kind == "text":
+                    event = {"choices": [{"index": 0, "text": value, "finish_reason": None}]}
+                elif value == "error":
+                    event = {"error": "Decoding failed; see the server log"}
+                else:
+                    event = {"choices": [{"index": 0, "text": "", "finish_reason": value}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if kind == "done":
+                    break
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        description="Serve one local GGUF model to many clients with continuous batching."
+    )
+    parser.add_argument("--model-path", default=os.getenv("MODEL_PATH"))
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--n-parallel", type=int, default=DEFAULT_N_PARALLEL, help="Sequences decoded together"
+    )
+    parser.add_argument(
+        "--n-ctx", type=int, default=DEFAULT_N_CTX, help="Context window per sequence"
+    )
+    parser.add_argument("--n-batch", type=int, default=DEFAULT_N_BATCH)
+    parser.add_argument("--n-threads", type=int)
+    parser.add_argument("--n-gpu-layers", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not args.model_path:
+        raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
+    logging.basicConfig(level=logging.INFO)
+
+    started = time.perf_counter()
+    scheduler = BatchScheduler(
+        args.model_path,
+        n_parallel=args.n_parallel,
+        n_ctx=args.n_ctx,
+        n_batch=args.n_batch,
+        n_threads=args.n_threads,
+        n_gpu_layers=args.n_gpu_layers,
+    )
+    print(f"Loaded {args.model_path} in {time.perf_counter() - started:.1f}s")
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(scheduler))
+    print(f"Serving on http://{args.host}:{args.port} ({args.n_parallel} parallel sequences)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 from langchain.prompts import ChatPromptTemplate
-from langchain_community.llms.llamacpp import LlamaCpp
 from langchain_core.callbacks import CallbackManager, StreamingStdOutCallbackHandler
 import os
 from dotenv import load_dotenv
 
+from local_llm import configure_llm_cache, make_llm, server_url
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -11,14 +12,14 @@ load_dotenv()
 model_path = os.getenv("MODEL_PATH")
 
 # Check if the model path is loaded correctly
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
 print(f"Model path loaded: {model_path}")
 
 callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
 
-llm = LlamaCpp(
+llm = make_llm(
     model_path=model_path,
     temperature=0.5,
     max_tokens=500,
@@ -27,6 +28,8 @@ llm = LlamaCpp(
     streaming=True
 )
 
+llm_cache = configure_llm_cache()
+
 # Define messages for the ChatPromptTemplate
 messages =  [
     ('system', "You are a system design expert"),
@@ -42,4 +45,7 @@ formatted_prompt = prompt_template.format(
 )
 
 # Send the formatted prompt to the LLM
-response = llm.invoke([formatted_prompt])  # Pass the formatted prompt as a list
\ No newline at end of file
+response = llm.invoke([formatted_prompt])  # Pass the formatted prompt as a list
+
+if llm_cache is not None:
+    print(f"LLM cache: {llm_cache.stats()}")
@@ -1,61 +1,77 @@
 import os
 
 from dotenv import load_dotenv
+
+from local_llm import make_llm, server_url
 from langchain import hub
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.vectorstores import Chroma
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import Tool
-from langchain_community.llms import LlamaCpp
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from hybrid_retriever import HybridRetriever
+from rerank import RerankingRetriever
+from runtime import get_cross_encoder, get_vector_store, startup_report, timed, warm_up
+from sparse_index import load_sparse_index
 
 # Load environment variables from .env file
 load_dotenv()
 # Get model path
 model_path = os.getenv("MODEL_PATH")
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
-# Initialize LLM with a smaller max_tokens to avoid context overflow
-llm = LlamaCpp(
-    model_path=model_path,
-    temperature=0.3,
-    max_tokens=100,  # Further reduced for safety
-    verbose=False,
-    streaming=True,
-)
-# Load the existing Chroma vector store
 current_dir = os.path.dirname(os.path.abspath(__file__))
-db_dir = os.path.join(current_dir, "..", "..", "db")
 persistent_directory = os.path.join(current_dir, "database", "chroma_db")
 
 # Check if the Chroma vector store already exists
-if os.path.exists(persistent_directory):
-    print("Loading existing vector store...")
-    db = Chroma(persist_directory=persistent_directory,
-                embedding_function=None)
-else:
+if not os.path.exists(persistent_directory):
     raise FileNotFoundError(
         f"The directory {persistent_directory} does not exist. Please check the path."
     )
 
-# Define the embedding model
-embedding = HuggingFaceEmbeddings()
+# Load the embedding model and open the vector store in the background
+# while the LLM weights are loading
+warm_up(persistent_directory)
 
-# Load the existing vector store with the embedding function
-db = Chroma(persist_directory=persistent_directory,
-            embedding_function=embedding)
+# Initialize LLM with a smaller max_tokens to avoid context overflow
+with timed("load LLM"):
+    llm = make_llm(
+        model_path=model_path,
+        temperature=0.3,
+        max_tokens=100,  # Further reduced for safety
+        verbose=False,
+        streaming=True,
+    )
 
-# Create a retriever for querying the vector store
-# `search_type` specifies the type of search (e.g., similarity)
-# `search_kwargs` contains additional arguments for the search (e.g., number of results to return)
-retriever = db.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 3},
+# Load the existing vector store with the embedding function (opened once per process)
+print("Loading existing vector store...")
+db = get_vector_store(persistent_directory)
+
+# Create a hybrid retriever for querying the vector store
+# BM25 over the inverted index built at ingest time catches exact terms, vector
+# search catches paraphrases; results are merged with reciprocal rank fusion.
+# `k` is the number of results to return, `latency_budget_ms` caps the BM25 search
+# (vector search is always waited for)
+with timed("open inverted index"):
+    sparse_index = load_sparse_index(db, persistent_directory)
+retriever = HybridRetriever(
+    vectorstore=db,
+    sparse_index=sparse_index,
+    k=3,
+    latency_budget_ms=500,
 )
+# Optionally (RERANK=1) re-rank 20 hybrid candidates with a cross-encoder on the
+# CPU and keep the best 3; pair scores are cached and capped at 300 ms
+if os.getenv("RERANK"):
+    retriever = RerankingRetriever(
+        base_retriever=retriever,
+        cross_encoder=get_cross_encoder(),
+        k=3,
+        fetch_k=20,
+        latency_budget_ms=300,
+    )
 # Contextualize question prompt
 # This system prompt helps the AI understand that it should reformulate the question
 # based on the chat history to make it a standalone question
@@ -138,6 +154,8 @@ agent_executor = AgentExecutor.from_agent_and_tools(
     agent=agent, tools=tools, handle_parsing_errors=True, verbose=True,
 )
 
+print(startup_report())
+
 chat_history = []
 while True:
     query = input("You: ")
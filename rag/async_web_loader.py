@@ -0,0 +1,262 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from langchain_community.document_loaders.base import BaseLoader
+from langchain_community.document_loaders.web_base import (
+    _build_metadata,
+    default_header_template,
+)
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_PER_HOST = 8
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 30.0
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_DONE = object()
+
+
+def load_validators(path):
+    """Return the saved ``{url: {"etag": ..., "last_modified": ...}}`` map (or {})."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_validators(path, validators):
+    """Write the validators map atomically."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(validators, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _parse(html, url, parser, bs_kwargs, get_text_kwargs):
+    """Parse a page the way ``WebBaseLoader.lazy_load`` does (runs in a worker thread)."""
+    from bs4 import BeautifulSoup
+
+    if parser is None:
+        parser = "xml" if url.endswith(".xml") else "html.parser"
+    soup = BeautifulSoup(html, parser, **bs_kwargs)
+    text = soup.get_text(**get_text_kwargs)
+    return Document(page_content=text, metadata=_build_metadata(soup, url))
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AsyncWebLoader(BaseLoader):
+    """Concurrent replacement for ``WebBaseLoader`` built on one pooled aiohttp session.
+
+    - Connections are pooled and kept alive, with at most ``max_connections``
+      requests in flight overall and ``per_host`` per host.
+    - Connection errors, timeouts and 429/5xx responses are retried up to
+      ``retries`` times with jittered exponential backoff (``Retry-After`` is
+      honoured).
+    - With ``validators`` (see ``load_validators``) requests are conditional
+      (If-None-Match / If-Modified-Since); pages answering 304 are skipped and
+      counted in ``stats["not_modified"]``. Fresh ETag/Last-Modified values are
+      written back into ``validators`` as pages arrive.
+    - HTML is parsed with BeautifulSoup in a thread pool so parsing does not
+      stall the event loop.
+
+    Documents match ``WebBaseLoader``'s and are yielded in ``urls`` order; at
+    most ``max_pending`` pages are fetched ahead of the consumer.
+    """
+
+    def __init__(
+        self,
+        urls,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        per_host=DEFAULT_PER_HOST,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        timeout=DEFAULT_TIMEOUT,
+        validators=None,
+        continue_on_failure=False,
+        parse_workers=None,
+        max_pending=None,
+        header_template=None,
+        parser=None,
+        bs_kwargs=None,
+        get_text_kwargs=None,
+    ):
+        self.urls = [urls] if isinstance(urls, str) else list(urls)
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.validators = validators if validators is not None else {}
+        self.continue_on_failure = continue_on_failure
+        self.parse_workers = parse_workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or 2 * max_connections
+        self.headers = dict(header_template or default_header_template)
+        self.parser = parser
+        self.bs_kwargs = bs_kwargs or {}
+        self.get_text_kwargs = get_text_kwargs or {}
+        self.stats = {"fetched": 0, "not_modified": 0, "failed": 0, "retries": 0, "bytes": 0}
+
+    def _request_headers(self, url):
+        headers = dict(self.headers)
+        cached = self.validators.get(url, {})
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2**attempt) * (1 + random.random() / 4)
+
+    async def _fetch(self, session, url):
+        """Return the page HTML, or None when the server answers 304 Not Modified."""
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.get(url, headers=self._request_headers(url)) as response:
+                    if response.status == 304:
+                        return None
+                    if response.status in RETRY_STATUSES:
+                        raise _RetryableStatus(response.status, response.headers.get("Retry-After"))
+                    response.raise_for_status()
+                    body = await response.read()
+                    html = body.decode(response.get_encoding(), errors="replace")
+                    self.stats["bytes"] += len(body)
+                    self.validators[url] = {
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    }
+                    return html
+            except (aiohttp.ClientError, asyncio.TimeoutError, _RetryableStatus) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError)
+                if not retryable or attempt == self.retries:
+                    raise
+                self.stats["retries"] += 1
+                delay = self._delay(attempt, getattr(e, "retry_after", None))
+                logger.info("Retrying %s in %.2fs after %s", url, delay, e)
+                await asyncio.sleep(delay)
+
+    async def _load_one(self, session, parse_pool, url):
+        try:
+            html = await self._fetch(session, url)
+        except Exception as e:
+            if not self.continue_on_failure:
+                raise
+            logger.warning("Error fetching %s, skipping: %s", url, e)
+            self.stats["failed"] += 1
+            return None
+        if html is None:
+            self.stats["not_modified"] += 1
+            return None
+        loop = asyncio.get_running_loop()
+        document = await loop.run_in_executor(
+            parse_pool,
+            _parse,
+            html,
+            url,
+            self.parser,
+            self.bs_kwargs,
+            self.get_text_kwargs,
+        )
+        self.stats["fetched"] += 1
+        return document
+
+    async def alazy_load(self):
+        """Fetch and parse pages concurrently, yielding documents in ``urls`` order."""
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        parse_pool = ThreadPoolExecutor(self.parse_workers, thread_name_prefix="html-parse")
+        in_flight = deque()
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                for url in self.urls:
+                    in_flight.append(
+                        asyncio.ensure_future(self._load_one(session, parse_pool, url))
+                    )
+                    if len(in_flight) >= self.max_pending:
+                        # Waiting on the oldest page keeps output order (and IDs) stable
+                        document = await in_flight.popleft()
+                        if document is not None:
+                            yield document
+                while in_flight:
+                    document = await in_flight.popleft()
+                    if document is not None:
+                        yield document
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            parse_pool.shutdown(wait=False, cancel_futures=True)
+
+    def lazy_load(self):
+        """Run the async pipeline on a background event loop and stream its documents.
+
+        The hand-off queue is bounded, so a slow consumer (the embedder) pauses
+        fetching instead of letting parsed pages pile up in memory.
+        """
+        documents = queue.Queue(maxsize=self.max_pending)
+        errors = []
+        stop = threading.Event()
+
+        async def produce():
+            async for document in self.alazy_load():
+                while not stop.is_set():
+                    try:
+                        documents.put_nowait(document)
+                        break
+                    except queue.Full:
+                        await asyncio.sleep(0.01)
+                if stop.is_set():
+                    break
+
+        def run():
+            try:
+                asyncio.run(produce())
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                documents.put(_DONE)
+
+        thread = threading.Thread(target=run, name="async-web-loader", daemon=True)
+        thread.start()
+        try:
+            while True:
+                document = documents.get()
+                if document is _DONE:
+                    break
+                yield document
+        finally:
+            stop.set()
+            # Unblock the loader thread if the consumer stopped early
+            while thread.is_alive():
+                try:
+                    documents.get_nowait()
+                except queue.Empty:
+                    thread.join(timeout=0.1)
+        if errors:
+            raise errors[0]
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from retrieval_cache import as_cached_retriever
+from runtime import get_embeddings, get_vector_store
+from vector_index import MmapRetriever, MmapVectorIndex, default_index_dir
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PERSIST_DIRECTORY = os.path.join(current_dir, "database", "chroma_db_with_metadata")
+DEFAULT_BATCH_SIZE = 256
+
+
+def load_queries(path):
+    """Read queries from a text file (one per line) or JSONL (``{"query": ...}`` per line)."""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                line = json.loads(line)["query"]
+            queries.append(line)
+    return queries
+
+
+def build_retriever(persist_directory, search_type, search_kwargs):
+    """Use the memory-mapped export of the store when it is fresh, else Chroma itself."""
+    index_dir = default_index_dir(persist_directory)
+    if os.path.exists(index_dir):
+        index = MmapVectorIndex(index_dir)
+        if not index.is_stale():
+            return MmapRetriever(
+                index=index,
+                embeddings=get_embeddings(),
+                search_type=search_type,
+                search_kwargs=search_kwargs,
+            )
+    db = get_vector_store(persist_directory)
+    return as_cached_retriever(db, search_type=search_type, search_kwargs=search_kwargs)
+
+
+def _same(doc, other):
+    return doc.page_content == other.page_content and doc.metadata == other.metadata
+
+
+def run_batches(retriever, queries, batch_size=DEFAULT_BATCH_SIZE, verify=False):
+    """Yield ``(query, [(document, score), ...])`` for every query, ``batch_size`` at a time.
+
+    With ``verify`` each result list is checked against a single-query
+    ``invoke`` and a mismatch raises ``AssertionError``.
+    """
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        for query, hits in zip(batch, retriever.search_batch(batch)):
+            if verify:
+                single = retriever.invoke(query)
+                if len(single) != len(hits) or not all(
+                    _same(doc, hit) for doc, (hit, _) in zip(single, hits)
+                ):
+                    raise AssertionError(f"Batch results differ from invoke() for {query!r}")
+            yield query, hits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Retrieve for a file of queries in batches and write the hits as JSONL."
+    )
+    parser.add_argument("queries", help="Text file (one query per line) or JSONL with a 'query' field")
+    parser.add_argument("--persist-directory", default=DEFAULT_PERSIST_DIRECTORY)
+    parser.add_argument("--output", default="-", help="JSONL output path (default: stdout)")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--score-threshold", type=float,
+                        help="Use similarity_score_threshold search with this threshold")
+    parser.add_argument("--source", help="Only search chunks from this source (e.g. a book)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--verify", action="store_true",
+                        help="Check every batch result against a single-query invoke()")
+    args = parser.parse_args(argv)
+
+    search_type = "similarity"
+    search_kwargs = {"k": args.k}
+    if args.score_threshold is not None:
+        search_type = "similarity_score_threshold"
+        search_kwargs["score_threshold"] = args.score_threshold
+    if args.source:
+        search_kwargs["filter"] = {"source": args.source}
+
+    queries = load_queries(args.queries)
+    retriever = build_retriever(args.persist_directory, search_type, search_kwargs)
+    started = time.perf_counter()
+    out = open(args.output, "w", encoding="utf-8") if args.output != "-" else None
+    try:
+        for query, hits in run_batches(retriever, queries, args.batch_size, args.verify):
+            line = json.dumps(
+                {
+                    "query": query,
+                    "results": [
+                        {"id": doc.id, "score": score, "metadata": doc.metadata, "text": doc.page_content}
+                        for doc, score in hits
+                    ],
+                },
+                ensure_ascii=False,
+            )
+            if out:
+                out.write(line + "\n")
+            else:
+                print(line)
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - started
+    print(f"Retrieved for {len(queries)} queries in {elapsed:.2f}s "
+          f"({len(queries) / max(elapsed, 1e-9):.1f} queries/s) with {type(retriever).__name__}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from queue import Empty
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# How often the harness checks that a case process is still alive
+POLL_SECONDS = 1.0
+
+SYNTHETIC_WORDS = (
+    "product discovery prototype customer team market vision strategy roadmap "
+    "delivery test users feedback value risk engineer design manager insight "
+    "opportunity experiment metric outcome stakeholder release quality"
+).split()
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic, model-free embeddings for measuring everything but the model."""
+
+    def __init__(self, dimensions=768):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        rng = random.Random(digest)
+        return [rng.uniform(-1.0, 1.0) for _ in range(self.dimensions)]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """Serve vectors computed earlier so store build time excludes the model."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def synthetic_pages(pages, words_per_page=450, seed=0):
+    """Generate book-like pages: paragraphs of random words."""
+    rng = random.Random(seed)
+    documents = []
+    for page_number in range(pages):
+        paragraphs = []
+        remaining = words_per_page
+        while remaining > 0:
+            length = min(remaining, rng.randint(40, 120))
+            paragraphs.append(" ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(length)))
+            remaining -= length
+        documents.append(
+            Document(
+                page_content="\n\n".join(paragraphs),
+                metadata={"source": "synthetic", "page": page_number},
+            )
+        )
+    return documents
+
+
+def load_corpus(corpus_dir):
+    """Load every PDF and text file in a directory as page documents."""
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+
+    documents = []
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if name.endswith(".pdf"):
+            documents.extend(PyPDFLoader(path).load())
+        elif name.endswith((".txt", ".md")):
+            documents.extend(TextLoader(path, encoding="utf-8").load())
+    return documents
+
+
+def make_splitter(name, chunk_size, chunk_overlap):
+    from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
+    from offset_splitter import OffsetCharacterTextSplitter, OffsetRecursiveCharacterTextSplitter
+
+    splitters = {
+        "character": CharacterTextSplitter,
+        "recursive": RecursiveCharacterTextSplitter,
+        "offset-character": OffsetCharacterTextSplitter,
+        "offset-recursive": OffsetRecursiveCharacterTextSplitter,
+    }
+    return splitters[name](chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def make_embeddings(name):
+    if name == "hash":
+        return HashEmbeddings()
+    from runtime import get_embeddings
+
+    # Benchmark the model itself, not the on-disk cache
+    return get_embeddings(cached=False)
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def build_store(store, docs, vectors, batch_size, workdir):
+    """Add pre-embedded chunks to a store and return its on-disk size."""
+    embeddings = PrecomputedEmbeddings(vectors)
+    if store == "none":
+        return 0
+    if store in ("chroma", "chroma-memory"):
+        from langchain_community.vectorstores import Chroma
+
+        persist_directory = os.path.join(workdir, "chroma") if store == "chroma" else None
+        db = Chroma(
+            collection_name="bench",
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+        )
+        for start in range(0, len(docs), batch_size):
+            batch = docs[start:start + batch_size]
+            db.add_documents(batch, ids=[str(start + i) for i in range(len(batch))])
+        return directory_size(persist_directory) if persist_directory else 0
+    raise ValueError(f"Unknown store: {store}")
+
+
+def run_case(case, corpus_dir, pages, queue):
+    """Run one benchmark configuration (in its own process) and report metrics."""
+    workdir = tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        started = time.perf_counter()
+        documents = load_corpus(corpus_dir) if corpus_dir else synthetic_pages(pages)
+        load_seconds = time.perf_counter() - started
+
+        splitter = make_splitter(case["splitter"], case["chunk_size"], case["chunk_overlap"])
+        started = time.perf_counter()
+        docs = splitter.split_documents(documents)
+        split_seconds = time.perf_counter() - started
+
+        embeddings = make_embeddings(case["embeddings"])
+        texts = [doc.page_content for doc in docs]
+        started = time.perf_counter()
+        vectors = {}
+        for start in range(0, len(texts), case["batch_size"]):
+            batch = texts[start:start + case["batch_size"]]
+            vectors.update(zip(batch, embeddings.embed_documents(batch)))
+        embed_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index_bytes = build_store(case["store"], docs, vectors, case["batch_size"], workdir)
+        build_seconds = time.perf_counter() - started
+
+        def rate(count, seconds):
+            return round(count / seconds, 2) if seconds else None
+
+        queue.put({
+            **case,
+            "pages": len(documents),
+            "chunks": len(docs),
+            "mean_chunk_chars": round(sum(map(len, texts)) / len(texts), 1) if texts else 0,
+            "load_seconds": round(load_seconds, 4),
+            "split_seconds": round(split_seconds, 4),
+            "embed_seconds": round(embed_seconds, 4),
+            "index_build_seconds": round(build_seconds, 4),
+            "pages_per_second": rate(len(documents), load_seconds),
+            "chunks_per_second": rate(len(docs), split_seconds),
+            "embeddings_per_second": rate(len(texts), embed_seconds),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "index_bytes": index_bytes,
+        })
+    except Exception as e:
+        queue.put({**case, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def wait_for_result(process, queue, poll_seconds=POLL_SECONDS):
+    """Return what a case process put on ``queue``, or None if it exited without reporting.
+
+    A case killed by the OOM killer, a signal or a crash in native code never
+    reports, so the queue is polled while the process is alive instead of
+    waited on forever.
+    """
+    while True:
+        try:
+            return queue.get(timeout=poll_seconds)
+        except Empty:
+            if not process.is_alive():
+                break
+    # A process that reported just before exiting may still be flushing the queue
+    try:
+        return queue.get(timeout=poll_seconds)
+    except Empty:
+        return None
+
+
+def exit_error(exitcode):
+    """Error text for a case process that died without reporting."""
+    if exitcode is not None and exitcode < 0:
+        try:
+            name = signal.Signals(-exitcode).name
+        except ValueError:
+            name = f"signal {-exitcode}"
+        return f"Case process killed by {name} (exit code {exitcode})"
+    return f"Case process exited with code {exitcode} without reporting"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ingestion path (load, split, embed, index) and emit JSON."
+    )
+    parser.add_argument("--corpus", help="Directory of PDF/text files (default: synthetic corpus)")
+    parser.add_argument("--pages", type=int, default=500, help="Pages in the synthetic corpus")
+    parser.add_argument("--splitters", default="character,recursive",
+                        help="Comma-separated: character, recursive, offset-character, offset-recursive")
+    parser.add_argument("--batch-sizes", default="16,64,256")
+    parser.add_argument("--stores", default="chroma",
+                        help="Comma-separated: chroma, chroma-memory, none")
+    parser.add_argument("--embeddings", default="hash", choices=["hash", "hf"],
+                        help="'hash' isolates the pipeline, 'hf' runs the real model")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    cases = [
+        {
+            "splitter": splitter,
+            "batch_size": int(batch_size),
+            "store": store,
+            "embeddings": args.embeddings,
+            "chunk_size": args.chunk_size,
+            "chunk_overlap": args.chunk_overlap,
+        }
+        for splitter in args.splitters.split(",")
+        for batch_size in args.batch_sizes.split(",")
+        for store in args.stores.split(",")
+    ]
+
+    # Each case runs in a fresh process so peak RSS is measured per configuration
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for case in cases:
+        queue = context.Queue()
+        process = context.Process(target=run_case, args=(case, args.corpus, args.pages, queue))
+        process.start()
+        result = wait_for_result(process, queue)
+        process.join()
+        if result is None:
+            result = {**case, "error": exit_error(process.exitcode)}
+        print(f"{case['splitter']:<16} batch={case['batch_size']:<5} {case['store']:<14} "
+              f"{result.get('error') or 'ok'}", file=sys.stderr)
+        results.append(result)
+
+    report = {
+        "benchmark": "ingestion",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "corpus": args.corpus or f"synthetic:{args.pages}",
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_ingest import (
+    PrecomputedEmbeddings,
+    directory_size,
+    exit_error,
+    peak_rss_bytes,
+    wait_for_result,
+)
+from batch_retrieval import load_queries
+from embedding_cache import embed_queries
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PERSIST_DIRECTORY = os.path.join(current_dir, "database", "chroma_db_with_metadata")
+DEFAULT_NUM_QUERIES = 200
+
+
+def sample_queries(persist_directory, num_queries, seed=0):
+    """Use the first sentence of randomly chosen stored chunks as queries."""
+    from langchain_community.vectorstores import Chroma
+
+    collection = Chroma(persist_directory=persist_directory)._collection
+    count = collection.count()
+    rng = random.Random(seed)
+    queries = []
+    for offset in rng.sample(range(count), min(num_queries, count)):
+        text = collection.get(include=["documents"], limit=1, offset=offset)["documents"][0] or ""
+        sentence = re.split(r"(?<=[.!?])\s+", " ".join(text.split()), maxsplit=1)[0]
+        if sentence:
+            queries.append(sentence[:300])
+    return queries
+
+
+def percentiles_ms(latencies):
+    """Return p50/p95/p99 of per-query latencies (seconds) in milliseconds."""
+    values = np.percentile(np.asarray(latencies) * 1000.0, [50, 95, 99])
+    return {f"p{p}_ms": round(float(value), 3) for p, value in zip((50, 95, 99), values)}
+
+
+def make_searcher(case, persist_directory, queries, query_vectors):
+    """Return ``search(i, k, threshold) -> [chunk_id, ...]`` for one index configuration."""
+    if case["index"] == "chroma":
+        from langchain_community.vectorstores import Chroma
+
+        db = Chroma(persist_directory=persist_directory)
+        relevance_score_fn = db._select_relevance_score_fn()
+
+        def search(i, k, threshold):
+            results = db._collection.query(
+                query_embeddings=[query_vectors[i].tolist()], n_results=k, include=["distances"]
+            )
+            return [
+                chunk_id
+                for chunk_id, distance in zip(results["ids"][0], results["distances"][0])
+                if threshold is None or relevance_score_fn(distance) >= threshold
+            ]
+
+        return search
+
+    if case["index"] == "hybrid":
+        from langchain_community.vectorstores import Chroma
+
+        from hybrid_retriever import HybridRetriever
+        from sparse_index import SparseIndex, sparse_index_dir
+
+        embeddings = PrecomputedEmbeddings(dict(zip(queries, query_vectors.tolist())))
+        retriever = HybridRetriever(
+            vectorstore=Chroma(persist_directory=persist_directory, embedding_function=embeddings),
+            sparse_index=SparseIndex(sparse_index_dir(persist_directory)),
+            fetch_k=case["fetch_k"],
+        )
+
+        def search(i, k, threshold):
+            # Fused RRF scores are not comparable with relevance thresholds
+            return [doc.id for doc in retriever.invoke(queries[i], k=k)]
+
+        return search
+
+    from vector_index import MmapRetriever, MmapVectorIndex
+
+    retriever = MmapRetriever(
+        index=MmapVectorIndex(case["index_dir"], block_rows=case["block_rows"]),
+        embeddings=PrecomputedEmbeddings({}),
+        rescore_factor=case.get("rescore_factor", 0),
+    )
+
+    def search(i, k, threshold):
+        hits = retriever.search_with_scores(query_vectors[i:i + 1], k, threshold)[0]
+        return [doc.id for doc, _ in hits]
+
+    return search
+
+
+def run_case(case, persist_directory, workdir, ks, thresholds, queue):
+    """Run every (k, threshold) pair against one index configuration, in its own process."""
+    try:
+        with open(os.path.join(workdir, "queries.json"), "r", encoding="utf-8") as f:
+            queries = json.load(f)
+        with open(os.path.join(workdir, "truth.json"), "r", encoding="utf-8") as f:
+            truth = json.load(f)
+        query_vectors = np.load(os.path.join(workdir, "query_vectors.npy"))
+
+        started = time.perf_counter()
+        search = make_searcher(case, persist_directory, queries, query_vectors)
+        search(0, 1, None)  # open files and warm the first pages
+        open_seconds = time.perf_counter() - started
+
+        results = []
+        for k in ks:
+            for threshold in thresholds:
+                if threshold is not None and case["index"] == "hybrid":
+                    continue
+                latencies, recalls, returned = [], [], []
+                for i in range(len(queries)):
+                    started = time.perf_counter()
+                    found = search(i, k, threshold)
+                    latencies.append(time.perf_counter() - started)
+                    expected = set(truth[i][:k])
+                    recalls.append(len(expected & set(found)) / max(len(expected), 1))
+                    returned.append(len(found))
+                results.append({
+                    **case,
+                    "k": k,
+                    "score_threshold": threshold,
+                    "recall_at_k": round(float(np.mean(recalls)), 4),
+                    "mean_returned": round(float(np.mean(returned)), 2),
+                    **percentiles_ms(latencies),
+                    "queries_per_second": round(len(latencies) / sum(latencies), 1),
+                })
+        size_path = case.get("index_dir") or persist_directory
+        for result in results:
+            result["open_seconds"] = round(open_seconds, 4)
+            result["peak_rss_bytes"] = peak_rss_bytes()
+            result["index_bytes"] = directory_size(size_path)
+        queue.put(results)
+    except Exception as e:
+        queue.put([{**case, "error": f"{type(e).__name__}: {e}"}])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark retriever configurations against exact brute-force neighbours."
+    )
+    parser.add_argument("--persist-directory", default=DEFAULT_PERSIST_DIRECTORY)
+    parser.add_argument("--queries", help="Query file (default: sentences sampled from the store)")
+    parser.add_argument("--num-queries", type=int, default=DEFAULT_NUM_QUERIES)
+    parser.add_argument("--indexes", default="chroma,mmap,mmap-sq8,mmap-pq,hybrid",
+                        help="Comma-separated: chroma, mmap, mmap-sq8, mmap-pq, hybrid")
+    parser.add_argument("--ks", default="3,5,10")
+    parser.add_argument("--thresholds", default="none,0.3,0.4",
+                        help="Comma-separated relevance score thresholds ('none' for plain similarity)")
+    parser.add_argument("--rescore-factors", default="0,4",
+                        help="Full-precision re-scoring factors for the compressed indexes")
+    parser.add_argument("--pq-subspaces", default="96")
+    parser.add_argument("--block-rows", default="65536", help="Rows per matrix product (mmap)")
+    parser.add_argument("--fetch-ks", default="20", help="Candidates per ranking (hybrid)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    from runtime import get_embeddings
+    from vector_index import MmapVectorIndex, export_chroma
+
+    def parse_list(value, cast):
+        return [None if item == "none" else cast(item) for item in value.split(",") if item]
+
+    ks = parse_list(args.ks, int)
+    thresholds = parse_list(args.thresholds, float)
+    indexes = parse_list(args.indexes, str)
+    persist_directory = os.path.abspath(args.persist_directory)
+
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        queries = (
+            load_queries(args.queries)
+            if args.queries
+            else sample_queries(persist_directory, args.num_queries)
+        )
+        # Queries are embedded once here so latencies measure retrieval, not the model
+        query_vectors = np.asarray(
+            embed_queries(get_embeddings(cached=False), queries), dtype=np.float32
+        )
+
+        # Ground truth: exact brute-force neighbours over a float32 export of the store
+        exact_dir = export_chroma(persist_directory, os.path.join(workdir, "exact"))
+        exact = MmapVectorIndex(exact_dir)
+        rows, _ = exact.search(query_vectors, max(ks), exact=True)
+        truth = [[exact.record(int(row))[0] for row in query_rows] for query_rows in rows]
+        exact.close()
+        with open(os.path.join(workdir, "queries.json"), "w", encoding="utf-8") as f:
+            json.dump(queries, f)
+        with open(os.path.join(workdir, "truth.json"), "w", encoding="utf-8") as f:
+            json.dump(truth, f)
+        np.save(os.path.join(workdir, "query_vectors.npy"), query_vectors)
+
+        cases = []
+        for index in indexes:
+            if index == "chroma":
+                cases.append({"index": "chroma"})
+            elif index == "hybrid":
+                from runtime import get_vector_store
+                from sparse_index import load_sparse_index
+
+                load_sparse_index(get_vector_store(persist_directory), persist_directory)
+                cases.extend(
+                    {"index": "hybrid", "fetch_k": int(fetch_k)}
+                    for fetch_k in args.fetch_ks.split(",")
+                )
+            elif index == "mmap":
+                cases.extend(
+                    {"index": "mmap", "index_dir": exact_dir, "block_rows": int(block_rows)}
+                    for block_rows in args.block_rows.split(",")
+                )
+            elif index in ("mmap-sq8", "mmap-pq"):
+                quantization = index.split("-")[1]
+                subspaces = args.pq_subspaces.split(",") if quantization == "pq" else [None]
+                for subspace_count in subspaces:
+                    name = f"{quantization}{subspace_count or ''}"
+                    index_dir = export_chroma(
+                        persist_directory,
+                        os.path.join(workdir, name),
+                        quantization=quantization,
+                        **({"pq_subspaces": int(subspace_count)} if subspace_count else {}),
+                    )
+                    for rescore_factor in parse_list(args.rescore_factors, int):
+                        case = {
+                            "index": index,
+                            "index_dir": index_dir,
+                            "block_rows": int(args.block_rows.split(",")[0]),
+                            "rescore_factor": rescore_factor,
+                        }
+                        if subspace_count:
+                            case["pq_subspaces"] = int(subspace_count)
+                        cases.append(case)
+            else:
+                raise ValueError(f"Unknown index: {index}")
+
+        # Each configuration runs in a fresh process so peak RSS is measured per index
+        context = multiprocessing.get_context("spawn")
+        results = []
+        for case in cases:
+            queue = context.Queue()
+            process = context.Process(
+                target=run_case, args=(case, persist_directory, workdir, ks, thresholds, queue)
+            )
+            process.start()
+            case_results = wait_for_result(process, queue)
+            process.join()
+            if case_results is None:
+                case_results = [{**case, "error": exit_error(process.exitcode)}]
+            error = case_results[0].get("error") if case_results else None
+            label = " ".join(f"{key}={value}" for key, value in case.items() if key != "index_dir")
+            print(f"{label:<60} {error or 'ok'}", file=sys.stderr)
+            for result in case_results:
+                result.pop("index_dir", None)
+            results.extend(case_results)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "retrieval",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "store": persist_directory,
+        "queries": len(queries),
+        "ground_truth": f"exact top-{max(ks)} by brute force",
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+
+from ingest_manifest import IngestManifest, chunk_ids, file_sha256
+from offset_splitter import OffsetCharacterTextSplitter
+from parallel_loader import ingest_workers, iter_split_pdfs
+from runtime import get_embeddings
+from sparse_index import build_sparse_index
+from streaming_ingest import add_in_batches
+
+
+def list_books(books_dir):
+    """Return the PDF files in a directory, sorted by name."""
+    if not os.path.exists(books_dir):
+        raise FileNotFoundError(
+            f"The directory {books_dir} does not exist. Please check the path."
+        )
+    return sorted(f for f in os.listdir(books_dir) if f.endswith(".pdf"))
+
+
+def update_book_store(
+    books_dir, persistent_directory, book_files=None, workers=None, model_name=None
+):
+    """Bring a Chroma store in line with a set of books, re-embedding only what changed.
+
+    ``book_files`` defaults to every PDF in ``books_dir``; books recorded in the
+    store's manifest but missing from ``book_files`` are removed. ``model_name``
+    picks the embedding model (the store's readers must use the same). Returns the
+    new manifest version, or None when the store was already up to date.
+    """
+    from langchain_community.vectorstores import Chroma
+
+    if book_files is None:
+        book_files = list_books(books_dir)
+    # Hash the books' contents
+    file_hashes = {
+        book_file: file_sha256(os.path.join(books_dir, book_file)) for book_file in book_files
+    }
+
+    # Compare against the ingestion manifest to find what needs (re-)embedding
+    manifest = IngestManifest(persistent_directory)
+    legacy_store = os.path.exists(persistent_directory) and not manifest.exists
+    changed_files, removed_files = manifest.diff(file_hashes)
+
+    if not changed_files and not removed_files and not legacy_store:
+        if not manifest.exists:
+            # Nothing to ingest: still write a manifest so readers see an (empty) store
+            manifest.save()
+            return manifest.version
+        print(f"{persistent_directory} is up to date. No need to re-ingest.")
+        return None
+
+    print(f"\n--- Updating vector store {persistent_directory} ---")
+    print(f"New or changed books: {changed_files}")
+    print(f"Removed books: {removed_files}")
+
+    # Re-load, re-split and re-embed only the new or changed books.
+    # PDF parsing and splitting run across a process pool (INGEST_WORKERS),
+    # and results come back in file order so chunk IDs stay stable. The pool
+    # is forked here, before the embedding model starts its thread pools.
+    workers = workers or ingest_workers()
+    print(f"Parsing and splitting with {workers} worker(s)")
+    split_results = iter_split_pdfs(
+        [os.path.join(books_dir, book_file) for book_file in changed_files],
+        OffsetCharacterTextSplitter,
+        {"chunk_size": 1000, "chunk_overlap": 100},
+        # Add metadata to each document indicating its source
+        sources=changed_files,
+        max_workers=workers,
+    )
+
+    # Embeddings are cached on disk, so re-ingesting known text skips the model
+    embeddings = get_embeddings(model_name)
+    db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+
+    # A store built before the manifest existed has random IDs we cannot diff against
+    if legacy_store:
+        print("Store has no ingestion manifest, clearing it for a one-off rebuild.")
+        existing_ids = db.get(include=[])["ids"]
+        if existing_ids:
+            db.delete(ids=existing_ids)
+
+    # Delete the vectors of books that are no longer in the directory
+    for book_file in removed_files:
+        stale_ids = manifest.chunk_ids(book_file)
+        if stale_ids:
+            db.delete(ids=stale_ids)
+        manifest.forget(book_file)
+        print(f"Removed {len(stale_ids)} chunks from {book_file}")
+
+    for book_file, (_, docs) in zip(changed_files, split_results):
+        ids, hashes = chunk_ids(book_file, docs)
+
+        # Chunks whose content did not change keep their ID and are not re-embedded
+        old_ids = set(manifest.chunk_ids(book_file))
+        new_ids = set(ids)
+        stale_ids = [i for i in old_ids if i not in new_ids]
+        if stale_ids:
+            db.delete(ids=stale_ids)
+        fresh = [(i, doc) for i, doc in zip(ids, docs) if i not in old_ids]
+        if fresh:
+            # Embed in fixed-size batches rather than one call per book
+            add_in_batches(db, [doc for _, doc in fresh], [i for i, _ in fresh])
+
+        manifest.record(book_file, file_hashes[book_file], ids, hashes)
+        print(
+            f"{book_file}: {len(docs)} chunks, {len(fresh)} embedded, {len(stale_ids)} deleted"
+        )
+
+    manifest.save()
+    # Rebuild the BM25 inverted index for hybrid retrieval over the updated store
+    build_sparse_index(db, persistent_directory)
+    print(f"--- Finished updating vector store (version {manifest.version}) ---")
+    return manifest.version
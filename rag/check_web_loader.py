@@ -0,0 +1,151 @@
+import argparse
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from async_web_loader import AsyncWebLoader
+
+DEFAULT_PAGES = 50
+# Per-request delay of the stand-in, so serial and concurrent fetching differ
+DEFAULT_LATENCY = 0.02
+# The stand-in answers 503 this many times before serving /flaky
+FLAKY_FAILURES = 2
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+def make_handler(latency, counts):
+    class Handler(BaseHTTPRequestHandler):
+        """Stand-in site: ETag pages, a Last-Modified page, a flaky page and a missing one."""
+
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            counts[self.path] = counts.get(self.path, 0) + 1
+            time.sleep(latency)
+            if self.path == "/missing":
+                self._send(404)
+                return
+            if self.path == "/flaky" and counts[self.path] <= FLAKY_FAILURES:
+                self._send(503, headers={"Retry-After": "0"})
+                return
+            if self.path == "/dated":
+                validators = {"Last-Modified": LAST_MODIFIED}
+                fresh = self.headers.get("If-Modified-Since") == LAST_MODIFIED
+            else:
+                validators = {"ETag": f'"v1{self.path}"'}
+                fresh = self.headers.get("If-None-Match") == validators["ETag"]
+            if fresh:
+                self._send(304, headers=validators)
+                return
+            body = (
+                f"<html lang='en'><head><title>Page {self.path}</title></head>"
+                f"<body><p>Content of {self.path}</p></body></html>"
+            ).encode("utf-8")
+            self._send(200, body, {"Content-Type": "text/html; charset=utf-8", **validators})
+
+    return Handler
+
+
+def start_stand_in(latency=DEFAULT_LATENCY):
+    """Serve the stand-in site on a free local port; returns ``(server, base_url, counts)``."""
+    counts = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency, counts))
+    threading.Thread(target=server.serve_forever, name="stand-in", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", counts
+
+
+def run_checks(base_url, counts, pages=DEFAULT_PAGES):
+    """Exercise ``AsyncWebLoader`` against the stand-in; returns ``[(check, ok, detail), ...]``."""
+    urls = [f"{base_url}/page/{i}" for i in range(pages)] + [f"{base_url}/dated"]
+    results = []
+
+    started = time.perf_counter()
+    loader = AsyncWebLoader(urls, backoff=0.01)
+    documents = list(loader.lazy_load())
+    seconds = time.perf_counter() - started
+    results.append(
+        (
+            "documents arrive in url order",
+            [doc.metadata["source"] for doc in documents] == urls,
+            f"{len(documents)} pages in {seconds:.2f}s",
+        )
+    )
+
+    from langchain_community.document_loaders import WebBaseLoader
+
+    expected = WebBaseLoader(urls[:3]).load()
+    results.append(("documents match WebBaseLoader", documents[:3] == expected, "first 3 pages"))
+
+    conditional = AsyncWebLoader(urls, validators=loader.validators)
+    unchanged = list(conditional.lazy_load())
+    results.append(
+        (
+            "conditional re-fetch skips unchanged pages",
+            not unchanged and conditional.stats["not_modified"] == len(urls),
+            str(conditional.stats),
+        )
+    )
+
+    flaky = AsyncWebLoader([f"{base_url}/flaky"], backoff=0.01)
+    recovered = list(flaky.lazy_load())
+    results.append(
+        (
+            "transient 503s are retried",
+            len(recovered) == 1 and flaky.stats["retries"] == FLAKY_FAILURES,
+            f"{counts.get('/flaky', 0)} requests",
+        )
+    )
+
+    try:
+        list(AsyncWebLoader([f"{base_url}/missing"], backoff=0.01).lazy_load())
+        raised = False
+    except Exception:
+        raised = True
+    results.append(("404 is raised by default", raised, ""))
+
+    skipping = AsyncWebLoader(
+        [f"{base_url}/missing", urls[0]], backoff=0.01, continue_on_failure=True
+    )
+    kept = list(skipping.lazy_load())
+    results.append(
+        (
+            "404 is skipped with continue_on_failure",
+            len(kept) == 1 and skipping.stats["failed"] == 1,
+            str(skipping.stats),
+        )
+    )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check AsyncWebLoader against a local HTTP stand-in server."
+    )
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGES)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY)
+    args = parser.parse_args(argv)
+
+    server, base_url, counts = start_stand_in(args.latency)
+    try:
+        results = run_checks(base_url, counts, args.pages)
+    finally:
+        server.shutdown()
+    for check, ok, detail in results:
+        print(f"{'ok' if ok else 'FAIL':<5} {check}{f' ({detail})' if detail else ''}")
+    return 0 if all(ok for _, ok, _ in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
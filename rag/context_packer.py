@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+# Token counts live next to the Chroma files so they move with the store
+TOKEN_COUNTS_NAME = "token_counts.sqlite"
+DEFAULT_ANSWER_TOKENS = 512
+# A chunk cut down to fewer tokens than this is not worth its place in the prompt
+DEFAULT_MIN_CHUNK_TOKENS = 32
+DEFAULT_SEPARATOR = "\n\n"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+def tokenizer_name(llm):
+    """Identify the tokenizer behind an LLM, so counts from another model are not reused."""
+    # A server client names the model it is serving now, not just where the server is
+    served_model = getattr(llm, "served_model", None)
+    if callable(served_model):
+        name = served_model()
+        if name:
+            return name
+    for attr in ("model_path", "base_url", "model_name", "model"):
+        name = getattr(llm, attr, None)
+        if isinstance(name, str) and name:
+            return os.path.basename(name.rstrip("/")) or name
+    return type(llm).__name__
+
+
+def context_budget(n_ctx, overhead_tokens, answer_tokens=DEFAULT_ANSWER_TOKENS):
+    """Tokens left for retrieved context: the window minus the prompt around it and the answer."""
+    return max(0, n_ctx - overhead_tokens - answer_tokens)
+
+
+def sentence_spans(text):
+    """``(start, end)`` offsets of the sentences in ``text``, skipping blank ones."""
+    spans, start = [], 0
+    for boundary in _SENTENCE_END.finditer(text):
+        spans.append((start, boundary.start()))
+        start = boundary.end()
+    spans.append((start, len(text)))
+    return [(start, end) for start, end in spans if text[start:end].strip()]
+
+
+class TokenCounter:
+    """Counts tokens with the model's tokenizer, caching per-chunk counts on disk.
+
+    ``count_tokens`` is the model's own counter (e.g. ``llm.get_num_tokens``).
+    Counts are keyed on (tokenizer name, hash of the text) in
+    ``token_counts.sqlite`` inside the store directory, so each chunk is
+    tokenized once per model rather than on every query.
+    """
+
+    def __init__(self, count_tokens, tokenizer, persistent_directory=None):
+        self.count_tokens = count_tokens
+        self.tokenizer = tokenizer
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if persistent_directory:
+            os.makedirs(persistent_directory, exist_ok=True)
+            self._conn = sqlite3.connect(
+                os.path.join(persistent_directory, TOKEN_COUNTS_NAME), check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_counts (key BLOB PRIMARY KEY, tokens INTEGER)"
+            )
+            self._conn.commit()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.tokenizer}\0{text}".encode("utf-8")).digest()
+
+    def __call__(self, text):
+        """Count without caching (for text that is not a stored chunk)."""
+        return self.count_tokens(text)
+
+    def count_chunks(self, texts):
+        """Token counts of stored chunks, tokenizing only those not counted before."""
+        texts = list(texts)
+        if self._conn is None:
+            self.misses += len(texts)
+            return [self.count_tokens(text) for text in texts]
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(
+                    self._conn.execute(
+                        f"SELECT key, tokens FROM token_counts WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            counted = {key: self.count_tokens(text) for key, text in missing.items()}
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO token_counts (key, tokens) VALUES (?, ?)",
+                    counted.items(),
+                )
+                self._conn.commit()
+            found.update(counted)
+        return [found[key] for key in keys]
+
+
+def truncate_to_budget(text, budget, count_tokens):
+    """Longest run of whole leading sentences of ``text`` within ``budget`` tokens ("" if none).
+
+    The original text is cut at the end of the last sentence kept, so paragraph breaks
+    and other whitespace between sentences are preserved.
+    """
+    spans = sentence_spans(text)
+    # Per-sentence counts give the cut; the exact count of the kept text confirms it
+    end, total = 0, 0
+    for start, stop in spans:
+        total += count_tokens(text[start:stop])
+        if total > budget:
+            break
+        end += 1
+    while end:
+        candidate = text[spans[0][0] : spans[end - 1][1]]
+        if count_tokens(candidate) <= budget:
+            return candidate
+        end -= 1
+    return ""
+
+
+def pack_context(
+    docs,
+    budget,
+    counter,
+    scores=None,
+    separator=DEFAULT_SEPARATOR,
+    min_chunk_tokens=DEFAULT_MIN_CHUNK_TOKENS,
+):
+    """Join retrieved chunks into a context of at most ``budget`` tokens.
+
+    Chunks are taken greedily, best ``scores`` first (retrieval order when
+    None): a chunk that fits is added whole; one that does not is cut to its
+    leading sentences if at least ``min_chunk_tokens`` of it fit, and later,
+    smaller chunks may still fill the rest. Returns ``(text, packed docs,
+    tokens used)``, with cut chunks as copies holding the text that was kept;
+    the token total counts separators and is exact up to how the tokenizer
+    joins the pieces.
+    """
+    docs = list(docs)
+    order = range(len(docs))
+    if scores is not None:
+        order = sorted(order, key=lambda i: -scores[i])
+    counts = counter.count_chunks(doc.page_content for doc in docs)
+    separator_tokens = counter(separator)
+
+    pieces, packed, used = [], [], 0
+    for i in order:
+        room = budget - used - (separator_tokens if pieces else 0)
+        if room <= 0:
+            break
+        doc = docs[i]
+        tokens = counts[i]
+        if tokens > room:
+            if room < min_chunk_tokens:
+                continue
+            text = truncate_to_budget(doc.page_content, room, counter)
+            tokens = counter(text) if text else 0
+            if tokens < min_chunk_tokens:
+                continue
+            doc = doc.model_copy(update={"page_content": text})
+        used += tokens + (separator_tokens if pieces else 0)
+        pieces.append(doc.page_content)
+        packed.append(doc)
+    return separator.join(pieces), packed, used
@@ -0,0 +1,317 @@
+import hashlib
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+
+from embedding_cache import normalize_text
+from streaming_ingest import stream_chunk_id, stream_position
+
+# 128 permutations in 32 bands of 4 rows: pairs above ~0.42 Jaccard become
+# candidates, which are then checked against the threshold
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 32
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_SHINGLE_WORDS = 5
+# Boilerplate can repeat on every page of a crawl; keep metadata bounded
+MAX_MERGED_SOURCES = 100
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text, shingle_words=DEFAULT_SHINGLE_WORDS):
+    """Return the set of lower-cased word n-grams of a text."""
+    words = normalize_text(text).lower().split()
+    if len(words) <= shingle_words:
+        return {" ".join(words)} if words else set()
+    return {
+        " ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)
+    }
+
+
+# Page-level metadata WebBaseLoader/AsyncWebLoader put on every chunk of a page
+PAGE_METADATA_KEYS = ("title", "description", "language")
+
+
+def _split_sources(value):
+    return [source for source in str(value or "").split(", ") if source]
+
+
+def retire_source(db, source, changed_sources=()):
+    """Remove the stored chunks of a re-fetched page before its new chunks are added.
+
+    A chunk that other pages' duplicates were merged into stands in for their
+    copies, which were never stored. If one of those pages is not in
+    ``changed_sources`` (it is not being re-added), the chunk is kept and
+    re-homed: its ``source`` and page metadata become that page's, and the
+    changed pages leave ``duplicate_sources``. Every other chunk of ``source``
+    is deleted. Returns ``(deleted, rehomed)`` counts.
+    """
+    changed_sources = set(changed_sources) | {source}
+    stored = db.get(where={"source": source}, include=["metadatas"])
+    stale_ids, rehomed_ids, rehomed_metadatas = [], [], []
+    page_metadata = {}
+    for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+        metadata = metadata or {}
+        sources = _split_sources(metadata.get("duplicate_sources"))
+        others = [s for s in sources if s not in changed_sources]
+        if not others:
+            stale_ids.append(chunk_id)
+            continue
+        home, remaining = others[0], others[1:]
+        if home not in page_metadata:
+            sibling = db.get(where={"source": home}, limit=1, include=["metadatas"])["metadatas"]
+            page_metadata[home] = {
+                key: (sibling[0] or {}).get(key) if sibling else None
+                for key in PAGE_METADATA_KEYS
+            }
+        # The new home's own copy and the changed pages' copies are no longer duplicates
+        duplicates = int(metadata.get("duplicates", 0)) - (len(sources) - len(remaining))
+        rehomed_ids.append(chunk_id)
+        rehomed_metadatas.append(
+            {
+                **metadata,
+                **page_metadata[home],
+                "source": home,
+                "duplicates": duplicates if duplicates > 0 else None,
+                "duplicate_sources": ", ".join(remaining) if remaining else None,
+            }
+        )
+    if rehomed_ids:
+        # None removes a key in a Chroma metadata update
+        db._collection.update(ids=rehomed_ids, metadatas=rehomed_metadatas)
+    if stale_ids:
+        db.delete(ids=stale_ids)
+    return len(stale_ids), len(rehomed_ids)
+
+
+class NearDuplicateFilter:
+    """Drop chunks that are (near-)duplicates of a chunk already kept.
+
+    Exact copies are caught by a hash of the normalized text. Everything else
+    gets a MinHash signature over word shingles; LSH banding finds earlier
+    chunks that share a band, and a chunk is dropped when its estimated Jaccard
+    similarity to one of them reaches ``threshold``. The source of a dropped
+    chunk is merged into the metadata of the chunk that was kept.
+
+    Only signatures are held (``num_perm`` 32-bit values per kept chunk), so the
+    filter can sit in a streaming pipeline between the splitter and the store.
+    """
+
+    def __init__(
+        self,
+        threshold=DEFAULT_THRESHOLD,
+        num_perm=DEFAULT_NUM_PERM,
+        bands=DEFAULT_BANDS,
+        shingle_words=DEFAULT_SHINGLE_WORDS,
+        seed=1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        # a * h + b stays below 2**64 for 32-bit a, b and h, so nothing overflows
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._exact = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self._positions = []
+        # Position of a kept chunk -> duplicates merged into it and their sources
+        self._merged = {}
+        # Stream position the next kept chunk is stored at
+        self.next_position = 0
+        self.chunks = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.bytes_saved = 0
+
+    def signature(self, text):
+        """Return the MinHash signature of a text (None if it has no words)."""
+        grams = shingles(text, self.shingle_words)
+        if not grams:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams)
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        rows = signature.reshape(self.bands, self.rows)
+        return [rows[band].tobytes() for band in range(self.bands)]
+
+    def _find_near(self, signature, band_keys):
+        """Return the kept index most similar to ``signature`` above the threshold."""
+        candidates = set()
+        for bucket, key in zip(self._buckets, band_keys):
+            candidates.update(bucket.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for index in candidates:
+            similarity = np.count_nonzero(self._signatures[index] == signature) / self.num_perm
+            if similarity >= best_similarity:
+                best, best_similarity = index, similarity
+        return best
+
+    def _merge(self, position, doc):
+        merged = self._merged.setdefault(position, {"duplicates": 0, "sources": []})
+        merged["duplicates"] += 1
+        source = doc.metadata.get("source")
+        sources = merged["sources"]
+        if source is not None and source not in sources and len(sources) < MAX_MERGED_SOURCES:
+            sources.append(source)
+        self.bytes_saved += len(doc.page_content.encode("utf-8"))
+
+    def filter(self, chunks):
+        """Yield the chunks that are not near-duplicates of an earlier chunk."""
+        for doc in chunks:
+            self.chunks += 1
+            exact_key = hashlib.sha256(normalize_text(doc.page_content).encode("utf-8")).digest()
+            position = self._exact.get(exact_key)
+            if position is not None:
+                self.exact_duplicates += 1
+                self._merge(position, doc)
+                continue
+
+            signature = self.signature(doc.page_content)
+            band_keys = None
+            if signature is not None:
+                band_keys = self._band_keys(signature)
+                index = self._find_near(signature, band_keys)
+                if index is not None:
+                    self.near_duplicates += 1
+                    self._merge(self._positions[index], doc)
+                    continue
+
+            # Kept: stored at the next position of the output stream
+            self._keep(exact_key, signature, band_keys, self.next_position)
+            self.next_position += 1
+            yield doc
+
+    def _keep(self, exact_key, signature, band_keys, position):
+        self._exact[exact_key] = position
+        if signature is not None:
+            index = len(self._signatures)
+            self._signatures.append(signature)
+            self._positions.append(position)
+            for bucket, key in zip(self._buckets, band_keys):
+                bucket.setdefault(key, []).append(index)
+
+    def remember(self, doc, position, forget_sources=()):
+        """Register a chunk already stored at stream ``position`` as kept.
+
+        Chunks filtered afterwards are checked against it, and kept ones are
+        numbered after the highest remembered position. Duplicate sources
+        merged into it at build time are carried over, except those in
+        ``forget_sources`` (pages whose chunks are being replaced); the
+        duplicate count drops by one per forgotten source, so it is approximate
+        when a page repeated the same boilerplate.
+        """
+        exact_key = hashlib.sha256(normalize_text(doc.page_content).encode("utf-8")).digest()
+        signature = self.signature(doc.page_content)
+        band_keys = self._band_keys(signature) if signature is not None else None
+        self._keep(exact_key, signature, band_keys, position)
+        self.next_position = max(self.next_position, position + 1)
+
+        metadata = doc.metadata
+        if "duplicates" not in metadata and "duplicate_sources" not in metadata:
+            return
+        sources = _split_sources(metadata.get("duplicate_sources"))
+        kept_sources = [s for s in sources if s not in forget_sources]
+        duplicates = int(metadata.get("duplicates", 0)) - (len(sources) - len(kept_sources))
+        # Recorded even at zero, so apply_merged_metadata clears the stale keys
+        self._merged[position] = {"duplicates": max(duplicates, 0), "sources": kept_sources}
+
+    def remember_store(self, db, stream_name, forget_sources=(), batch_size=500):
+        """``remember`` every chunk of ``stream_name`` in a Chroma store, ``batch_size`` at a time.
+
+        Lets an update to a deduplicated store (new or re-fetched pages) drop
+        the boilerplate the initial build already holds, and number its new
+        chunks after the stored ones. Returns the number of chunks remembered.
+        """
+        remembered = 0
+        offset = 0
+        while True:
+            stored = db.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            if not stored["ids"]:
+                break
+            offset += len(stored["ids"])
+            for chunk_id, text, metadata in zip(
+                stored["ids"], stored["documents"], stored["metadatas"]
+            ):
+                position = stream_position(chunk_id, stream_name)
+                if position is None:
+                    continue
+                self.remember(
+                    Document(page_content=text, metadata=metadata or {}), position, forget_sources
+                )
+                remembered += 1
+        return remembered
+
+    @property
+    def kept(self):
+        return self.chunks - self.exact_duplicates - self.near_duplicates
+
+    @property
+    def dropped(self):
+        return self.exact_duplicates + self.near_duplicates
+
+    def merged_metadata(self, metadata, position):
+        """Return ``metadata`` of a kept chunk with its duplicates' sources merged in.
+
+        The result is meant for a Chroma metadata update: keys that no longer
+        apply (a remembered chunk whose duplicates were all forgotten) are set
+        to None, which removes them.
+        """
+        merged = dict(metadata)
+        entry = self._merged.get(position)
+        if entry is not None:
+            merged["duplicates"] = entry["duplicates"] or None
+            sources = [s for s in entry["sources"] if s != metadata.get("source")]
+            # Chroma metadata values must be scalars
+            merged["duplicate_sources"] = ", ".join(map(str, sources)) if sources else None
+        return merged
+
+    def apply_merged_metadata(self, db, stream_name):
+        """Write merged source metadata onto kept chunks already added to a Chroma store.
+
+        Chunks are embedded as soon as they are kept, before later duplicates are
+        seen, so the merge is applied to the stored metadata once streaming is done.
+        """
+        positions = sorted(self._merged)
+        ids = [stream_chunk_id(stream_name, position) for position in positions]
+        for start in range(0, len(ids), 500):
+            batch_ids = ids[start:start + 500]
+            stored = db.get(ids=batch_ids, include=["metadatas"])
+            position_of = dict(zip(batch_ids, positions[start:start + 500]))
+            metadatas = [
+                self.merged_metadata(metadata or {}, position_of[chunk_id])
+                for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+            ]
+            if metadatas:
+                db._collection.update(ids=stored["ids"], metadatas=metadatas)
+        return len(ids)
+
+    def stats(self):
+        return {
+            "chunks": self.chunks,
+            "kept": self.kept,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "embeddings_saved": self.dropped,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def report(self):
+        """Return a one-line summary of what deduplication saved."""
+        share = self.dropped / self.chunks if self.chunks else 0.0
+        return (
+            f"Deduplication: kept {self.kept} of {self.chunks} chunks, skipped "
+            f"{self.dropped} embeddings ({self.exact_duplicates} exact, "
+            f"{self.near_duplicates} near; {share:.0%}), saved {self.bytes_saved:,} bytes of text"
+        )
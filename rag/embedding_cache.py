@@ -0,0 +1,207 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(current_dir, "database", "embedding_cache.sqlite")
+# 2 GiB holds roughly 700k 768-dimensional float32 vectors
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+
+def normalize_text(text):
+    """Normalize text so trivially different copies share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def embedding_model_name(embeddings):
+    """Best-effort name of the model behind an embeddings object."""
+    for attr in ("model_name", "model", "model_id"):
+        name = getattr(embeddings, attr, None)
+        if isinstance(name, str) and name:
+            return name
+    return type(embeddings).__name__
+
+
+# Models whose embed_query(text) is exactly embed_documents([text])[0], so a
+# list of queries can go through the model in one batched forward pass
+_BATCHABLE_QUERY_MODELS = ("HuggingFaceEmbeddings",)
+
+
+def embed_queries(embeddings, texts):
+    """Embed several queries, in one batched model call where that is equivalent."""
+    texts = list(texts)
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if type(embeddings).__name__ in _BATCHABLE_QUERY_MODELS:
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper backed by a persistent, size-bounded SQLite cache.
+
+    Vectors are keyed on (model name, hash of the normalized text) and stored
+    as packed float32, so any store built from overlapping text (a rebuild, a
+    sibling store, a later query) skips the model forward pass. When the cache
+    grows past ``max_bytes`` the least recently used vectors are evicted.
+    """
+
+    def __init__(self, embeddings, cache_path=None, max_bytes=None, model_name=None):
+        self.embeddings = embeddings
+        self.model_name = model_name or embedding_model_name(embeddings)
+        self.cache_path = cache_path or os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes or int(
+            os.getenv("EMBEDDING_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+        )
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+
+    def _key(self, text):
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).digest()
+
+    def _lookup(self, keys):
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        return found
+
+    def _store(self, items):
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used vectors until the cache fits in max_bytes."""
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% so we do not evict on every subsequent insert
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_access")
+        victims = []
+        for key, size in cursor:
+            if total <= target:
+                break
+            victims.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+
+    def embed_documents(self, texts):
+        """Embed texts, running the model only on texts not already cached."""
+        texts = list(texts)
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            cached = self._lookup(keys)
+            self._conn.commit()
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            with self._lock:
+                self._store(computed.items())
+                self._conn.commit()
+            cached.update(computed)
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text):
+        """Embed a query, reusing a cached vector when available."""
+        key = self._key("query\0" + text)
+        with self._lock:
+            cached = self._lookup([key])
+            self._conn.commit()
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._store([(key, vector)])
+            self._conn.commit()
+        return vector
+
+    def embed_queries(self, texts):
+        """Embed a batch of queries, running the model once on the uncached ones.
+
+        Shares cache entries with ``embed_query``.
+        """
+        texts = list(texts)
+        keys = [self._key("query\0" + text) for text in texts]
+        with self._lock:
+            cached = self._lookup(keys)
+            self._conn.commit()
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = embed_queries(self.embeddings, missing.values())
+            computed = dict(zip(missing.keys(), vectors))
+            with self._lock:
+                self._store(computed.items())
+                self._conn.commit()
+            cached.update(computed)
+        return [list(cached[key]) for key in keys]
+
+    def stats(self):
+        """Return cache hit/miss counts and the on-disk cache size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict, Field
+
+from sparse_index import SparseIndex
+
+DEFAULT_FETCH_K = 20
+# Standard RRF constant: damps the advantage of the very top ranks
+DEFAULT_RRF_K = 60
+
+# Dense searches run here so the BM25 search can proceed alongside them
+_dense_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-dense")
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=DEFAULT_RRF_K, weights=None):
+    """Fuse ranked ID lists: ``score(id) = sum(weight / (rrf_k + rank))``.
+
+    Returns ``[(id, score), ...]`` best first; ties keep first-seen order.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _to_documents(ids, texts, metadatas):
+    return {
+        chunk_id: Document(id=chunk_id, page_content=text or "", metadata=metadata or {})
+        for chunk_id, text, metadata in zip(ids, texts, metadatas)
+    }
+
+
+class HybridRetriever(BaseRetriever):
+    """Retriever fusing BM25 over an on-disk inverted index with Chroma vector search.
+
+    Both searches fetch ``fetch_k`` candidates; the rankings are merged with
+    reciprocal rank fusion and the best ``k`` chunks returned. The dense search
+    (query embedding + Chroma) runs in a worker thread while BM25 runs on the
+    calling thread. With ``latency_budget_ms`` set, BM25 skips its most common
+    query terms once the budget is spent; the dense search is always waited
+    for, so its ranking is never dropped from the fusion.
+
+    ``search_kwargs`` may carry a Chroma ``filter`` / ``where_document``; BM25
+    hits are checked against it when their text is fetched from the store.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: VectorStore
+    sparse_index: SparseIndex
+    k: int = 4
+    fetch_k: int = DEFAULT_FETCH_K
+    rrf_k: int = DEFAULT_RRF_K
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+    latency_budget_ms: float | None = None
+    search_kwargs: dict = Field(default_factory=dict)
+
+    def _dense(self, query, search_kwargs):
+        vector = self.vectorstore.embeddings.embed_query(query)
+        results = self.vectorstore._collection.query(
+            query_embeddings=[vector],
+            n_results=self.fetch_k,
+            where=search_kwargs.get("filter"),
+            where_document=search_kwargs.get("where_document"),
+            include=["documents", "metadatas"],
+        )
+        ids = results["ids"][0]
+        return ids, _to_documents(ids, results["documents"][0], results["metadatas"][0])
+
+    def _fetch(self, ids, search_kwargs):
+        """Fetch text and metadata of chunks, keeping only those matching the filters."""
+        if not ids:
+            return {}
+        results = self.vectorstore._collection.get(
+            ids=ids,
+            where=search_kwargs.get("filter"),
+            where_document=search_kwargs.get("where_document"),
+            include=["documents", "metadatas"],
+        )
+        return _to_documents(results["ids"], results["documents"], results["metadatas"])
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        search_kwargs = self.search_kwargs | kwargs
+        k = search_kwargs.get("k", self.k)
+        deadline = None
+        if self.latency_budget_ms is not None:
+            deadline = time.perf_counter() + self.latency_budget_ms / 1000.0
+
+        dense_future = _dense_pool.submit(self._dense, query, search_kwargs)
+        sparse_hits = self.sparse_index.search(query, self.fetch_k, deadline)
+
+        dense_ids, documents = dense_future.result()
+
+        missing = [chunk_id for chunk_id, _ in sparse_hits if chunk_id not in documents]
+        documents.update(self._fetch(missing, search_kwargs))
+        # BM25 hits filtered out (or deleted from the store) drop out of the ranking
+        sparse_ids = [chunk_id for chunk_id, _ in sparse_hits if chunk_id in documents]
+
+        fused = reciprocal_rank_fusion(
+            [dense_ids, sparse_ids], self.rrf_k, [self.dense_weight, self.sparse_weight]
+        )
+        return [documents[chunk_id] for chunk_id, _ in fused[:k]]
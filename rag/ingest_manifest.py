@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+
+# The manifest lives next to the Chroma files so it moves with the store
+MANIFEST_NAME = "ingest_manifest.json"
+CHROMA_SQLITE_NAME = "chroma.sqlite3"
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_version(persistent_directory):
+    """Return a value that changes whenever the store in a directory is re-ingested.
+
+    Stores with a manifest use its version, which ``IngestManifest.save`` bumps
+    on every ingest. Other stores fall back to the modification time and size
+    of Chroma's SQLite file, which any write changes.
+    """
+    manifest_path = os.path.join(persistent_directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return ("manifest", json.load(f).get("version", 0))
+    try:
+        stat = os.stat(os.path.join(persistent_directory, CHROMA_SQLITE_NAME))
+    except FileNotFoundError:
+        return None
+    return ("sqlite", stat.st_mtime_ns, stat.st_size)
+
+
+def chunk_sha256(doc):
+    """Return the SHA-256 hex digest of a chunk's text and metadata."""
+    payload = json.dumps(
+        [doc.page_content, doc.metadata], sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(source, docs):
+    """Build stable vector store IDs (and content hashes) for the chunks of one source.
+
+    The ID is derived from the chunk content, so an unchanged chunk keeps its ID
+    (and its embedding) when the rest of the file is edited. Identical chunks
+    within the same source are told apart by an occurrence counter.
+    """
+    ids, hashes, seen = [], [], {}
+    for doc in docs:
+        chunk_hash = chunk_sha256(doc)
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        ids.append(f"{source}:{chunk_hash[:32]}:{occurrence}")
+        hashes.append(chunk_hash)
+    return ids, hashes
+
+
+class IngestManifest:
+    """Record of which source files (and chunks) are currently in a vector store."""
+
+    def __init__(self, persistent_directory):
+        self.path = os.path.join(persistent_directory, MANIFEST_NAME)
+        self.version = 0
+        self.files = {}
+        self.exists = os.path.exists(self.path)
+        if self.exists:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.version = data.get("version", 0)
+            self.files = data.get("files", {})
+
+    def diff(self, file_hashes):
+        """Compare current source hashes with the manifest.
+
+        Returns a tuple of (new or changed sources, removed sources).
+        """
+        changed = [
+            source
+            for source, file_hash in sorted(file_hashes.items())
+            if self.files.get(source, {}).get("sha256") != file_hash
+        ]
+        removed = sorted(source for source in self.files if source not in file_hashes)
+        return changed, removed
+
+    def chunk_ids(self, source):
+        """Return the vector store IDs recorded for a source."""
+        return [chunk["id"] for chunk in self.files.get(source, {}).get("chunks", [])]
+
+    def record(self, source, file_hash, ids, hashes):
+        """Record the chunks now stored for a source."""
+        self.files[source] = {
+            "sha256": file_hash,
+            "chunks": [{"id": i, "sha256": h} for i, h in zip(ids, hashes)],
+        }
+
+    def forget(self, source):
+        """Drop a source from the manifest."""
+        self.files.pop(source, None)
+
+    def save(self):
+        """Bump the index version and write the manifest atomically."""
+        self.version += 1
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.exists = True
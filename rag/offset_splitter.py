@@ -0,0 +1,230 @@
+import copy
+import logging
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, compress
+from operator import add, sub
+
+from langchain_core.documents import Document
+from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+# Pieces are measured one block of text at a time, so the temporary piece
+# strings never add up to much more than one block
+PIECE_BLOCK_CHARS = 1 << 16
+
+
+def _raw_piece_lengths(text, lo, hi, separator):
+    """Return the lengths of ``text[lo:hi].split(separator)``."""
+    lengths = []
+    sep_len = len(separator)
+    start = lo
+    while True:
+        # Cut blocks at a separator so no piece straddles two blocks
+        cut = text.find(separator, min(start + PIECE_BLOCK_CHARS, hi), hi)
+        if cut == -1:
+            lengths.extend(map(len, text[start:hi].split(separator)))
+            return lengths
+        lengths.extend(map(len, text[start:cut].split(separator)))
+        start = cut + sep_len
+
+
+class _Pieces:
+    """Offsets of the pieces ``_split_text_with_regex`` produces for a literal separator.
+
+    Besides piece ``starts``/``ends`` it holds the prefix sums the merge step
+    searches: ``cum[k]`` is the merged length of pieces ``0..k-1`` with one merge
+    separator after each, and ``breaks[k]`` counts the boundaries before piece
+    ``k`` where two pieces are not exactly one merge separator apart in the text.
+    """
+
+    def __init__(self, text, lo, hi, separator, keep_separator, merge_sep_len):
+        if not separator:
+            starts = list(range(lo, hi))
+            ends = list(range(lo + 1, hi + 1))
+        else:
+            sep_len = len(separator)
+            lengths = _raw_piece_lengths(text, lo, hi, separator)
+            starts = list(accumulate(map(sep_len.__add__, lengths[:-1]), initial=lo))
+            ends = list(map(add, starts, lengths))
+            if keep_separator == "end":
+                # Every piece but the last carries the separator that follows it
+                ends = [end + sep_len for end in ends]
+                ends[-1] = hi
+            elif keep_separator:
+                # Every piece but the first starts with the separator before it
+                starts = [lo] + [start - sep_len for start in starts[1:]]
+            # Drop empty pieces, as the parent does after re.split
+            non_empty = list(map(sub, ends, starts))
+            starts = list(compress(starts, non_empty))
+            ends = list(compress(ends, non_empty))
+        self.starts = starts
+        self.ends = ends
+        self.lengths = list(map(sub, ends, starts))
+        self.cum = list(accumulate(map(merge_sep_len.__add__, self.lengths), initial=0))
+        gaps = map(sub, starts[1:], ends)
+        self.breaks = list(accumulate(map(merge_sep_len.__ne__, gaps), initial=0))
+
+
+class _OffsetSplitterMixin:
+    """Compute chunk boundaries as offsets and only slice the text once per chunk.
+
+    Produces exactly the chunks of the LangChain splitter it is mixed into. The
+    greedy merge of ``TextSplitter._merge_splits`` is replayed with binary
+    searches over prefix sums, so the Python-level work is per chunk rather
+    than per piece. The fast path covers literal separators with ``len`` as the
+    length function (the configuration used throughout this repo); anything
+    else falls back to the parent implementation.
+    """
+
+    def _use_offsets(self):
+        return self._length_function is len and not self._is_separator_regex
+
+    def _emit(self, text, pieces, lo, hi, separator, out):
+        """Append the chunk made of pieces [lo, hi) as ``(start, end, text_or_None)``."""
+        if hi <= lo:
+            return
+        starts, ends = pieces.starts, pieces.ends
+        if pieces.breaks[hi - 1] == pieces.breaks[lo]:
+            # Pieces are adjacent in the text, so the joined chunk is one slice
+            start, end = starts[lo], ends[hi - 1]
+            if self._strip_whitespace:
+                while start < end and text[start].isspace():
+                    start += 1
+                while end > start and text[end - 1].isspace():
+                    end -= 1
+            if end > start:
+                out.append((start, end, None))
+            return
+        # Empty pieces were dropped between these pieces; join like the parent does
+        chunk = separator.join(text[starts[k]:ends[k]] for k in range(lo, hi))
+        start = starts[lo]
+        if self._strip_whitespace:
+            stripped = chunk.lstrip()
+            start += len(chunk) - len(stripped)
+            chunk = stripped.rstrip()
+        if chunk:
+            out.append((start, start + len(chunk), chunk))
+
+    def _merge_range(self, text, pieces, first, last, separator, out):
+        """Offset version of ``TextSplitter._merge_splits`` over pieces [first, last).
+
+        The parent grows a window of pieces until the next piece would overflow
+        ``chunk_size``, emits it, then drops pieces from the front while the
+        window is longer than ``chunk_overlap`` or the next piece still does not
+        fit. Both stopping points are monotone in ``pieces.cum``, so each one is
+        a single bisect.
+        """
+        if last <= first:
+            return
+        cum = pieces.cum
+        sep_len = len(separator)
+        chunk_size, chunk_overlap = self._chunk_size, self._chunk_overlap
+
+        lo, cur = first, first + 1
+        while cur < last:
+            # First piece h >= cur that does not fit in a window starting at lo
+            h = bisect_right(cum, cum[lo] + sep_len + chunk_size, cur + 1, last + 1) - 1
+            if h >= last:
+                break
+            total = cum[h] - cum[lo] - sep_len
+            if total > chunk_size:
+                logger.warning(
+                    "Created a chunk of size %d, which is longer than the specified %d",
+                    total,
+                    chunk_size,
+                )
+            self._emit(text, pieces, lo, h, separator, out)
+            # First window start within the overlap that also leaves room for h
+            floor = max(cum[h] - sep_len - chunk_overlap, cum[h + 1] - sep_len - chunk_size)
+            lo = bisect_left(cum, floor, lo, h)
+            cur = h + 1
+        self._emit(text, pieces, lo, last, separator, out)
+
+    def split_text_spans(self, text):
+        """Return ``(start, end, chunk_or_None)`` for each chunk of ``text``.
+
+        ``chunk_or_None`` is None when the chunk is exactly ``text[start:end]``.
+        """
+        out = []
+        self._spans(text, out)
+        return out
+
+    def split_text(self, text):
+        if not self._use_offsets():
+            return super().split_text(text)
+        return [
+            chunk if chunk is not None else text[start:end]
+            for start, end, chunk in self.split_text_spans(text)
+        ]
+
+    def create_documents(self, texts, metadatas=None):
+        """Create documents from the chunk offsets, building each ``Document`` once.
+
+        With ``add_start_index`` the exact source offset is recorded instead of
+        being searched for with ``str.find``.
+        """
+        if not self._use_offsets():
+            return super().create_documents(texts, metadatas)
+        metadatas_ = metadatas or [{}] * len(texts)
+        documents = []
+        for i, text in enumerate(texts):
+            for start, end, chunk in self.split_text_spans(text):
+                metadata = copy.deepcopy(metadatas_[i])
+                if self._add_start_index:
+                    metadata["start_index"] = start
+                page_content = chunk if chunk is not None else text[start:end]
+                documents.append(Document(page_content=page_content, metadata=metadata))
+        return documents
+
+
+class OffsetCharacterTextSplitter(_OffsetSplitterMixin, CharacterTextSplitter):
+    """Drop-in ``CharacterTextSplitter`` that works on offsets."""
+
+    def _spans(self, text, out):
+        merge_separator = "" if self._keep_separator else self._separator
+        pieces = _Pieces(
+            text, 0, len(text), self._separator, self._keep_separator, len(merge_separator)
+        )
+        self._merge_range(text, pieces, 0, len(pieces.starts), merge_separator, out)
+
+
+class OffsetRecursiveCharacterTextSplitter(_OffsetSplitterMixin, RecursiveCharacterTextSplitter):
+    """Drop-in ``RecursiveCharacterTextSplitter`` that works on offsets."""
+
+    def _spans(self, text, out):
+        self._split_spans(text, 0, len(text), self._separators, out)
+
+    def _split_spans(self, text, lo, hi, separators, out):
+        """Offset version of ``RecursiveCharacterTextSplitter._split_text``."""
+        # Use the first separator that occurs in this part of the text
+        separator = separators[-1]
+        new_separators = []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, lo, hi) != -1:
+                separator = candidate
+                new_separators = separators[i + 1:]
+                break
+
+        merge_separator = "" if self._keep_separator else separator
+        pieces = _Pieces(text, lo, hi, separator, self._keep_separator, len(merge_separator))
+
+        # Runs of pieces shorter than chunk_size are merged; longer pieces are
+        # split again with the remaining separators (or kept whole)
+        chunk_size = self._chunk_size
+        first = 0
+        for index, length in enumerate(pieces.lengths):
+            if length < chunk_size:
+                continue
+            self._merge_range(text, pieces, first, index, merge_separator, out)
+            first = index + 1
+            if not new_separators:
+                out.append((pieces.starts[index], pieces.ends[index], None))
+            else:
+                self._split_spans(
+                    text, pieces.starts[index], pieces.ends[index], new_separators, out
+                )
+        self._merge_range(text, pieces, first, len(pieces.starts), merge_separator, out)
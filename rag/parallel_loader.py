@@ -0,0 +1,175 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+
+# Number of PDF pages parsed and split by one worker task
+DEFAULT_PAGES_PER_TASK = 32
+
+
+def ingest_workers(default=None):
+    """Return the ingestion pool size from INGEST_WORKERS (defaults to all cores)."""
+    value = os.getenv("INGEST_WORKERS")
+    if value:
+        return max(1, int(value))
+    return default or os.cpu_count() or 1
+
+
+def _pdf_page_count(file_path):
+    """Return the number of pages in a PDF without extracting any text."""
+    import pypdf
+
+    return len(pypdf.PdfReader(file_path).pages)
+
+
+def _load_and_split_pages(task):
+    """Parse a page range of one PDF and split it into chunks (runs in a worker)."""
+    import pypdf
+
+    file_path, start, end, source, splitter_cls, splitter_kwargs = task
+    reader = pypdf.PdfReader(file_path)
+    page_labels = reader.page_labels
+    documents = []
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain")
+        # Pages carry only source, page and page_label (just source when the caller
+        # tags them). Newer PyPDFLoader releases also copy the PDF's document info
+        # (producer, creator, creationdate, total_pages, ...); those keys are not set.
+        if source is not None:
+            metadata = {"source": source}
+        else:
+            metadata = {
+                "source": file_path,
+                "page": page_number,
+                "page_label": page_labels[page_number],
+            }
+        documents.append(Document(page_content=text, metadata=metadata))
+    return splitter_cls(**splitter_kwargs).split_documents(documents)
+
+
+def _pool_context():
+    # The rag scripts run at import time, so workers must be forked rather than
+    # spawned (spawning would re-run the calling script in every worker)
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def _plan_tasks(file_paths, sources, splitter_cls, splitter_kwargs, pages_per_task):
+    """Yield ``(file_index, task)`` page-range tasks for each PDF in order."""
+    for file_index, (file_path, source) in enumerate(zip(file_paths, sources)):
+        page_count = _pdf_page_count(file_path)
+        for start in range(0, max(page_count, 1), pages_per_task):
+            end = min(start + pages_per_task, page_count)
+            yield file_index, (file_path, start, end, source, splitter_cls, splitter_kwargs)
+
+
+def _start_pool(max_workers):
+    """Create the worker pool and fork all of its workers now.
+
+    Workers are forked from the caller as it is at this point. Forking after
+    torch or tokenizers have started their thread pools can leave a worker
+    blocked on a lock held by a thread that does not exist in the child, so
+    the pool is started before callers load the embedding model.
+    """
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context())
+    # With fork, the first submit launches every worker at once
+    pool.submit(int).result()
+    return pool
+
+
+def _drain(planned, pool, max_workers):
+    """Run planned tasks on ``pool`` and yield ``(file_index, chunks)`` in order.
+
+    At most ``2 * max_workers`` tasks are in flight, so a slow consumer (e.g. the
+    embedding step) applies backpressure instead of letting parsed pages pile up.
+    """
+    in_flight = deque()
+    try:
+        for file_index, task in planned:
+            in_flight.append((file_index, pool.submit(_load_and_split_pages, task)))
+            if len(in_flight) >= 2 * max_workers:
+                # Waiting on the oldest task keeps chunk order (and IDs) stable
+                done_index, future = in_flight.popleft()
+                yield done_index, future.result()
+        while in_flight:
+            done_index, future = in_flight.popleft()
+            yield done_index, future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _task_results(planned, max_workers):
+    """Return an iterator of ``(file_index, chunks)``, with the worker pool already started."""
+    if max_workers <= 1:
+        return ((file_index, _load_and_split_pages(task)) for file_index, task in planned)
+    return _drain(planned, _start_pool(max_workers), max_workers)
+
+
+def iter_pdf_chunks(
+    file_paths,
+    splitter_cls,
+    splitter_kwargs,
+    sources=None,
+    max_workers=None,
+    pages_per_task=DEFAULT_PAGES_PER_TASK,
+):
+    """Stream ``(file_path, chunk)`` pairs from PDFs parsed across a process pool.
+
+    The pool is started when this is called, not on first iteration; call it
+    before loading the embedding model (see ``_start_pool``).
+    """
+    file_paths = list(file_paths)
+    sources = list(sources) if sources is not None else [None] * len(file_paths)
+    planned = _plan_tasks(file_paths, sources, splitter_cls, splitter_kwargs, pages_per_task)
+    results = _task_results(planned, max_workers or ingest_workers())
+    return (
+        (file_paths[file_index], chunk) for file_index, chunks in results for chunk in chunks
+    )
+
+
+def _group_by_file(file_paths, results):
+    current_file, current_chunks = None, []
+    for file_index, chunks in results:
+        if current_file is not None and file_index != current_file:
+            yield file_paths[current_file], current_chunks
+            current_chunks = []
+        current_file = file_index
+        current_chunks.extend(chunks)
+    if current_file is not None:
+        yield file_paths[current_file], current_chunks
+
+
+def iter_split_pdfs(
+    file_paths,
+    splitter_cls,
+    splitter_kwargs,
+    sources=None,
+    max_workers=None,
+    pages_per_task=DEFAULT_PAGES_PER_TASK,
+):
+    """Load and split PDFs across a process pool.
+
+    Each PDF is cut into page ranges that are parsed and split in parallel.
+    Results are streamed back as ``(file_path, chunks)`` in the order of
+    ``file_paths`` with chunks in page order, so the text and chunk order match
+    loading each file with ``PyPDFLoader`` and calling ``split_documents``.
+    Chunk metadata is limited to ``source``, ``page`` and ``page_label``.
+    As with ``iter_pdf_chunks``, the pool is started by the call itself.
+    """
+    file_paths = list(file_paths)
+    sources = list(sources) if sources is not None else [None] * len(file_paths)
+    planned = _plan_tasks(file_paths, sources, splitter_cls, splitter_kwargs, pages_per_task)
+    return _group_by_file(file_paths, _task_results(planned, max_workers or ingest_workers()))
+
+
+def split_pdf(file_path, splitter_cls, splitter_kwargs, max_workers=None):
+    """Load and split a single PDF, parsing its pages in parallel."""
+    chunks = []
+    for _, file_chunks in iter_split_pdfs(
+        [file_path], splitter_cls, splitter_kwargs, max_workers=max_workers
+    ):
+        chunks.extend(file_chunks)
+    return chunks
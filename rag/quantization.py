@@ -0,0 +1,169 @@
+import numpy as np
+
+QUANTIZER_NAME = "quantizer.npz"
+CODES_NAME = "codes.npy"
+CODE_NORMS_NAME = "code_norms.npy"
+# Vectors per subspace centroid table; codes fit in one byte
+PQ_CENTROIDS = 256
+DEFAULT_PQ_SUBSPACES = 96
+DEFAULT_TRAIN_SIZE = 20000
+DEFAULT_KMEANS_ITERATIONS = 20
+
+
+class ScalarQuantizer:
+    """int8 scalar quantization with a per-dimension offset and scale.
+
+    Each component is mapped linearly onto [-127, 127] from the range seen in
+    training, so a vector costs one byte per dimension (4x smaller than
+    float32).
+    """
+
+    kind = "sq8"
+    code_dtype = np.int8
+
+    def __init__(self, offset, scale):
+        self.offset = np.asarray(offset, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def train(cls, sample, **_):
+        sample = np.asarray(sample, dtype=np.float32)
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        scale = np.maximum((high - low) / 254.0, 1e-12)
+        return cls((high + low) / 2.0, scale)
+
+    def encode(self, vectors):
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def decode(self, codes):
+        return codes.astype(np.float32) * self.scale + self.offset
+
+    def dots(self, codes, queries):
+        """Return the (rows x queries) inner products of decoded rows with float queries."""
+        return codes.astype(np.float32) @ (queries * self.scale).T + (queries @ self.offset)[None, :]
+
+    def arrays(self):
+        return {"offset": self.offset, "scale": self.scale}
+
+
+def _kmeans(points, num_centroids, iterations, rng):
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points."""
+    centroids = points[rng.choice(len(points), num_centroids, replace=len(points) < num_centroids)]
+    point_norms = np.einsum("ij,ij->i", points, points)
+    for _ in range(iterations):
+        distances = (
+            point_norms[:, None]
+            - 2.0 * points @ centroids.T
+            + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        )
+        assignment = distances.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=num_centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        empty = counts == 0
+        centroids = np.where(empty[:, None], centroids, sums / np.maximum(counts, 1)[:, None])
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()))]
+    return centroids.astype(np.float32)
+
+
+class ProductQuantizer:
+    """Product quantization: ``subspaces`` byte codes per vector.
+
+    The vector is cut into ``subspaces`` equal slices and each slice is
+    replaced by the nearest of 256 k-means centroids trained for that slice.
+    Distances are computed asymmetrically: the float query is compared with
+    every centroid once, then each row's inner product is a sum of table
+    lookups.
+    """
+
+    kind = "pq"
+    code_dtype = np.uint8
+
+    def __init__(self, centroids):
+        # (subspaces, 256, sub_dim)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+
+    @property
+    def subspaces(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def train(cls, sample, subspaces=DEFAULT_PQ_SUBSPACES, iterations=DEFAULT_KMEANS_ITERATIONS, seed=0):
+        sample = np.asarray(sample, dtype=np.float32)
+        if sample.shape[1] % subspaces:
+            raise ValueError(
+                f"Vector dimension {sample.shape[1]} is not divisible by {subspaces} subspaces."
+            )
+        rng = np.random.default_rng(seed)
+        sub_dim = sample.shape[1] // subspaces
+        centroids = [
+            _kmeans(sample[:, j * sub_dim:(j + 1) * sub_dim], PQ_CENTROIDS, iterations, rng)
+            for j in range(subspaces)
+        ]
+        return cls(np.stack(centroids))
+
+    def _split(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors.reshape(len(vectors), self.subspaces, -1)
+
+    def encode(self, vectors):
+        parts = self._split(vectors)
+        codes = np.empty(parts.shape[:2], dtype=np.uint8)
+        for j, centroids in enumerate(self.centroids):
+            distances = (
+                -2.0 * parts[:, j] @ centroids.T
+                + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            )
+            codes[:, j] = distances.argmin(axis=1)
+        return codes
+
+    def decode(self, codes):
+        parts = self.centroids[np.arange(self.subspaces)[None, :], codes]
+        return parts.reshape(len(codes), -1)
+
+    def dots(self, codes, queries):
+        """Return the (rows x queries) inner products of decoded rows with float queries."""
+        # tables[q, j, c]: inner product of query slice j with centroid c
+        tables = np.einsum("qjd,jcd->qjc", self._split(queries), self.centroids)
+        dots = np.zeros((len(codes), len(queries)), dtype=np.float32)
+        for q, table in enumerate(tables):
+            for j in range(self.subspaces):
+                dots[:, q] += table[j][codes[:, j]]
+        return dots
+
+    def arrays(self):
+        return {"centroids": self.centroids}
+
+
+QUANTIZERS = {cls.kind: cls for cls in (ScalarQuantizer, ProductQuantizer)}
+
+
+def train_quantizer(kind, vectors, train_size=DEFAULT_TRAIN_SIZE, seed=0, **kwargs):
+    """Train a quantizer of ``kind`` ("sq8" or "pq") on a random sample of ``vectors``."""
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization {kind!r}; expected one of {sorted(QUANTIZERS)}")
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(vectors), min(train_size, len(vectors)), replace=False))
+    return QUANTIZERS[kind].train(np.asarray(vectors[rows], dtype=np.float32), **kwargs)
+
+
+def save_quantizer(quantizer, path):
+    with open(path, "wb") as f:
+        np.savez(f, kind=np.array(quantizer.kind), **quantizer.arrays())
+
+
+def load_quantizer(path):
+    with np.load(path) as arrays:
+        kind = str(arrays["kind"])
+        return QUANTIZERS[kind](**{name: arrays[name] for name in arrays.files if name != "kind"})
+
+
+def recall_at_k(found_rows, true_rows):
+    """Mean fraction of the true top-k rows that were found, over all queries."""
+    hits = [
+        len(set(found.tolist()) & set(truth.tolist())) / max(len(truth), 1)
+        for found, truth in zip(found_rows, true_rows)
+    ]
+    return float(np.mean(hits)) if hits else 0.0
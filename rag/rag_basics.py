@@ -1,10 +1,13 @@
 import os
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
+from offset_splitter import OffsetCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from runtime import get_embeddings
 import os
 from dotenv import load_dotenv
+from ingest_manifest import index_version
+from parallel_loader import iter_pdf_chunks
+from sparse_index import SparseIndexBuilder, sparse_index_dir
+from streaming_ingest import begin_build, checkpoint_path, has_checkpoint, stream_into_store
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,35 +26,40 @@ file_path = os.path.join(current_dir, "books", "inspired.pdf")
 persistent_directory = os.path.join(current_dir, "database", "chroma_db")
 
 
-# Check if the vector store already exists
-if not os.path.exists(persistent_directory):
-    print("Persistent directory not found, creating it.")
+# Check if the vector store already exists (or an earlier build was interrupted)
+if not os.path.exists(persistent_directory) or has_checkpoint(persistent_directory):
+    print("Persistent directory not found or incomplete, building it.")
 
     # Check if the file exists
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    # Load the PDF document
-    loader = PyPDFLoader(file_path)
-    documents = loader.load()
+    # Stream the PDF through load -> split -> embed -> store in fixed-size batches,
+    # parsing page ranges in parallel (see INGEST_WORKERS)
+    chunks = (
+        chunk
+        for _, chunk in iter_pdf_chunks(
+            [file_path], OffsetCharacterTextSplitter, {"chunk_size": 1000, "chunk_overlap": 100}
+        )
+    )
 
-    # Split the text into chunks
-    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    docs = text_splitter.split_documents(documents)
-
-    print("\nDocument chunks information:")
-    print(f"Number of chunks: {len(docs)}")
-    print(f"Sample chunk: {docs[0].page_content}")
-
-    # Create embeddings
-    print("\nCreating embeddings...")
     # Define the embedding model
-    embedding = HuggingFaceEmbeddings()
-    print("Finished creating embeddings.")
+    embedding = get_embeddings()
 
-    # Create and persist the vector store
+    # Create and persist the vector store batch by batch, checkpointing as we go
+    # (from before the store directory exists, so a killed build is resumed)
     print("\nCreating vector store...")
-    db = Chroma.from_documents(docs, embedding, persist_directory=persistent_directory)
-    print("Finished creating vector store.")
+    begin_build(persistent_directory, "inspired.pdf:character")
+    db = Chroma(persist_directory=persistent_directory, embedding_function=embedding)
+    # Build the BM25 inverted index from the same chunk stream as it goes by
+    sparse_builder = SparseIndexBuilder()
+    stats = stream_into_store(
+        db,
+        sparse_builder.track(chunks, "inspired.pdf:character"),
+        stream_name="inspired.pdf:character",
+        checkpoint_file=checkpoint_path(persistent_directory),
+    )
+    sparse_builder.save(sparse_index_dir(persistent_directory), index_version(persistent_directory))
+    print(f"Finished creating vector store ({stats['chunks']} chunks).")
 else:
     print("Vector store already exists.")
\ No newline at end of file
@@ -1,10 +1,12 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from retrieval_cache import as_cached_retriever
+from runtime import get_embeddings, get_vector_store
+from offset_splitter import OffsetRecursiveCharacterTextSplitter
 import os
 from dotenv import load_dotenv
+from parallel_loader import iter_pdf_chunks
+from streaming_ingest import begin_build, checkpoint_path, has_checkpoint, stream_into_store
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,42 +24,50 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 file_path = os.path.join(current_dir, "books", "inspired.pdf")
 persistent_directory = os.path.join(current_dir, "database", "chroma_db")
 
-# Ensure the persistent directory exists or create it if necessary
-if not os.path.exists(persistent_directory):
-    print("Persistent directory not found, creating a new vector store.")
+# Ensure the persistent directory exists (and is complete) or create it if necessary
+if not os.path.exists(persistent_directory) or has_checkpoint(persistent_directory):
+    print("Persistent directory not found or incomplete, creating a new vector store.")
 
     # Load the document
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    loader = PyPDFLoader(file_path)
-    documents = loader.load()
-
-    # Split the text into chunks
+    # Stream the chunks, parsing page ranges in parallel (see INGEST_WORKERS)
     #The RecursiveCharacterTextSplitter gives something more meaningful
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    docs = text_splitter.split_documents(documents)
+    chunks = (
+        chunk
+        for _, chunk in iter_pdf_chunks(
+            [file_path], OffsetRecursiveCharacterTextSplitter, {"chunk_size": 1000, "chunk_overlap": 100}
+        )
+    )
 
     # Initialize the embedding model
-    print("Creating embeddings...")
-    embeddings = HuggingFaceEmbeddings()
+    embeddings = get_embeddings()
 
-    # Create and persist the vector store
+    # Embed and add the chunks in batches so memory stays bounded
     print("Creating Chroma vector store...")
-    db = Chroma.from_documents(documents=docs, embedding=embeddings, persist_directory=persistent_directory)
-    db.persist()
+    # Marks the build unfinished until the last batch is in
+    begin_build(persistent_directory, "inspired.pdf:recursive")
+    db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+    stream_into_store(
+        db,
+        chunks,
+        stream_name="inspired.pdf:recursive",
+        checkpoint_file=checkpoint_path(persistent_directory),
+    )
     print("Finished creating and persisting the Chroma vector store.")
 
 else:
     print("Using existing Chroma vector store.")
-    embeddings = HuggingFaceEmbeddings()
-    db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+    db = get_vector_store(persistent_directory)
 
 # Define the query
 query = "How to test prototype with target users"
 
-# Retrieve relevant documents, the thresholds are important in document retrieval
-retriever = db.as_retriever(
+# Retrieve relevant documents, the thresholds are important in document retrieval.
+# Repeated queries are answered from cache until the store is rebuilt
+retriever = as_cached_retriever(
+    db,
     search_type='similarity_score_threshold',
     search_kwargs={'k': 5, 'score_threshold': 0.4},
 )
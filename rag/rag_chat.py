@@ -1,13 +1,15 @@
 import os
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.llms.llamacpp import LlamaCpp
 from langchain.callbacks import StreamingStdOutCallbackHandler
 from langchain_core.callbacks import CallbackManager
 from langchain_core.prompts import ChatPromptTemplate
 import os
 from dotenv import load_dotenv
 
+from local_llm import make_llm, server_url
+from context_packer import TokenCounter, context_budget, pack_context, tokenizer_name
+from retrieval_cache import as_cached_retriever
+from runtime import get_vector_store, startup_report, timed, warm_up
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -15,7 +17,7 @@ load_dotenv()
 model_path = os.getenv("MODEL_PATH")
 
 # Check if the model path is loaded correctly
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
 print(f"Model path loaded: {model_path}")
@@ -23,42 +25,47 @@ print(f"Model path loaded: {model_path}")
 current_dir = os.path.dirname(os.path.abspath(__file__))
 persistent_directory = os.path.join(current_dir, "database", "chroma_db")
 
+# Load the embedding model and vector store in the background while the LLM loads
+warm_up(persistent_directory)
+
 # Callback Manager
 callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
 
-# Initialize LlamaCpp model
-llm = LlamaCpp(
-    model_path=model_path,
-    temperature=0.8,
-    max_tokens=2048,
-    n_ctx=2048,
-    top_p=0.88,
-    echo=False,
-    callbacks=callback_manager,
-    verbose=False,
-    streaming=True,
-    stop=["Q:", "\nHuman:"]
-)
-# Initialize embeddings and Chroma vector store
-embeddings = HuggingFaceEmbeddings()
-db = Chroma(
-    persist_directory=persistent_directory,
-    embedding_function=embeddings
-)
+# Context window, and the part of it kept free for the answer
+n_ctx = 2048
+answer_tokens = 512
+
+# Initialize LlamaCpp model (or use the shared model server if LLM_SERVER_URL is set)
+with timed("load LLM"):
+    llm = make_llm(
+        model_path=model_path,
+        temperature=0.8,
+        max_tokens=answer_tokens,
+        n_ctx=n_ctx,
+        top_p=0.88,
+        echo=False,
+        callbacks=callback_manager,
+        verbose=False,
+        streaming=True,
+        stop=["Q:", "\nHuman:"]
+    )
+# Embeddings and Chroma vector store (shared, loaded once per process)
+db = get_vector_store(persistent_directory)
+print(startup_report())
 
 # Query for retrieving relevant documents
 query = "How to test prototype with target users"
 
-# Retrieve relevant documents
-retriever = db.as_retriever(
-    search_type='similarity',
-    search_kwargs={'k': 1}  # Retrieve top 1 document
+# Retrieve relevant documents. MMR picks 6 of the 20 nearest chunks that are
+# relevant but not near-copies of each other (overlapping chunks of one page
+# would waste the small context window); it reuses the stored embeddings
+retriever = as_cached_retriever(
+    db,
+    search_type='mmr',
+    search_kwargs={'k': 6, 'fetch_k': 20, 'lambda_mult': 0.5}
 )
 relevant_docs = retriever.get_relevant_documents(query)
 
-# Combine relevant document content into a single string
-documents_content = "\n\n".join([doc.page_content for doc in relevant_docs])
-
 # Define the prompt structure using ChatPromptTemplate
 messages = [
     ('system', "You are a helpful assistant. Use only the provided documents to answer questions."),
@@ -68,6 +75,18 @@ messages = [
 # Create the ChatPromptTemplate
 prompt_template = ChatPromptTemplate.from_messages(messages)
 
+# Pack the retrieved chunks, in retrieval order, into the tokens the window has left
+# after the prompt itself and the answer; a chunk that does not fit is cut at a
+# sentence boundary. Chunk token counts are cached next to the store.
+token_counter = TokenCounter(llm.get_num_tokens, tokenizer_name(llm), persistent_directory)
+overhead_tokens = llm.get_num_tokens(prompt_template.format(documents="", query=query))
+budget = context_budget(n_ctx, overhead_tokens, answer_tokens)
+documents_content, packed_docs, context_tokens = pack_context(relevant_docs, budget, token_counter)
+print(
+    f"Packed {len(packed_docs)} of {len(relevant_docs)} chunks into "
+    f"{context_tokens}/{budget} context tokens"
+)
+
 # Format the prompt
 formatted_prompt = prompt_template.format(
     documents=documents_content,
@@ -1,16 +1,27 @@
 import os
 from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.vectorstores import Chroma
 from langchain.schema import HumanMessage, SystemMessage
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.callbacks import StreamingStdOutCallbackHandler
-from langchain_community.llms.llamacpp import LlamaCpp
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain_core.callbacks import CallbackManager
 import os
 from dotenv import load_dotenv
 
+from local_llm import make_llm, server_url
+from hybrid_retriever import HybridRetriever
+from rerank import RerankingRetriever
+from runtime import (
+    get_cross_encoder,
+    get_vector_store,
+    release_vector_store,
+    startup_report,
+    timed,
+    warm_up,
+)
+from sparse_index import load_sparse_index
+from versioned_store import VersionedRetriever, current_store_dir, start_rebuild
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -18,39 +29,66 @@ load_dotenv()
 model_path = os.getenv("MODEL_PATH")
 
 # Check if the model path is loaded correctly
-if not model_path:
+if not model_path and not server_url():
     raise ValueError("MODEL_PATH is not set in the .env file or environment variables.")
 
 print(f"Model path loaded: {model_path}")
 
 
-# Define the persistent directory
+# Define the persistent directory. It holds versioned stores (see versioned_store):
+# rebuilds publish a new version and this process switches to it between questions
 current_dir = os.path.dirname(os.path.abspath(__file__))
-persistent_directory = os.path.join(current_dir, "db", "chroma_db_with_metadata")
-
-# Callback manager for streaming output
-callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
+store_root = os.path.join(current_dir, "db", "chroma_db_with_metadata")
+books_dir = os.path.join(current_dir, "books")
+persistent_directory = current_store_dir(store_root)
+if persistent_directory is None:
+    raise FileNotFoundError(f"No vector store in {store_root}. Please build it first.")
 
-# Define the LlamaCpp model
-llm = LlamaCpp(
-    model_path=model_path,
-    temperature=0.7,
-    max_tokens=500,
-    callbacks=callback_manager,
-    verbose=False,
-    streaming=True
-)
+# Embedding model used to build and query the store
+embedding_model = "sentence-transformers/all-MiniLM-L6-v2"
 
-# Define the embedding model
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+# Load the embedding model and vector store in the background while the LLM loads
+warm_up(persistent_directory, model_name=embedding_model)
 
-# Load the existing vector store with the embedding function
-db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+# Callback manager for streaming output
+callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
 
-# Create a retriever for querying the vector store
-retriever = db.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 3},
+# Define the LlamaCpp model (or use the shared model server if LLM_SERVER_URL is set)
+with timed("load LLM"):
+    llm = make_llm(
+        model_path=model_path,
+        temperature=0.7,
+        max_tokens=500,
+        callbacks=callback_manager,
+        verbose=False,
+        streaming=True
+    )
+
+def make_retriever(store_dir):
+    """Build the retriever over one version of the store."""
+    # Load the existing vector store with the embedding function (shared, loaded once per process)
+    db = get_vector_store(store_dir, model_name=embedding_model)
+
+    # Create a hybrid retriever: BM25 over the store's inverted index catches exact
+    # terms (product names, codes) that vector similarity misses; the two rankings
+    # are merged with reciprocal rank fusion
+    with timed("open inverted index"):
+        sparse_index = load_sparse_index(db, store_dir)
+    retriever = HybridRetriever(vectorstore=db, sparse_index=sparse_index, k=3)
+
+    # Optionally (RERANK=1) over-fetch 20 candidates and keep the 3 a cross-encoder
+    # rates best: fewer, better chunks make a shorter prompt and faster answers
+    if os.getenv("RERANK"):
+        retriever = RerankingRetriever(
+            base_retriever=retriever, cross_encoder=get_cross_encoder(), k=3, fetch_k=20
+        )
+    return retriever
+
+
+# Follow the store's CURRENT pointer: a newly published version is opened and
+# warmed in the background (the embedding model is already loaded) and swapped in
+retriever = VersionedRetriever(
+    root=store_root, make_retriever=make_retriever, release=release_vector_store
 )
 
 # Contextualize question prompt
@@ -104,14 +142,24 @@ rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chai
 
 # Function to simulate a continual chat
 def continual_chat():
+    print(startup_report())
     print("Start chatting with the AI! Type 'exit' to end the conversation.")
+    print("Type 'reindex' to re-ingest books/ in the background.")
     chat_history = []  # Collect chat history here (a sequence of messages)
+    version = retriever.version
     while True:
         query = input("You: ")
         if query.lower() == "exit":
             break
+        if query.lower() == "reindex":
+            process = start_rebuild(store_root, books_dir, embedding_model)
+            print(f"Rebuilding the store in process {process.pid}; keep chatting.")
+            continue
         # Process the user's query through the retrieval chain
         result = rag_chain.invoke({"input": query, "chat_history": chat_history})
+        if retriever.version != version:
+            version = retriever.version
+            print(f"(Now answering from store version {version})")
         # Display the AI's response
         print(f"AI: {result['answer']}")
         # Update the chat history
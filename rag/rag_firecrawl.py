@@ -1,9 +1,18 @@
 import os
 from dotenv import load_dotenv
-from langchain.text_splitter import CharacterTextSplitter
+from offset_splitter import OffsetCharacterTextSplitter
 from langchain_community.document_loaders import FireCrawlLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from dedup import NearDuplicateFilter
+from retrieval_cache import as_cached_retriever
+from runtime import get_embeddings, get_vector_store
 from langchain_community.vectorstores import Chroma
+from streaming_ingest import (
+    begin_build,
+    checkpoint_path,
+    has_checkpoint,
+    iter_split_documents,
+    stream_into_store,
+)
 
 # Load environment variables from .env
 load_dotenv()
@@ -21,61 +30,69 @@ def create_vector_store():
     if not api_key:
         raise ValueError("FIRECRAWL_API_KEY environment variable not set")
 
-    # Step 1: Crawl the website using FireCrawlLoader
+    # Step 1: Crawl the website using FireCrawlLoader (pages are pulled lazily)
     print("Begin crawling the website...")
     loader = FireCrawlLoader(
         api_key=api_key, url="https://www.thesafetychic.com", mode="scrape")
-    docs = loader.load()
-    print("Finished scraping the website.")
 
-    # Convert metadata values to strings if they are lists
-    for doc in docs:
-        for key, value in doc.metadata.items():
-            if isinstance(value, list):
-                doc.metadata[key] = ", ".join(map(str, value))
+    def iter_pages():
+        for doc in loader.lazy_load():
+            # Convert metadata values to strings if they are lists
+            for key, value in doc.metadata.items():
+                if isinstance(value, list):
+                    doc.metadata[key] = ", ".join(map(str, value))
+            yield doc
 
-    # Step 2: Split the crawled content into chunks
-    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-    split_docs = text_splitter.split_documents(docs)
+    # Step 2: Split the crawled content into chunks, one page at a time
+    text_splitter = OffsetCharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
+    split_docs = iter_split_documents(iter_pages(), text_splitter)
 
-    # Display information about the split documents
-    print("\n--- Document Chunks Information ---")
-    print(f"Number of document chunks: {len(split_docs)}")
-    print(f"Sample chunk:\n{split_docs[0].page_content}\n")
+    # Drop boilerplate chunks repeated across pages before they are embedded
+    dedup = NearDuplicateFilter()
+    split_docs = dedup.filter(split_docs)
 
     # Step 3: Create embeddings for the document chunks
-    embeddings = HuggingFaceEmbeddings()
+    embeddings = get_embeddings()
 
-    # Step 4: Create and persist the vector store with the embeddings
+    # Step 4: Embed and persist the chunks in batches, checkpointing so an
+    # interrupted build resumes where it stopped
     print(f"\n--- Creating vector store in {persistent_directory} ---")
-    db = Chroma.from_documents(
-        split_docs, embeddings, persist_directory=persistent_directory
+    begin_build(persistent_directory, "thesafetychic.com")
+    db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+    stats = stream_into_store(
+        db,
+        split_docs,
+        stream_name="thesafetychic.com",
+        checkpoint_file=checkpoint_path(persistent_directory),
     )
+    dedup.apply_merged_metadata(db, "thesafetychic.com")
+    print(f"Number of document chunks: {stats['chunks']}")
+    print(dedup.report())
     print(f"--- Finished creating vector store in {persistent_directory} ---")
 
 
 # Check if the Chroma vector store already exists
-if not os.path.exists(persistent_directory):
+if not os.path.exists(persistent_directory) or has_checkpoint(persistent_directory):
     create_vector_store()
 else:
     print(
         f"Vector store {persistent_directory} already exists. No need to initialize.")
 
-# Load the vector store with the embeddings
-embeddings = HuggingFaceEmbeddings()
-db = Chroma(persist_directory=persistent_directory,
-            embedding_function=embeddings)
+# Load the vector store with the embeddings (the model is loaded once per process)
+db = get_vector_store(persistent_directory)
+
+# Create one retriever for all queries so query embeddings and results are
+# cached across calls (until the store is re-crawled)
+retriever = as_cached_retriever(
+    db,
+    search_type="similarity",
+    search_kwargs={"k": 3},
+)
 
 
 # Step 5: Query the vector store
 def query_vector_store(query):
     """Query the vector store with the specified question."""
-    # Create a retriever for querying the vector store
-    retriever = db.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 3},
-    )
-
     # Retrieve relevant documents based on the query
     relevant_docs = retriever.invoke(query)
 
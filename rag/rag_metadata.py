@@ -1,8 +1,5 @@
 import os
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from book_ingest import update_book_store
 
 # Define the directory containing the text files and the persistent directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,48 +10,6 @@ persistent_directory = os.path.join(db_dir, "chroma_db_with_metadata")
 print(f"Books directory: {books_dir}")
 print(f"Persistent directory: {persistent_directory}")
 
-# Check if the Chroma vector store already exists
-if not os.path.exists(persistent_directory):
-    print("Persistent directory does not exist. Initializing vector store...")
-
-    # Ensure the books directory exists
-    if not os.path.exists(books_dir):
-        raise FileNotFoundError(
-            f"The directory {books_dir} does not exist. Please check the path."
-        )
-
-    # List all text files in the directory
-    book_files = [f for f in os.listdir(books_dir) if f.endswith(".pdf")]
-
-    # Read the text content from each file and store it with metadata
-    documents = []
-    for book_file in book_files:
-        file_path = os.path.join(books_dir, book_file)
-        loader = PyPDFLoader(file_path)
-        book_docs = loader.load()
-        for doc in book_docs:
-            # Add metadata to each document indicating its source
-            doc.metadata = {"source": book_file}
-            documents.append(doc)
-
-    # Split the documents into chunks
-    text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    docs = text_splitter.split_documents(documents)
-
-    # Display information about the split documents
-    print("\n--- Document Chunks Information ---")
-    print(f"Number of document chunks: {len(docs)}")
-
-    # Create embeddings
-    print("\n--- Creating embeddings ---")
-    embeddings = HuggingFaceEmbeddings()
-    print("\n--- Finished creating embeddings ---")
-
-    # Create the vector store and persist it
-    print("\n--- Creating and persisting vector store ---")
-    db = Chroma.from_documents(
-        docs, embeddings, persist_directory=persistent_directory)
-    print("\n--- Finished creating and persisting vector store ---")
-
-else:
-    print("Vector store already exists. No need to initialize.")
\ No newline at end of file
+# Compare the books against the store's ingestion manifest and re-embed only
+# new or changed books (see book_ingest.update_book_store)
+update_book_store(books_dir, persistent_directory)
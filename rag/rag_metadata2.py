@@ -1,27 +1,50 @@
 import os
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from retrieval_cache import as_cached_retriever
+from runtime import get_embeddings, get_vector_store, startup_report, timed
+from vector_index import MmapRetriever, MmapVectorIndex, default_index_dir
 
 # Define the persistent directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 db_dir = os.path.join(current_dir, "database")
 persistent_directory = os.path.join(db_dir, "chroma_db_with_metadata")
-
-# Define the embedding model
-embeddings = HuggingFaceEmbeddings()
-
-# Load the existing vector store with the embedding function
-db = Chroma(persist_directory=persistent_directory,
-            embedding_function=embeddings)
+# Read-only export of the store (python vector_index.py <persistent_directory>)
+index_dir = default_index_dir(persistent_directory)
 
 # Define the user's question
 query = "real madrid"
+search_type = "similarity_score_threshold"
+search_kwargs = {"k": 3, "score_threshold": 0.3}
+# Optionally search one book only, e.g. SOURCE_BOOK=inspired.pdf; the exported
+# index keeps each book's chunks together, so only that book's rows are scored
+source_book = os.getenv("SOURCE_BOOK")
+if source_book:
+    search_kwargs["filter"] = {"source": source_book}
+
+# Serve from the memory-mapped export when it is up to date: it opens without
+# loading Chroma. Otherwise load the existing vector store (heavy imports and
+# the embedding model are loaded lazily, once per process)
+index = None
+if os.path.exists(index_dir):
+    with timed("open memory-mapped index"):
+        index = MmapVectorIndex(index_dir)
+    if index.is_stale():
+        print(f"Index {index_dir} is older than the store, using Chroma instead.")
+        index = None
+
+if index is not None:
+    retriever = MmapRetriever(
+        index=index,
+        embeddings=get_embeddings(),
+        search_type=search_type,
+        search_kwargs=search_kwargs,
+    )
+else:
+    db = get_vector_store(persistent_directory)
+    # Query embeddings and results are cached until the store is re-ingested
+    retriever = as_cached_retriever(db, search_type=search_type, search_kwargs=search_kwargs)
+print(startup_report())
 
 # Retrieve relevant documents based on the query
-retriever = db.as_retriever(
-    search_type="similarity_score_threshold",
-    search_kwargs={"k": 3, "score_threshold": 0.3},
-)
 relevant_docs = retriever.invoke(query)
 
 # Display the relevant results with metadata
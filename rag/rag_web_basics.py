@@ -1,42 +1,90 @@
 import os
-from langchain_community.document_loaders import WebBaseLoader
+from async_web_loader import AsyncWebLoader, load_validators, save_validators
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_text_splitters import CharacterTextSplitter
+from dedup import NearDuplicateFilter, retire_source
+from runtime import get_embeddings
+from offset_splitter import OffsetCharacterTextSplitter
+from streaming_ingest import (
+    add_in_batches,
+    begin_build,
+    checkpoint_path,
+    has_checkpoint,
+    iter_split_documents,
+    stream_chunk_id,
+    stream_into_store,
+)
 
 # Define the persistent directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 db_dir = os.path.join(current_dir, "database")
 persistent_directory = os.path.join(db_dir, "chroma_db_apple")
+# ETag/Last-Modified of every page in the store, for conditional re-fetches
+validators_path = os.path.join(persistent_directory, "web_validators.json")
 
-# Step 1: Scrape the content from apple.com using WebBaseLoader
-# WebBaseLoader loads web pages and extracts their content
+# Step 1: Scrape the content from apple.com
+# AsyncWebLoader fetches the pages concurrently over pooled connections (with
+# retries) and returns the same documents as WebBaseLoader
 urls = ["https://www.apple.com/"]
 
-# Create a loader for web content
-loader = WebBaseLoader(urls)
-documents = loader.load()
-
 # Step 2: Split the scraped content into chunks
-# CharacterTextSplitter splits the text into smaller chunks
-text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-docs = text_splitter.split_documents(documents)
-
-# Display information about the split documents
-print("\n--- Document Chunks Information ---")
-print(f"Number of document chunks: {len(docs)}")
-print(f"Sample chunk:\n{docs[0].page_content}\n")
+# CharacterTextSplitter splits the text into smaller chunks, one page at a time
+text_splitter = OffsetCharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
 
 # Step 3: Create embeddings for the document chunks
-# OpenAIEmbeddings turns text into numerical vectors that capture semantic meaning
-embeddings = HuggingFaceEmbeddings()
+# HuggingFaceEmbeddings turns text into numerical vectors that capture semantic meaning,
+# cached on disk so pages that were already embedded skip the model
+embeddings = get_embeddings()
 
 # Step 4: Create and persist the vector store with the embeddings
-# Chroma stores the embeddings for efficient searching
-if not os.path.exists(persistent_directory):
+# Chroma stores the embeddings for efficient searching. Chunks are embedded and
+# added in batches so memory stays bounded, with a checkpoint to resume from
+if not os.path.exists(persistent_directory) or has_checkpoint(persistent_directory):
     print(f"\n--- Creating vector store in {persistent_directory} ---")
-    db = Chroma.from_documents(docs, embeddings, persist_directory=persistent_directory)
+    begin_build(persistent_directory, "apple.com")
+    db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+    # Navigation and footer text repeats on every page; drop near-duplicate
+    # chunks before they are embedded
+    dedup = NearDuplicateFilter()
+    # Pages are fetched lazily as the pipeline pulls them
+    loader = AsyncWebLoader(urls)
+    docs = dedup.filter(iter_split_documents(loader.lazy_load(), text_splitter))
+    stats = stream_into_store(
+        db, docs, stream_name="apple.com", checkpoint_file=checkpoint_path(persistent_directory)
+    )
+    dedup.apply_merged_metadata(db, "apple.com")
+    save_validators(validators_path, loader.validators)
+    print(f"Number of document chunks: {stats['chunks']}")
+    print(dedup.report())
     print(f"--- Finished creating vector store in {persistent_directory} ---")
+elif os.getenv("REFRESH_WEB_STORE"):
+    # Re-fetch with conditional GETs: only pages that changed come back, and
+    # only their chunks are replaced
+    print(f"\n--- Refreshing vector store in {persistent_directory} ---")
+    db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
+    loader = AsyncWebLoader(urls, validators=load_validators(validators_path))
+    # Changed pages are collected first: their old chunks must be gone before
+    # the rest of the store seeds the duplicate filter. Boilerplate that
+    # unchanged pages were deduplicated into is handed to one of them instead
+    pages = list(loader.lazy_load())
+    changed = {page.metadata["source"] for page in pages}
+    for url in changed:
+        deleted, rehomed = retire_source(db, url, changed)
+        print(f"{url}: removed {deleted} stale chunks, re-homed {rehomed} shared ones")
+    # New chunks are checked against the boilerplate already stored and take
+    # the next stream positions, so they share the build's ID scheme
+    dedup = NearDuplicateFilter()
+    dedup.remember_store(db, "apple.com", forget_sources=changed)
+    first_position = dedup.next_position
+    docs = list(dedup.filter(iter_split_documents(pages, text_splitter)))
+    ids = [stream_chunk_id("apple.com", first_position + i) for i in range(len(docs))]
+    add_in_batches(db, docs, ids)
+    dedup.apply_merged_metadata(db, "apple.com")
+    save_validators(validators_path, loader.validators)
+    print(
+        f"{loader.stats['fetched']} pages changed ({len(docs)} chunks added), "
+        f"{loader.stats['not_modified']} unchanged (skipped)"
+    )
+    print(dedup.report())
 else:
     print(f"Vector store {persistent_directory} already exists. No need to initialize.")
     db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import time
+from typing import Any
+
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+DEFAULT_FETCH_K = 20
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_LATENCY_BUDGET_MS = 300.0
+DEFAULT_SCORE_CACHE_SIZE = 65536
+
+
+def _text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class RerankingRetriever(BaseRetriever):
+    """Over-fetch from a base retriever and keep the ``k`` chunks a cross-encoder scores best.
+
+    The base retriever is asked for ``fetch_k`` candidates; (query, chunk)
+    pairs are scored by ``cross_encoder`` (a sentence-transformers
+    ``CrossEncoder``, see ``runtime.get_cross_encoder``) in batches of
+    ``batch_size`` on the CPU. Scores are cached per (query, chunk text), so
+    follow-up questions that retrieve the same chunks are not re-scored.
+
+    With ``latency_budget_ms`` set, scoring stops at the first batch boundary
+    past the budget; candidates left unscored keep their base order behind the
+    scored ones. ``min_score`` drops chunks the cross-encoder rates below it,
+    so weak matches do not pad the prompt.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base_retriever: BaseRetriever
+    cross_encoder: Any
+    k: int = 3
+    fetch_k: int = DEFAULT_FETCH_K
+    batch_size: int = DEFAULT_BATCH_SIZE
+    latency_budget_ms: float | None = DEFAULT_LATENCY_BUDGET_MS
+    min_score: float | None = None
+    score_cache_size: int = DEFAULT_SCORE_CACHE_SIZE
+
+    _scores: LRUCache = PrivateAttr()
+
+    def model_post_init(self, __context):
+        self._scores = LRUCache(self.score_cache_size)
+
+    def score(self, query, texts, deadline=None):
+        """Return cross-encoder scores for ``texts`` (None where the budget ran out)."""
+        keys = [(query, _text_key(text)) for text in texts]
+        scores = [self._scores.get(key) for key in keys]
+        pending = [i for i, score in enumerate(scores) if score is None]
+        for start in range(0, len(pending), self.batch_size):
+            if start and deadline is not None and time.perf_counter() > deadline:
+                logger.info(
+                    "Re-ranking budget of %.0f ms spent; %d candidates left unscored",
+                    self.latency_budget_ms,
+                    len(pending) - start,
+                )
+                break
+            batch = pending[start:start + self.batch_size]
+            predicted = self.cross_encoder.predict(
+                [(query, texts[i]) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            for i, score in zip(batch, predicted):
+                scores[i] = float(score)
+                self._scores.put(keys[i], scores[i])
+        return scores
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        k = kwargs.pop("k", self.k)
+        deadline = None
+        if self.latency_budget_ms is not None:
+            deadline = time.perf_counter() + self.latency_budget_ms / 1000.0
+        candidates = self.base_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}, k=self.fetch_k, **kwargs
+        )
+        scores = self.score(query, [doc.page_content for doc in candidates], deadline)
+
+        # Scored candidates best first, then unscored ones in their original order
+        ranked = sorted(
+            range(len(candidates)),
+            key=lambda i: (scores[i] is None, -(scores[i] or 0.0), i),
+        )
+        docs = []
+        for i in ranked:
+            if self.min_score is not None and scores[i] is not None and scores[i] < self.min_score:
+                continue
+            docs.append(candidates[i])
+            if len(docs) == k:
+                break
+        return docs
+
+    def cache_stats(self):
+        return {
+            "score_hits": self._scores.hits,
+            "score_misses": self._scores.misses,
+            "scores_cached": len(self._scores),
+        }
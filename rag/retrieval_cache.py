@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from embedding_cache import embed_queries
+from ingest_manifest import CHROMA_SQLITE_NAME, MANIFEST_NAME, index_version
+from lru_cache import LRUCache
+from mmr import chroma_mmr_search_by_vector
+
+DEFAULT_EMBEDDING_CACHE_SIZE = 4096
+DEFAULT_RESULT_CACHE_SIZE = 1024
+
+
+def _stat_signature(persistent_directory):
+    """Cheap fingerprint of the files a re-ingest rewrites (one stat each)."""
+    signature = []
+    for name in (MANIFEST_NAME, CHROMA_SQLITE_NAME):
+        try:
+            stat = os.stat(os.path.join(persistent_directory, name))
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class CachingRetriever(BaseRetriever):
+    """Drop-in for ``db.as_retriever(...)`` that caches query embeddings and results.
+
+    Query vectors are kept in an in-memory LRU, and searches run through the
+    store's ``*_by_vector`` methods so a repeated query never reaches the
+    embedding model. Results are cached under (query, search_type,
+    search_kwargs, index version). Before each lookup the store's manifest and
+    SQLite file are stat-ed; when a re-ingest has changed the index version
+    (see ``ingest_manifest.index_version``) the result cache is dropped.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: VectorStore
+    search_type: str = "similarity"
+    search_kwargs: dict = Field(default_factory=dict)
+    persist_directory: str | None = None
+    embedding_cache_size: int = DEFAULT_EMBEDDING_CACHE_SIZE
+    result_cache_size: int = DEFAULT_RESULT_CACHE_SIZE
+
+    _embedding_cache: LRUCache = PrivateAttr()
+    _result_cache: LRUCache = PrivateAttr()
+    _signature: tuple | None = PrivateAttr(default=None)
+    _version: object = PrivateAttr(default=None)
+    _version_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context):
+        if self.search_type not in ("similarity", "similarity_score_threshold", "mmr"):
+            raise ValueError(f"search_type of {self.search_type} not allowed.")
+        if self.persist_directory is None:
+            self.persist_directory = getattr(self.vectorstore, "_persist_directory", None)
+        self._embedding_cache = LRUCache(self.embedding_cache_size)
+        self._result_cache = LRUCache(self.result_cache_size)
+
+    def index_version(self):
+        """Return the current index version, dropping cached results if it changed."""
+        if not self.persist_directory:
+            return None
+        signature = _stat_signature(self.persist_directory)
+        with self._version_lock:
+            if signature != self._signature:
+                self._signature = signature
+                version = index_version(self.persist_directory)
+                if version != self._version:
+                    self._version = version
+                    self._result_cache.clear()
+            return self._version
+
+    def embed_query(self, query):
+        vector = self._embedding_cache.get(query)
+        if vector is None:
+            vector = self.vectorstore.embeddings.embed_query(query)
+            self._embedding_cache.put(query, vector)
+        return vector
+
+    def embed_queries(self, queries):
+        """Embed many queries, sending only those not in the LRU to the model (in one batch)."""
+        vectors = [self._embedding_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        if missing:
+            computed = dict(zip(missing, embed_queries(self.vectorstore.embeddings, missing)))
+            for query, vector in computed.items():
+                self._embedding_cache.put(query, vector)
+            vectors = [computed[q] if v is None else v for q, v in zip(queries, vectors)]
+        return vectors
+
+    def _search(self, vector, search_kwargs):
+        store = self.vectorstore
+        if self.search_type == "similarity":
+            return store.similarity_search_by_vector(vector, **search_kwargs)
+        if self.search_type == "mmr":
+            return chroma_mmr_search_by_vector(store, vector, **search_kwargs)
+        # Same scoring and filtering as similarity_search_with_relevance_scores
+        search_kwargs = dict(search_kwargs)
+        score_threshold = search_kwargs.pop("score_threshold", None)
+        relevance_score_fn = store._select_relevance_score_fn()
+        docs_and_scores = store.similarity_search_by_vector_with_relevance_scores(
+            vector, **search_kwargs
+        )
+        return [
+            doc
+            for doc, score in docs_and_scores
+            if score_threshold is None or relevance_score_fn(score) >= score_threshold
+        ]
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        search_kwargs = self.search_kwargs | kwargs
+        key = (
+            query,
+            self.search_type,
+            json.dumps(search_kwargs, sort_keys=True, default=str),
+            self.index_version(),
+        )
+        docs = self._result_cache.get(key)
+        if docs is None:
+            docs = self._search(self.embed_query(query), search_kwargs)
+            self._result_cache.put(key, docs)
+        # Hand out copies so callers cannot modify the cached documents
+        return [doc.model_copy(deep=True) for doc in docs]
+
+    def search_batch(self, queries, **kwargs):
+        """Retrieve for many queries at once: one ``[(document, score), ...]`` per query.
+
+        Queries are embedded in one batch and sent to Chroma in a single
+        ``query`` call; each list holds the documents ``invoke`` returns for
+        that query on its own, with their relevance scores. "mmr" searches
+        fall back to one search per query (still with batched embeddings) and
+        carry no scores.
+        """
+        search_kwargs = self.search_kwargs | kwargs
+        queries = list(queries)
+        if not queries:
+            return []
+        vectors = self.embed_queries(queries)
+        store = self.vectorstore
+        if self.search_type == "mmr":
+            return [[(doc, None) for doc in self._search(v, search_kwargs)] for v in vectors]
+
+        results = store._collection.query(
+            query_embeddings=vectors,
+            n_results=search_kwargs.get("k", 4),
+            where=search_kwargs.get("filter"),
+            where_document=search_kwargs.get("where_document"),
+            include=["documents", "metadatas", "distances"],
+        )
+        relevance_score_fn = store._select_relevance_score_fn()
+        score_threshold = None
+        if self.search_type == "similarity_score_threshold":
+            score_threshold = search_kwargs.get("score_threshold")
+        batch = []
+        # Chroma returns ids with every query result, whatever ``include`` lists
+        for ids, texts, metadatas, distances in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"]
+        ):
+            hits = []
+            for id_, text, metadata, distance in zip(ids, texts, metadatas, distances):
+                relevance = relevance_score_fn(distance)
+                if score_threshold is not None and relevance < score_threshold:
+                    continue
+                document = Document(id=id_, page_content=text, metadata=metadata or {})
+                hits.append((document, relevance))
+            batch.append(hits)
+        return batch
+
+    def cache_stats(self):
+        return {
+            "embedding_hits": self._embedding_cache.hits,
+            "embedding_misses": self._embedding_cache.misses,
+            "embeddings_cached": len(self._embedding_cache),
+            "result_hits": self._result_cache.hits,
+            "result_misses": self._result_cache.misses,
+            "results_cached": len(self._result_cache),
+        }
+
+
+def as_cached_retriever(vectorstore, search_type="similarity", search_kwargs=None, **kwargs):
+    """Build a ``CachingRetriever`` with the same arguments as ``as_retriever``."""
+    return CachingRetriever(
+        vectorstore=vectorstore,
+        search_type=search_type,
+        search_kwargs=search_kwargs or {},
+        **kwargs,
+    )
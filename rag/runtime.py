@@ -0,0 +1,132 @@
+import importlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide singletons: one embedding model and one store per directory
+_lock = threading.RLock()
+_embeddings = {}
+_vector_stores = {}
+_cross_encoders = {}
+_timings = []
+_started = time.perf_counter()
+
+
+def _record(step, seconds):
+    _timings.append((step, seconds))
+    if os.getenv("RUNTIME_VERBOSE"):
+        print(f"[runtime] {step}: {seconds:.2f}s")
+
+
+@contextmanager
+def timed(step):
+    """Record how long a block of startup work takes in the startup report."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(step, time.perf_counter() - started)
+
+
+def lazy_import(module_name, attr=None):
+    """Import a module (or one attribute of it) on first use and time the import."""
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    elapsed = time.perf_counter() - started
+    # Only the first import does any work; later calls hit sys.modules
+    if elapsed > 0.001:
+        _record(f"import {module_name}", elapsed)
+    return getattr(module, attr) if attr else module
+
+
+def get_embeddings(model_name=None, cached=True):
+    """Return the process-wide embedding model, loading it on first use.
+
+    The model is wrapped in ``CachedEmbeddings`` unless ``cached`` is False.
+    """
+    key = (model_name, cached)
+    with _lock:
+        if key not in _embeddings:
+            HuggingFaceEmbeddings = lazy_import(
+                "langchain_community.embeddings", "HuggingFaceEmbeddings"
+            )
+            started = time.perf_counter()
+            kwargs = {"model_name": model_name} if model_name else {}
+            embeddings = HuggingFaceEmbeddings(**kwargs)
+            if cached:
+                from embedding_cache import CachedEmbeddings
+
+                embeddings = CachedEmbeddings(embeddings)
+            _record(f"load embeddings {model_name or 'default'}", time.perf_counter() - started)
+            _embeddings[key] = embeddings
+        return _embeddings[key]
+
+
+def get_vector_store(persist_directory, model_name=None, cached=True):
+    """Return the process-wide Chroma store for a directory, opening it once."""
+    persist_directory = os.path.abspath(persist_directory)
+    key = (persist_directory, model_name, cached)
+    with _lock:
+        if key not in _vector_stores:
+            if not os.path.exists(persist_directory):
+                raise FileNotFoundError(
+                    f"The directory {persist_directory} does not exist. Please check the path."
+                )
+            embeddings = get_embeddings(model_name, cached)
+            Chroma = lazy_import("langchain_community.vectorstores", "Chroma")
+            started = time.perf_counter()
+            _vector_stores[key] = Chroma(
+                persist_directory=persist_directory, embedding_function=embeddings
+            )
+            _record(f"open store {os.path.basename(persist_directory)}", time.perf_counter() - started)
+        return _vector_stores[key]
+
+
+def release_vector_store(persist_directory):
+    """Forget the shared stores opened for a directory (e.g. a retired index version)."""
+    persist_directory = os.path.abspath(persist_directory)
+    with _lock:
+        for key in [key for key in _vector_stores if key[0] == persist_directory]:
+            del _vector_stores[key]
+
+
+def get_cross_encoder(model_name=None):
+    """Return the process-wide cross-encoder used for re-ranking, loading it on first use."""
+    from rerank import DEFAULT_CROSS_ENCODER
+
+    model_name = model_name or DEFAULT_CROSS_ENCODER
+    with _lock:
+        if model_name not in _cross_encoders:
+            CrossEncoder = lazy_import("sentence_transformers", "CrossEncoder")
+            started = time.perf_counter()
+            _cross_encoders[model_name] = CrossEncoder(model_name, device="cpu")
+            _record(f"load cross-encoder {model_name}", time.perf_counter() - started)
+        return _cross_encoders[model_name]
+
+
+def warm_up(persist_directory=None, model_name=None, cached=True):
+    """Load the embedding model (and store) in a background thread.
+
+    Lets a script overlap model loading with other startup work such as loading
+    the LLM; later ``get_*`` calls wait for the warm-up instead of loading twice.
+    """
+
+    def load():
+        if persist_directory:
+            get_vector_store(persist_directory, model_name, cached)
+        else:
+            get_embeddings(model_name, cached)
+
+    thread = threading.Thread(target=load, name="runtime-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def startup_report():
+    """Return the startup timings recorded so far as a printable string."""
+    lines = ["--- Startup time report ---"]
+    for step, seconds in _timings:
+        lines.append(f"{step:<55} {seconds:8.2f}s")
+    lines.append(f"{'total since runtime import':<55} {time.perf_counter() - _started:8.2f}s")
+    return "\n".join(lines)
@@ -0,0 +1,242 @@
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from parallel_loader import ingest_workers
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BOOKS_DIR = os.path.join(current_dir, "books")
+DEFAULT_SHARDED_DIRECTORY = os.path.join(current_dir, "database", "chroma_db_sharded")
+SHARDS_INFO_NAME = "shards.json"
+DEFAULT_NUM_SHARDS = 4
+
+
+def shard_for(source, num_shards):
+    """Return the shard a source (book) belongs to: a stable hash of its name."""
+    return zlib.crc32(source.encode("utf-8")) % num_shards
+
+
+def shard_dir(sharded_directory, shard):
+    return os.path.join(sharded_directory, f"shard_{shard:03d}")
+
+
+def load_shards_info(sharded_directory):
+    path = os.path.join(sharded_directory, SHARDS_INFO_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _build_shard(books_dir, directory, book_files, workers):
+    """Ingest one shard's books into its own store (runs in a worker process)."""
+    from book_ingest import update_book_store
+
+    return update_book_store(books_dir, directory, book_files, workers)
+
+
+def build_shards(books_dir, sharded_directory, num_shards=DEFAULT_NUM_SHARDS, workers=None):
+    """Ingest ``books_dir`` into ``num_shards`` Chroma stores, building the shards in parallel.
+
+    Each book goes whole to one shard (``shard_for``), and every shard is an
+    ordinary store with its own manifest and inverted index, so re-running
+    only re-embeds books that changed. Shards build in separate processes
+    (``workers`` at a time), which must be spawned: call this from under
+    ``if __name__ == "__main__"``.
+    """
+    from book_ingest import list_books
+
+    info = load_shards_info(sharded_directory)
+    if info and info["num_shards"] != num_shards:
+        raise ValueError(
+            f"{sharded_directory} has {info['num_shards']} shards; rebuild it into an empty "
+            f"directory to change the shard count."
+        )
+    book_files = list_books(books_dir)
+    assignment = {book_file: shard_for(book_file, num_shards) for book_file in book_files}
+    workers = max(1, min(workers or ingest_workers(), num_shards))
+    # Split the parsing pool between the shards being built at once
+    parse_workers = max(1, ingest_workers() // workers)
+
+    os.makedirs(sharded_directory, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(
+                _build_shard,
+                books_dir,
+                shard_dir(sharded_directory, shard),
+                [book_file for book_file, s in assignment.items() if s == shard],
+                parse_workers,
+            )
+            for shard in range(num_shards)
+        ]
+        versions = [future.result() for future in futures]
+
+    path = os.path.join(sharded_directory, SHARDS_INFO_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"num_shards": num_shards, "shard_key": "source", "books": assignment}, f, indent=2
+        )
+    os.replace(tmp_path, path)
+    return versions
+
+
+class ShardedRetriever(BaseRetriever):
+    """Scatter-gather retriever over the shards written by ``build_shards``.
+
+    The query is embedded once, every shard is searched for its own top ``k``
+    concurrently in a thread pool (Chroma's HNSW search releases the GIL), and
+    the per-shard lists, each sorted by distance, are merged with a heap. The
+    global top ``k`` is always among the shards' top ``k`` lists, so the result
+    is the same as searching one store holding every chunk (up to the
+    approximation of each shard's HNSW index). Supports ``search_type``
+    "similarity" and "similarity_score_threshold", and Chroma ``filter`` /
+    ``where_document`` in ``search_kwargs``.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    shards: list
+    embeddings: Embeddings
+    search_type: str = "similarity"
+    search_kwargs: dict = Field(default_factory=dict)
+    max_workers: int | None = None
+
+    _pool: ThreadPoolExecutor = PrivateAttr()
+
+    def model_post_init(self, __context):
+        if self.search_type not in ("similarity", "similarity_score_threshold"):
+            raise ValueError(f"search_type of {self.search_type} not allowed.")
+        # Shards that received no books have nothing to search
+        self.shards = [shard for shard in self.shards if shard._collection.count()]
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers or max(1, len(self.shards)),
+            thread_name_prefix="shard-search",
+        )
+
+    @staticmethod
+    def _search_shard(shard, vectors, k, filter, where_document):
+        """Return, per query, the shard's ``[(distance, id, document), ...]`` best first."""
+        results = shard._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            where=filter,
+            where_document=where_document,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            [
+                (
+                    distance,
+                    chunk_id,
+                    Document(id=chunk_id, page_content=text, metadata=metadata or {}),
+                )
+                for chunk_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    def search_with_scores(
+        self, query_vectors, k=4, score_threshold=None, filter=None, where_document=None
+    ):
+        """Return one ``[(document, relevance), ...]`` list per query vector."""
+        if not self.shards:
+            return [[] for _ in query_vectors]
+        query_vectors = [list(vector) for vector in query_vectors]
+        futures = [
+            self._pool.submit(self._search_shard, shard, query_vectors, k, filter, where_document)
+            for shard in self.shards
+        ]
+        per_shard = [future.result() for future in futures]
+        relevance_score_fn = self.shards[0]._select_relevance_score_fn()
+        results = []
+        for q in range(len(query_vectors)):
+            # Distance first, then ID, so ties resolve the same way on every run
+            merged = heapq.merge(*(hits[q] for hits in per_shard), key=lambda hit: hit[:2])
+            hits = []
+            for distance, _, doc in islice(merged, k):
+                relevance = relevance_score_fn(distance)
+                if score_threshold is not None and relevance < score_threshold:
+                    continue
+                hits.append((doc, relevance))
+            results.append(hits)
+        return results
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        search_kwargs = self.search_kwargs | kwargs
+        score_threshold = None
+        if self.search_type == "similarity_score_threshold":
+            score_threshold = search_kwargs.get("score_threshold")
+        hits = self.search_with_scores(
+            [self.embeddings.embed_query(query)],
+            search_kwargs.get("k", 4),
+            score_threshold,
+            search_kwargs.get("filter"),
+            search_kwargs.get("where_document"),
+        )[0]
+        return [doc for doc, _ in hits]
+
+
+def open_sharded_retriever(sharded_directory=DEFAULT_SHARDED_DIRECTORY, **kwargs):
+    """Open every shard (sharing one embedding model) and return a ``ShardedRetriever``."""
+    from runtime import get_embeddings, get_vector_store
+
+    info = load_shards_info(sharded_directory)
+    if info is None:
+        raise FileNotFoundError(f"No sharded store in {sharded_directory}; run the build first.")
+    shards = [
+        get_vector_store(shard_dir(sharded_directory, shard)) for shard in range(info["num_shards"])
+    ]
+    return ShardedRetriever(shards=shards, embeddings=get_embeddings(), **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query a sharded book store.")
+    parser.add_argument("--directory", default=DEFAULT_SHARDED_DIRECTORY)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Ingest books/ into shards in parallel")
+    build.add_argument("--books", default=DEFAULT_BOOKS_DIR)
+    build.add_argument("--shards", type=int, default=DEFAULT_NUM_SHARDS)
+    build.add_argument("--workers", type=int, help="Shards built at once")
+    query = commands.add_parser("query", help="Search every shard and merge the results")
+    query.add_argument("text")
+    query.add_argument("--k", type=int, default=3)
+    query.add_argument("--compare", help="Unsharded store to check the merged IDs against")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        versions = build_shards(args.books, args.directory, args.shards, args.workers)
+        print(f"Shard versions: {versions}")
+        return
+
+    retriever = open_sharded_retriever(args.directory)
+    vector = retriever.embeddings.embed_query(args.text)
+    hits = retriever.search_with_scores([vector], args.k)[0]
+    for i, (doc, relevance) in enumerate(hits, 1):
+        print(f"{i}. [{relevance:.3f}] {doc.metadata.get('source')}: {doc.page_content[:120]!r}")
+    if args.compare:
+        from runtime import get_vector_store
+
+        unsharded = get_vector_store(args.compare)._collection.query(
+            query_embeddings=[vector], n_results=args.k, include=[]
+        )["ids"][0]
+        same = unsharded == [doc.id for doc, _ in hits]
+        print(f"Matches unsharded store {args.compare}: {same}")
+
+
+if __name__ == "__main__":
+    main()
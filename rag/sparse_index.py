@@ -0,0 +1,204 @@
+import json
+import math
+import os
+import re
+import shutil
+import time
+from collections import Counter
+
+import numpy as np
+
+from ingest_manifest import index_version
+from streaming_ingest import stream_chunk_id
+
+SPARSE_INDEX_NAME = "sparse_index"
+SPARSE_INFO_NAME = "sparse_index.json"
+VOCAB_NAME = "vocab.json"
+DOC_IDS_NAME = "doc_ids.json"
+POSTINGS_DOCS_NAME = "postings_docs.npy"
+POSTINGS_TF_NAME = "postings_tf.npy"
+DOC_LENGTHS_NAME = "doc_lengths.npy"
+SPARSE_FORMAT = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+READ_BATCH_SIZE = 5000
+
+# Words, numbers and codes such as "m3-pro", "iso-9001" or "v1.2"
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-_.][0-9a-z]+)*")
+
+
+def tokenize(text):
+    """Lower-case terms of a text; compound codes also yield their parts."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in re.split(r"[-_.]", token) if part)
+    return tokens
+
+
+def sparse_index_dir(persistent_directory):
+    """Return where the inverted index of a vector store lives."""
+    return os.path.join(persistent_directory, SPARSE_INDEX_NAME)
+
+
+class SparseIndexBuilder:
+    """Accumulate term postings for chunks as they are ingested, then write them out."""
+
+    def __init__(self):
+        self.doc_ids = []
+        self.doc_lengths = []
+        self.postings = {}
+
+    def add(self, chunk_id, text):
+        ordinal = len(self.doc_ids)
+        counts = Counter(tokenize(text))
+        self.doc_ids.append(chunk_id)
+        self.doc_lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, []).append((ordinal, tf))
+
+    def track(self, chunks, stream_name):
+        """Pass a chunk stream through, indexing each chunk under its stream ID."""
+        for position, chunk in enumerate(chunks):
+            self.add(stream_chunk_id(stream_name, position), chunk.page_content)
+            yield chunk
+
+    def save(self, index_dir, source_version=None):
+        """Write the index into ``index_dir`` (atomically replacing an older one)."""
+        tmp_dir = index_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        vocab = {}
+        docs, tfs = [], []
+        start = 0
+        for term in sorted(self.postings):
+            postings = self.postings[term]
+            vocab[term] = [start, len(postings)]
+            docs.extend(ordinal for ordinal, _ in postings)
+            tfs.extend(min(tf, 65535) for _, tf in postings)
+            start += len(postings)
+        np.save(os.path.join(tmp_dir, POSTINGS_DOCS_NAME), np.asarray(docs, dtype=np.uint32))
+        np.save(os.path.join(tmp_dir, POSTINGS_TF_NAME), np.asarray(tfs, dtype=np.uint16))
+        np.save(
+            os.path.join(tmp_dir, DOC_LENGTHS_NAME), np.asarray(self.doc_lengths, dtype=np.uint32)
+        )
+        with open(os.path.join(tmp_dir, VOCAB_NAME), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False, separators=(",", ":"))
+        with open(os.path.join(tmp_dir, DOC_IDS_NAME), "w", encoding="utf-8") as f:
+            json.dump(self.doc_ids, f, ensure_ascii=False, separators=(",", ":"))
+        count = len(self.doc_ids)
+        with open(os.path.join(tmp_dir, SPARSE_INFO_NAME), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "format": SPARSE_FORMAT,
+                    "count": count,
+                    "terms": len(vocab),
+                    "avgdl": sum(self.doc_lengths) / count if count else 0.0,
+                    "k1": BM25_K1,
+                    "b": BM25_B,
+                    "source_version": source_version,
+                },
+                f,
+                indent=2,
+            )
+
+        old_dir = index_dir + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(index_dir):
+            os.replace(index_dir, old_dir)
+        os.replace(tmp_dir, index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return index_dir
+
+
+def build_sparse_index(db, persistent_directory):
+    """(Re)build the inverted index of a Chroma store from the chunks it holds."""
+    builder = SparseIndexBuilder()
+    collection = db._collection
+    count = collection.count()
+    for offset in range(0, count, READ_BATCH_SIZE):
+        batch = collection.get(include=["documents"], limit=READ_BATCH_SIZE, offset=offset)
+        for chunk_id, text in zip(batch["ids"], batch["documents"]):
+            builder.add(chunk_id, text or "")
+    return builder.save(
+        sparse_index_dir(persistent_directory), index_version(persistent_directory)
+    )
+
+
+class SparseIndex:
+    """Memory-mapped BM25 index: a term dictionary plus contiguous postings arrays."""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, SPARSE_INFO_NAME), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        if self.info.get("format") != SPARSE_FORMAT:
+            raise ValueError(f"Unsupported sparse index format in {index_dir}")
+        with open(os.path.join(index_dir, VOCAB_NAME), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        with open(os.path.join(index_dir, DOC_IDS_NAME), "r", encoding="utf-8") as f:
+            self.doc_ids = json.load(f)
+        self.postings_docs = np.load(os.path.join(index_dir, POSTINGS_DOCS_NAME), mmap_mode="r")
+        self.postings_tf = np.load(os.path.join(index_dir, POSTINGS_TF_NAME), mmap_mode="r")
+        self.doc_lengths = np.load(os.path.join(index_dir, DOC_LENGTHS_NAME), mmap_mode="r")
+        self.count = self.info["count"]
+        self.avgdl = self.info["avgdl"] or 1.0
+        self.k1 = self.info["k1"]
+        self.b = self.info["b"]
+
+    def __len__(self):
+        return self.count
+
+    def idf(self, df):
+        return math.log(1.0 + (self.count - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k, deadline=None):
+        """Return ``[(chunk_id, bm25_score), ...]`` for the top ``k`` chunks.
+
+        Query terms are scored rarest first; if ``deadline`` (a
+        ``time.perf_counter()`` value) passes, the remaining, most common and
+        least informative terms are skipped.
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.vocab]
+        terms.sort(key=lambda term: self.vocab[term][1])
+        if not terms or not self.count:
+            return []
+        scores = np.zeros(self.count, dtype=np.float32)
+        touched = []
+        for i, term in enumerate(terms):
+            if i and deadline is not None and time.perf_counter() > deadline:
+                break
+            start, df = self.vocab[term]
+            docs = self.postings_docs[start:start + df]
+            tf = self.postings_tf[start:start + df].astype(np.float32)
+            lengths = self.doc_lengths[docs].astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / self.avgdl)
+            # A term has one posting per chunk, so plain fancy-index adds are safe
+            scores[docs] += self.idf(df) * tf * (self.k1 + 1.0) / (tf + norm)
+            touched.append(docs)
+        candidates = np.unique(np.concatenate(touched))
+        candidate_scores = scores[candidates]
+        if len(candidates) > k:
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            candidates, candidate_scores = candidates[top], candidate_scores[top]
+        order = np.argsort(-candidate_scores, kind="stable")
+        return [(self.doc_ids[candidates[i]], float(candidate_scores[i])) for i in order]
+
+    def is_stale(self, persistent_directory):
+        """Return True when the store was re-ingested after the index was built."""
+        current = json.loads(json.dumps(index_version(persistent_directory)))
+        return current != self.info.get("source_version")
+
+
+def load_sparse_index(db, persistent_directory):
+    """Open the store's inverted index, building it first if missing or stale."""
+    index_dir = sparse_index_dir(persistent_directory)
+    if os.path.exists(os.path.join(index_dir, SPARSE_INFO_NAME)):
+        index = SparseIndex(index_dir)
+        if not index.is_stale(persistent_directory):
+            return index
+    print(f"Building inverted index in {index_dir}...")
+    build_sparse_index(db, persistent_directory)
+    return SparseIndex(index_dir)
@@ -0,0 +1,187 @@
+import json
+import os
+import queue
+import threading
+import time
+from itertools import islice
+
+# Chunks embedded and written to the store per batch
+DEFAULT_BATCH_SIZE = 64
+# Batches allowed to wait between the loader/splitter and the embedder
+DEFAULT_MAX_PENDING_BATCHES = 4
+CHECKPOINT_NAME = "ingest_checkpoint.json"
+
+_DONE = object()
+
+
+def iter_split_documents(documents, text_splitter):
+    """Split documents one at a time so only the current page is held in memory."""
+    for document in documents:
+        yield from text_splitter.split_documents([document])
+
+
+def stream_chunk_id(stream_name, position):
+    """Return the vector store ID of the chunk at ``position`` in a stream."""
+    return f"{stream_name}:{position}"
+
+
+def stream_position(chunk_id, stream_name):
+    """Return the stream position encoded in a ``stream_chunk_id``, or None for other IDs."""
+    prefix = f"{stream_name}:"
+    if chunk_id.startswith(prefix) and chunk_id[len(prefix):].isdigit():
+        return int(chunk_id[len(prefix):])
+    return None
+
+
+def checkpoint_path(persistent_directory):
+    """Return the checkpoint file used for builds into a persistent directory."""
+    return os.path.join(persistent_directory, CHECKPOINT_NAME)
+
+
+def has_checkpoint(persistent_directory):
+    """Return True when a previous build into this directory did not finish."""
+    return os.path.exists(checkpoint_path(persistent_directory))
+
+
+def begin_build(persistent_directory, stream_name):
+    """Mark a build into ``persistent_directory`` as unfinished before anything is written to it.
+
+    Call this before opening the store: opening Chroma creates the directory,
+    and without a checkpoint a build killed during its first batch would
+    leave a directory that looks like a finished store. An interrupted build
+    of the same stream keeps its committed position.
+    """
+    checkpoint = IngestCheckpoint(checkpoint_path(persistent_directory), stream_name)
+    checkpoint.save(checkpoint.committed)
+    return checkpoint
+
+
+class IngestCheckpoint:
+    """Number of chunks already committed to the store by an interrupted build."""
+
+    def __init__(self, path, stream_name):
+        self.path = path
+        self.stream_name = stream_name
+        self.committed = 0
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # A checkpoint for a different stream must not be used to skip chunks
+            if data.get("stream") == stream_name:
+                self.committed = data.get("committed", 0)
+
+    def save(self, committed):
+        self.committed = committed
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stream": self.stream_name, "committed": committed}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _print_progress(stats):
+    embedded = stats["chunks"] - stats["skipped"]
+    rate = embedded / stats["elapsed"] if stats["elapsed"] else 0.0
+    print(
+        f"  batch {stats['batches']}: {stats['chunks']} chunks committed "
+        f"({stats['skipped']} resumed), {rate:.1f} chunks/s"
+    )
+
+
+def stream_into_store(
+    db,
+    chunks,
+    stream_name,
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_pending_batches=DEFAULT_MAX_PENDING_BATCHES,
+    checkpoint_file=None,
+    progress=_print_progress,
+):
+    """Embed and add a stream of chunks to a vector store in fixed-size batches.
+
+    A producer thread pulls chunks from the (lazy) ``chunks`` iterable and hands
+    batches to the embedder through a bounded queue. When embedding falls behind,
+    the producer blocks, so at most ``(max_pending_batches + 2) * batch_size``
+    chunks are in memory regardless of corpus size.
+
+    Chunk IDs are ``"<stream_name>:<position>"``, so re-adding a chunk is an
+    idempotent upsert. After every batch the committed position is written to
+    ``checkpoint_file``; a later run with the same ``stream_name`` skips that
+    many chunks without embedding them. The checkpoint is written before the
+    first chunk is read (see also ``begin_build``) and removed only on success.
+    """
+    checkpoint = IngestCheckpoint(checkpoint_file, stream_name)
+    checkpoint.save(checkpoint.committed)
+    pending = queue.Queue(maxsize=max_pending_batches)
+    errors = []
+    stop = threading.Event()
+
+    def produce():
+        try:
+            iterator = iter(chunks)
+            # Resume: skip chunks an interrupted run already committed
+            position = 0
+            for _ in islice(iterator, checkpoint.committed):
+                position += 1
+            while not stop.is_set():
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    break
+                pending.put((position, batch))
+                position += len(batch)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            pending.put(_DONE)
+
+    producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+    producer.start()
+
+    stats = {
+        "batches": 0,
+        "chunks": checkpoint.committed,
+        "skipped": checkpoint.committed,
+        "elapsed": 0.0,
+    }
+    started = time.perf_counter()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                break
+            position, batch = item
+            ids = [stream_chunk_id(stream_name, position + i) for i in range(len(batch))]
+            db.add_documents(batch, ids=ids)
+            checkpoint.save(position + len(batch))
+            stats["batches"] += 1
+            stats["chunks"] = position + len(batch)
+            stats["elapsed"] = time.perf_counter() - started
+            if progress:
+                progress(dict(stats))
+    finally:
+        stop.set()
+        # Unblock the producer if we are bailing out early
+        while producer.is_alive():
+            try:
+                pending.get_nowait()
+            except queue.Empty:
+                producer.join(timeout=0.1)
+
+    if errors:
+        raise errors[0]
+    checkpoint.clear()
+    return stats
+
+
+def add_in_batches(db, documents, ids, batch_size=DEFAULT_BATCH_SIZE):
+    """Add already-split documents to a store, embedding one batch at a time."""
+    for start in range(0, len(documents), batch_size):
+        db.add_documents(
+            documents[start:start + batch_size], ids=ids[start:start + batch_size]
+        )
@@ -0,0 +1,639 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import ConfigDict, Field
+
+from embedding_cache import embed_queries
+from ingest_manifest import index_version
+from mmr import DEFAULT_FETCH_K, DEFAULT_LAMBDA_MULT, mmr_select
+from quantization import (
+    CODE_NORMS_NAME,
+    CODES_NAME,
+    DEFAULT_PQ_SUBSPACES,
+    QUANTIZER_NAME,
+    load_quantizer,
+    recall_at_k,
+    save_quantizer,
+    train_quantizer,
+)
+
+INDEX_INFO_NAME = "index.json"
+VECTORS_NAME = "vectors.npy"
+NORMS_NAME = "norms.npy"
+OFFSETS_NAME = "offsets.npy"
+RECORDS_NAME = "records.jsonl"
+METADATA_ROWS_NAME = "metadata_rows.npy"
+INDEX_FORMAT = 1
+# Rows scored per matrix product; bounds the temporary distance matrix
+DEFAULT_BLOCK_ROWS = 65536
+EXPORT_BATCH_SIZE = 5000
+DEFAULT_PARTITION_KEY = "source"
+# Compressed searches re-score this many times k candidates at full precision
+DEFAULT_RESCORE_FACTOR = 4
+
+# Same mapping from distance to relevance score as langchain's Chroma wrapper
+RELEVANCE_SCORE_FNS = {
+    "l2": VectorStore._euclidean_relevance_score_fn,
+    "cosine": VectorStore._cosine_relevance_score_fn,
+    "ip": VectorStore._max_inner_product_relevance_score_fn,
+}
+
+
+def default_index_dir(persist_directory):
+    """Return where the exported index of a Chroma directory lives by default."""
+    return os.path.normpath(persist_directory) + "_npy"
+
+
+def _value_key(value):
+    """Stable string key for a metadata value (keeps "1" and 1 apart)."""
+    return json.dumps(value, sort_keys=True)
+
+
+def export_chroma(
+    persist_directory,
+    index_dir=None,
+    dtype="float32",
+    batch_size=EXPORT_BATCH_SIZE,
+    partition_key=DEFAULT_PARTITION_KEY,
+    metadata_keys=(DEFAULT_PARTITION_KEY,),
+    quantization=None,
+    pq_subspaces=DEFAULT_PQ_SUBSPACES,
+    keep_vectors=True,
+):
+    """Export a persisted Chroma store into a read-only memory-mappable index.
+
+    The directory holds ``vectors.npy`` (one contiguous row per chunk in
+    ``dtype``), ``norms.npy`` (squared row norms), ``records.jsonl`` with the
+    ID, text and metadata of each row, ``offsets.npy`` (byte offset of each
+    record) and ``index.json``. It is built next to the target and swapped in
+    with ``os.replace`` so readers never see a half-written index.
+
+    Rows are grouped by the ``partition_key`` metadata value, so each value
+    (e.g. one book) is a contiguous row range recorded in ``index.json``. For
+    every key in ``metadata_keys`` the rows holding each value are also written
+    to ``metadata_rows.npy``, so filtered searches only touch matching rows.
+
+    With ``quantization`` ("sq8" or "pq", see ``quantization.py``) compressed
+    ``codes.npy`` are written too and searches scan those instead of the
+    float vectors. ``keep_vectors=False`` then drops ``vectors.npy`` entirely,
+    giving up full-precision re-scoring for the smallest index.
+    """
+    from langchain_community.vectorstores import Chroma
+
+    index_dir = index_dir or default_index_dir(persist_directory)
+    source_version = index_version(persist_directory)
+    collection = Chroma(persist_directory=persist_directory)._collection
+    metric = (collection.metadata or {}).get("hnsw:space", "l2")
+    count = collection.count()
+    if count == 0:
+        raise ValueError(f"The store in {persist_directory} is empty.")
+
+    # First pass: IDs and metadata only, to lay rows out partition by partition
+    ids, metadatas = [], []
+    for offset in range(0, count, batch_size):
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        ids.extend(batch["ids"])
+        metadatas.extend(metadata or {} for metadata in batch["metadatas"])
+    count = len(ids)
+
+    def partition_sort_key(i):
+        if partition_key not in metadatas[i]:
+            return (1, "")
+        return (0, _value_key(metadatas[i][partition_key]))
+
+    order = sorted(range(count), key=partition_sort_key)
+
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    vectors = None
+    norms = np.empty(count, dtype=np.float32)
+    offsets = np.empty(count + 1, dtype=np.uint64)
+    with open(os.path.join(tmp_dir, RECORDS_NAME), "wb") as records:
+        for start in range(0, count, batch_size):
+            rows = order[start:start + batch_size]
+            batch = collection.get(ids=[ids[i] for i in rows], include=["embeddings", "documents"])
+            # get() does not promise to return rows in the order asked for
+            position = {chunk_id: j for j, chunk_id in enumerate(batch["ids"])}
+            picked = [position[ids[i]] for i in rows]
+            embeddings = np.asarray(batch["embeddings"], dtype=np.float32)[picked]
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    os.path.join(tmp_dir, VECTORS_NAME),
+                    mode="w+",
+                    dtype=dtype,
+                    shape=(count, embeddings.shape[1]),
+                )
+            end = start + len(rows)
+            vectors[start:end] = embeddings
+            stored = np.asarray(vectors[start:end], dtype=np.float32)
+            norms[start:end] = np.einsum("ij,ij->i", stored, stored)
+            for row, i, j in zip(range(start, end), rows, picked):
+                offsets[row] = records.tell()
+                record = [ids[i], batch["documents"][j], metadatas[i]]
+                records.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+                records.write(b"\n")
+        offsets[count] = records.tell()
+
+    vectors.flush()
+    if quantization:
+        kwargs = {"subspaces": pq_subspaces} if quantization == "pq" else {}
+        quantizer = train_quantizer(quantization, vectors, **kwargs)
+        codes = None
+        code_norms = np.empty(count, dtype=np.float32)
+        for start in range(0, count, batch_size):
+            block_codes = quantizer.encode(vectors[start:start + batch_size])
+            if codes is None:
+                codes = np.lib.format.open_memmap(
+                    os.path.join(tmp_dir, CODES_NAME),
+                    mode="w+",
+                    dtype=block_codes.dtype,
+                    shape=(count, block_codes.shape[1]),
+                )
+            codes[start:start + len(block_codes)] = block_codes
+            decoded = quantizer.decode(block_codes)
+            code_norms[start:start + len(block_codes)] = np.einsum("ij,ij->i", decoded, decoded)
+        codes.flush()
+        del codes
+        save_quantizer(quantizer, os.path.join(tmp_dir, QUANTIZER_NAME))
+        np.save(os.path.join(tmp_dir, CODE_NORMS_NAME), code_norms)
+    dim = vectors.shape[1]
+    del vectors
+    if quantization and not keep_vectors:
+        os.remove(os.path.join(tmp_dir, VECTORS_NAME))
+    np.save(os.path.join(tmp_dir, NORMS_NAME), norms)
+    np.save(os.path.join(tmp_dir, OFFSETS_NAME), offsets)
+
+    # Partition ranges and metadata -> rows postings
+    partitions = {}
+    for row, i in enumerate(order):
+        if partition_key in metadatas[i]:
+            value = _value_key(metadatas[i][partition_key])
+            partitions.setdefault(value, [row, row])[1] = row + 1
+    metadata_index, postings = {}, []
+    for key in metadata_keys:
+        rows_by_value = {}
+        for row, i in enumerate(order):
+            if key in metadatas[i]:
+                rows_by_value.setdefault(_value_key(metadatas[i][key]), []).append(row)
+        metadata_index[key] = {}
+        for value, rows in rows_by_value.items():
+            metadata_index[key][value] = [len(postings), len(rows)]
+            postings.extend(rows)
+    np.save(os.path.join(tmp_dir, METADATA_ROWS_NAME), np.asarray(postings, dtype=np.uint32))
+
+    with open(os.path.join(tmp_dir, INDEX_INFO_NAME), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "format": INDEX_FORMAT,
+                "count": count,
+                "dim": dim,
+                "dtype": np.dtype(dtype).name,
+                "quantization": quantization,
+                "metric": metric,
+                "source": os.path.abspath(persist_directory),
+                "source_version": source_version,
+                "partition_key": partition_key,
+                "partitions": partitions,
+                "metadata_index": metadata_index,
+            },
+            f,
+            indent=2,
+        )
+
+    # Swap the new index in; readers holding the old files keep their mappings
+    old_dir = index_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return index_dir
+
+
+class MmapVectorIndex:
+    """Read-only exact vector index over memory-mapped NumPy files.
+
+    Opening an index maps the files without reading them, so startup is
+    near-instant and every process serving the same index shares its pages
+    through the OS page cache. Search is exact: rows are scored in blocks of
+    ``block_rows`` with one matrix product per block, using the same distance
+    as the Chroma collection it was exported from.
+
+    A quantized index is searched over its codes instead, with asymmetric
+    distances (float query against decoded rows); the best
+    ``rescore_factor * k`` candidates are then re-scored against the float
+    vectors, when the export kept them. Only the codes and the candidates'
+    vector pages are read, so resident memory follows the code size.
+    """
+
+    def __init__(self, index_dir, block_rows=DEFAULT_BLOCK_ROWS):
+        self.index_dir = index_dir
+        self.block_rows = block_rows
+        with open(os.path.join(index_dir, INDEX_INFO_NAME), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        if self.info.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format in {index_dir}: {self.info.get('format')}")
+        self.metric = self.info["metric"]
+        vectors_path = os.path.join(index_dir, VECTORS_NAME)
+        self.vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        self.quantizer = self.codes = self.code_norms = None
+        if self.info.get("quantization"):
+            self.quantizer = load_quantizer(os.path.join(index_dir, QUANTIZER_NAME))
+            self.codes = np.load(os.path.join(index_dir, CODES_NAME), mmap_mode="r")
+            self.code_norms = np.load(os.path.join(index_dir, CODE_NORMS_NAME), mmap_mode="r")
+        self.norms = np.load(os.path.join(index_dir, NORMS_NAME), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_NAME), mmap_mode="r")
+        self._records_fd = os.open(os.path.join(index_dir, RECORDS_NAME), os.O_RDONLY)
+        self.partition_key = self.info.get("partition_key")
+        self.partitions = self.info.get("partitions", {})
+        self.metadata_index = self.info.get("metadata_index", {})
+        metadata_rows_path = os.path.join(index_dir, METADATA_ROWS_NAME)
+        self.metadata_rows = (
+            np.load(metadata_rows_path, mmap_mode="r") if os.path.exists(metadata_rows_path) else None
+        )
+
+    def __len__(self):
+        return self.norms.shape[0]
+
+    @property
+    def dim(self):
+        return self.info.get("dim") or self.vectors.shape[1]
+
+    def is_stale(self):
+        """Return True when the source store was re-ingested after the export."""
+        current = index_version(self.info["source"])
+        return json.loads(json.dumps(current)) != self.info.get("source_version")
+
+    def _distances(self, block, block_norms, queries, query_norms):
+        """Return the (rows x queries) distance matrix for one block of rows."""
+        dots = np.asarray(block, dtype=np.float32) @ queries.T
+        return self._metric_distances(dots, block_norms, query_norms)
+
+    def _metric_distances(self, dots, block_norms, query_norms):
+        if self.metric == "l2":
+            # Squared Euclidean distance, as hnswlib reports it
+            return block_norms[:, None] - 2.0 * dots + query_norms[None, :]
+        if self.metric == "cosine":
+            denominators = np.sqrt(block_norms)[:, None] * np.sqrt(query_norms)[None, :]
+            return 1.0 - dots / np.maximum(denominators, 1e-30)
+        if self.metric == "ip":
+            return 1.0 - dots
+        raise ValueError(f"Unsupported distance metric: {self.metric}")
+
+    def _rows_with_value(self, key, value):
+        value = _value_key(value)
+        if key == self.partition_key:
+            start, end = self.partitions.get(value, (0, 0))
+            return np.arange(start, end)
+        if key in self.metadata_index:
+            start, length = self.metadata_index[key].get(value, (0, 0))
+            return np.asarray(self.metadata_rows[start:start + length], dtype=np.int64)
+        raise ValueError(
+            f"No metadata index for {key!r}; re-export with it in metadata_keys to filter on it."
+        )
+
+    def filter_rows(self, where):
+        """Resolve a Chroma-style ``where`` filter to the sorted rows it matches.
+
+        Supports equality, ``$eq``, ``$in``, ``$and`` and ``$or`` on keys that
+        were indexed at export time.
+        """
+        if "$and" in where or "$or" in where:
+            (operator, clauses), = where.items()
+            selections = [self.filter_rows(clause) for clause in clauses]
+            combine = np.intersect1d if operator == "$and" else np.union1d
+            rows = selections[0]
+            for selection in selections[1:]:
+                rows = combine(rows, selection)
+            return rows
+        if len(where) > 1:
+            return self.filter_rows({"$and": [{key: value} for key, value in where.items()]})
+        (key, condition), = where.items()
+        if isinstance(condition, dict):
+            (operator, value), = condition.items()
+            if operator == "$eq":
+                values = [value]
+            elif operator == "$in":
+                values = value
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+        else:
+            values = [condition]
+        selections = [self._rows_with_value(key, value) for value in values]
+        return np.unique(np.concatenate(selections)) if selections else np.empty(0, np.int64)
+
+    def _blocks(self, rows):
+        """Yield ``(row_ids, selector)`` blocks covering the selected rows.
+
+        Contiguous runs (a whole partition) are selected as plain slices of the
+        memory maps; scattered rows are gathered a block at a time.
+        """
+        runs = [(0, len(self))]
+        if rows is not None:
+            breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+            starts = np.split(rows, breaks)
+            if len(starts) * 64 > len(rows):
+                # Scattered rows: gather instead of slicing many tiny runs
+                for start in range(0, len(rows), self.block_rows):
+                    block = rows[start:start + self.block_rows]
+                    yield block, block
+                return
+            runs = [(int(run[0]), int(run[-1]) + 1) for run in starts if len(run)]
+        for run_start, run_end in runs:
+            for start in range(run_start, run_end, self.block_rows):
+                end = min(start + self.block_rows, run_end)
+                yield np.arange(start, end), slice(start, end)
+
+    def _scan(self, num_queries, k, rows, block_distances):
+        """Keep the ``k`` smallest of ``block_distances(selector)`` over all blocks."""
+        best_rows = np.empty((num_queries, 0), dtype=np.int64)
+        best_distances = np.empty((num_queries, 0), dtype=np.float32)
+        for block_ids, selector in self._blocks(rows):
+            distances = block_distances(selector).T
+            block_ids = np.broadcast_to(block_ids, distances.shape)
+            if distances.shape[1] > k:
+                top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                distances = np.take_along_axis(distances, top, axis=1)
+                block_ids = np.take_along_axis(block_ids, top, axis=1)
+            # Merge this block's candidates into the running top-k
+            best_rows = np.concatenate([best_rows, block_ids], axis=1)
+            best_distances = np.concatenate([best_distances, distances], axis=1)
+            if best_distances.shape[1] > k:
+                top = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+                best_distances = np.take_along_axis(best_distances, top, axis=1)
+        order = np.argsort(best_distances, axis=1, kind="stable")
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(
+            best_distances, order, axis=1
+        )
+
+    def _rescore(self, candidates, queries, query_norms, k):
+        """Re-rank each query's candidate rows by exact distance and keep ``k``."""
+        best_rows = np.empty((len(queries), k), dtype=np.int64)
+        best_distances = np.empty((len(queries), k), dtype=np.float32)
+        for i, rows in enumerate(candidates):
+            # Ascending rows make the reads from the vectors file sequential
+            rows = np.sort(rows)
+            distances = self._distances(
+                self.vectors[rows], self.norms[rows], queries[i:i + 1], query_norms[i:i + 1]
+            )[:, 0]
+            top = np.argsort(distances, kind="stable")[:k]
+            best_rows[i], best_distances[i] = rows[top], distances[top]
+        return best_rows, best_distances
+
+    def search(self, queries, k, rows=None, exact=None, rescore_factor=DEFAULT_RESCORE_FACTOR):
+        """Return ``(rows, distances)`` of the ``k`` nearest rows for each query.
+
+        ``queries`` is one vector or a 2-D array of vectors; both results have
+        shape ``(len(queries), min(k, candidates))`` sorted by ascending
+        distance. ``rows`` (e.g. from ``filter_rows``) restricts the search to
+        those rows, so its cost scales with the selection, not the index.
+
+        Quantized indexes scan their codes unless ``exact`` is True; the
+        top ``rescore_factor * k`` are re-scored at full precision (pass
+        ``rescore_factor=0`` to return the approximate distances as they are).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        total = len(self) if rows is None else len(rows)
+        k = min(k, total)
+        if k <= 0:
+            return (
+                np.empty((queries.shape[0], 0), dtype=np.int64),
+                np.empty((queries.shape[0], 0), dtype=np.float32),
+            )
+        if exact is None:
+            exact = self.codes is None
+        if exact:
+            if self.vectors is None:
+                raise ValueError(f"{self.index_dir} was exported without full-precision vectors.")
+            return self._scan(
+                len(queries),
+                k,
+                rows,
+                lambda selector: self._distances(
+                    self.vectors[selector], self.norms[selector], queries, query_norms
+                ),
+            )
+        if self.codes is None:
+            raise ValueError(f"{self.index_dir} has no quantized codes.")
+
+        rescore = bool(rescore_factor) and self.vectors is not None
+        fetch_k = min(k * rescore_factor, total) if rescore else k
+        candidates, distances = self._scan(
+            len(queries),
+            fetch_k,
+            rows,
+            lambda selector: self._metric_distances(
+                self.quantizer.dots(self.codes[selector], queries),
+                self.code_norms[selector],
+                query_norms,
+            ),
+        )
+        if not rescore:
+            return candidates, distances
+        return self._rescore(candidates, queries, query_norms, k)
+
+    def check_recall(self, k=10, num_queries=200, rescore_factor=DEFAULT_RESCORE_FACTOR, seed=0):
+        """Measure recall@k of the compressed search against exact search.
+
+        Queries are rows sampled from the index itself. Returns recall without
+        and with full-precision re-scoring of ``rescore_factor * k`` candidates.
+        """
+        if self.codes is None or self.vectors is None:
+            raise ValueError("Recall checks need both quantized codes and full-precision vectors.")
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(self), min(num_queries, len(self)), replace=False))
+        queries = np.asarray(self.vectors[sample], dtype=np.float32)
+        truth, _ = self.search(queries, k, exact=True)
+        approximate, _ = self.search(queries, k, rescore_factor=0)
+        rescored, _ = self.search(queries, k, rescore_factor=rescore_factor)
+        return {
+            "k": k,
+            "queries": len(sample),
+            "quantization": self.info.get("quantization"),
+            "recall": recall_at_k(approximate, truth),
+            "recall_rescored": recall_at_k(rescored, truth),
+            "rescore_factor": rescore_factor,
+        }
+
+    def row_vectors(self, rows):
+        """Return the stored vectors of ``rows`` as float32 (decoded if only codes were kept)."""
+        rows = np.asarray(rows)
+        if self.vectors is not None:
+            return np.asarray(self.vectors[rows], dtype=np.float32)
+        return self.quantizer.decode(np.asarray(self.codes[rows]))
+
+    def record(self, row):
+        """Return ``(id, text, metadata)`` for a row, read from the sidecar."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(os.pread(self._records_fd, end - start, start))
+
+    def document(self, row):
+        chunk_id, text, metadata = self.record(row)
+        return Document(id=chunk_id, page_content=text, metadata=metadata or {})
+
+    def close(self):
+        os.close(self._records_fd)
+
+
+class MmapRetriever(BaseRetriever):
+    """Retriever over an ``MmapVectorIndex`` with ``as_retriever``-style arguments.
+
+    Supports ``search_type`` "similarity", "similarity_score_threshold" and
+    "mmr" (``fetch_k`` candidates re-ranked by ``mmr_select`` using their
+    stored vectors); relevance scores are computed exactly as Chroma's for
+    the same metric. A
+    ``filter`` in ``search_kwargs`` is served from the index's partitions and
+    metadata postings (see ``MmapVectorIndex.filter_rows``). On a quantized
+    index ``exact`` and ``rescore_factor`` are passed to the search.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: MmapVectorIndex
+    embeddings: Embeddings
+    search_type: str = "similarity"
+    search_kwargs: dict = Field(default_factory=dict)
+    exact: bool | None = None
+    rescore_factor: int = DEFAULT_RESCORE_FACTOR
+
+    def model_post_init(self, __context):
+        if self.search_type not in ("similarity", "similarity_score_threshold", "mmr"):
+            raise ValueError(f"search_type of {self.search_type} not allowed.")
+
+    def search_with_scores(self, query_vectors, k=4, score_threshold=None, filter=None):
+        """Return one ``[(document, relevance), ...]`` list per query vector."""
+        relevance_score_fn = RELEVANCE_SCORE_FNS[self.index.metric]
+        selected = self.index.filter_rows(filter) if filter else None
+        rows, distances = self.index.search(
+            query_vectors, k, selected, self.exact, self.rescore_factor
+        )
+        results = []
+        for query_rows, query_distances in zip(rows, distances):
+            hits = []
+            for row, distance in zip(query_rows, query_distances):
+                relevance = relevance_score_fn(float(distance))
+                if score_threshold is not None and relevance < score_threshold:
+                    continue
+                hits.append((self.index.document(int(row)), relevance))
+            results.append(hits)
+        return results
+
+    def mmr_with_scores(
+        self,
+        query_vectors,
+        k=4,
+        fetch_k=DEFAULT_FETCH_K,
+        lambda_mult=DEFAULT_LAMBDA_MULT,
+        filter=None,
+    ):
+        """Like ``search_with_scores``, with each query's hits chosen by MMR from ``fetch_k``."""
+        relevance_score_fn = RELEVANCE_SCORE_FNS[self.index.metric]
+        selected = self.index.filter_rows(filter) if filter else None
+        rows, distances = self.index.search(
+            query_vectors, max(k, fetch_k), selected, self.exact, self.rescore_factor
+        )
+        query_vectors = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        results = []
+        for query_vector, query_rows, query_distances in zip(query_vectors, rows, distances):
+            picked = mmr_select(query_vector, self.index.row_vectors(query_rows), k, lambda_mult)
+            results.append([
+                (
+                    self.index.document(int(query_rows[i])),
+                    relevance_score_fn(float(query_distances[i])),
+                )
+                for i in picked
+            ])
+        return results
+
+    def _search_vectors(self, vectors, search_kwargs):
+        if self.search_type == "mmr":
+            return self.mmr_with_scores(
+                vectors,
+                search_kwargs.get("k", 4),
+                search_kwargs.get("fetch_k", DEFAULT_FETCH_K),
+                search_kwargs.get("lambda_mult", DEFAULT_LAMBDA_MULT),
+                search_kwargs.get("filter"),
+            )
+        score_threshold = None
+        if self.search_type == "similarity_score_threshold":
+            score_threshold = search_kwargs.get("score_threshold")
+        return self.search_with_scores(
+            vectors, search_kwargs.get("k", 4), score_threshold, search_kwargs.get("filter")
+        )
+
+    def search_batch(self, queries, **kwargs):
+        """Retrieve for many queries at once: one ``[(document, relevance), ...]`` per query.
+
+        All queries are embedded in one batched call and scored against the
+        index in one matrix product per block; each list equals what
+        ``invoke`` returns for that query on its own, with scores attached.
+        """
+        search_kwargs = self.search_kwargs | kwargs
+        queries = list(queries)
+        if not queries:
+            return []
+        return self._search_vectors(embed_queries(self.embeddings, queries), search_kwargs)
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        search_kwargs = self.search_kwargs | kwargs
+        vector = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self._search_vectors([vector], search_kwargs)[0]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export a Chroma store into a memory-mapped NumPy index."
+    )
+    parser.add_argument("persist_directory", help="Chroma directory to export")
+    parser.add_argument("--output", help="Index directory (default: <persist_directory>_npy)")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("--partition-key", default=DEFAULT_PARTITION_KEY,
+                        help="Metadata key whose values become contiguous row ranges")
+    parser.add_argument("--metadata-keys", default=DEFAULT_PARTITION_KEY,
+                        help="Comma-separated metadata keys to index for filtering")
+    parser.add_argument("--quantization", choices=["sq8", "pq"],
+                        help="Also write compressed codes: int8 scalar or product quantization")
+    parser.add_argument("--pq-subspaces", type=int, default=DEFAULT_PQ_SUBSPACES)
+    parser.add_argument("--drop-vectors", action="store_true",
+                        help="Keep only the compressed codes (no full-precision re-scoring)")
+    parser.add_argument("--recall-k", type=int, default=10,
+                        help="k for the recall check run after a quantized export")
+    args = parser.parse_args(argv)
+
+    index_dir = export_chroma(
+        args.persist_directory,
+        args.output,
+        args.dtype,
+        partition_key=args.partition_key,
+        metadata_keys=[key for key in args.metadata_keys.split(",") if key],
+        quantization=args.quantization,
+        pq_subspaces=args.pq_subspaces,
+        keep_vectors=not args.drop_vectors,
+    )
+    index = MmapVectorIndex(index_dir)
+    size = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir))
+    print(f"Exported {len(index)} vectors ({index.dim}-d {index.info['dtype']}, "
+          f"{index.metric}) to {index_dir}: {size / 1e6:.1f} MB")
+    if index.codes is not None:
+        print(f"{index.info['quantization']} codes: {index.codes.nbytes / 1e6:.1f} MB "
+              f"({index.codes.shape[1]} bytes per vector)")
+        if index.vectors is not None:
+            report = index.check_recall(k=args.recall_k)
+            print(f"Recall@{report['k']} vs uncompressed over {report['queries']} queries: "
+                  f"{report['recall']:.3f} compressed, {report['recall_rescored']:.3f} "
+                  f"with {report['rescore_factor']}x re-scoring")
+
+
+if __name__ == "__main__":
+    main()
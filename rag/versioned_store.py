@@ -0,0 +1,346 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable
+
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from ingest_manifest import CHROMA_SQLITE_NAME
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BOOKS_DIR = os.path.join(current_dir, "books")
+DEFAULT_STORE_ROOT = os.path.join(current_dir, "db", "chroma_db_with_metadata")
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# <root>/CURRENT names the live version; each version is a complete store
+# (Chroma files, ingest manifest, inverted index) under <root>/versions/
+CURRENT_NAME = "CURRENT"
+VERSIONS_NAME = "versions"
+LOCK_NAME = "rebuild.lock"
+DEFAULT_KEEP_VERSIONS = 2
+
+
+def read_pointer(root):
+    """Return the ``CURRENT`` pointer of a versioned store, or None if it has none."""
+    try:
+        with open(os.path.join(root, CURRENT_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def current_store_dir(root):
+    """Return the directory of the live store under ``root``.
+
+    A root without a pointer that holds a plain Chroma store (one built before
+    versioning) is its own live store; the first rebuild copies it into a
+    version. Returns None when there is no store at all.
+    """
+    pointer = read_pointer(root)
+    if pointer is not None:
+        return os.path.join(root, pointer["path"])
+    if os.path.exists(os.path.join(root, CHROMA_SQLITE_NAME)):
+        return root
+    return None
+
+
+def _version_number(name):
+    try:
+        return int(name[1:]) if name.startswith("v") else None
+    except ValueError:
+        return None
+
+
+def list_versions(root):
+    """Return the version directory names under ``root``, oldest first."""
+    versions_dir = os.path.join(root, VERSIONS_NAME)
+    if not os.path.isdir(versions_dir):
+        return []
+    names = [name for name in os.listdir(versions_dir) if _version_number(name) is not None]
+    return sorted(names, key=_version_number)
+
+
+def publish(root, version, keep=DEFAULT_KEEP_VERSIONS):
+    """Point ``CURRENT`` at a built version, atomically, then prune old versions.
+
+    Readers either see the old pointer or the new one, never a partial file.
+    The ``keep`` newest published versions stay on disk so processes still
+    serving an older one can finish their in-flight queries.
+    """
+    pointer = {
+        "version": version,
+        "path": os.path.join(VERSIONS_NAME, version),
+        "published": time.time(),
+    }
+    path = os.path.join(root, CURRENT_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pointer, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    # Anything newer than the live version is a build that never got published
+    live = _version_number(version)
+    published = [name for name in list_versions(root) if _version_number(name) <= live]
+    retired = published[:-keep] if keep > 0 else published
+    retired += [name for name in list_versions(root) if _version_number(name) > live]
+    for name in retired:
+        shutil.rmtree(os.path.join(root, VERSIONS_NAME, name), ignore_errors=True)
+    return pointer
+
+
+class _RebuildLock:
+    """Exclusive lock file so only one rebuild of a root runs at a time."""
+
+    def __init__(self, root):
+        self.path = os.path.join(root, LOCK_NAME)
+
+    def __enter__(self):
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._stale():
+                    raise RuntimeError(f"A rebuild of {os.path.dirname(self.path)} is running")
+                os.remove(self.path)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return self
+        raise RuntimeError(f"Could not take the rebuild lock {self.path}")
+
+    def _stale(self):
+        """True when the process that took the lock is gone."""
+        try:
+            with open(self.path, "r") as f:
+                pid = int(f.read().strip() or 0)
+            os.kill(pid, 0)
+        except (FileNotFoundError, ValueError, ProcessLookupError):
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def rebuild(root, build, keep=DEFAULT_KEEP_VERSIONS):
+    """Build a new version of the store under ``root`` and publish it.
+
+    The live store is copied into a fresh version directory (it is never
+    written once published, so the copy is consistent), ``build(directory)``
+    updates the copy in place, e.g. an incremental ``update_book_store``,
+    and the pointer is switched only once it is complete. ``build`` returning
+    None means nothing changed: the copy is discarded and the live version
+    kept. Returns the published version name, or None.
+    """
+    os.makedirs(os.path.join(root, VERSIONS_NAME), exist_ok=True)
+    with _RebuildLock(root):
+        live_dir = current_store_dir(root)
+        existing = list_versions(root)
+        version = f"v{(_version_number(existing[-1]) if existing else 0) + 1:06d}"
+        version_dir = os.path.join(root, VERSIONS_NAME, version)
+        if live_dir is not None:
+            shutil.copytree(
+                live_dir,
+                version_dir,
+                ignore=shutil.ignore_patterns(
+                    VERSIONS_NAME, CURRENT_NAME, LOCK_NAME, "rebuild.log", "*.tmp"
+                ),
+            )
+        try:
+            result = build(version_dir)
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        # An unversioned store is published as-is so it moves under the pointer
+        if result is None and read_pointer(root) is not None:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            return None
+        publish(root, version, keep)
+        return version
+
+
+def rebuild_books(root, books_dir=DEFAULT_BOOKS_DIR, model_name=None, keep=DEFAULT_KEEP_VERSIONS):
+    """``rebuild`` with ``books_dir`` ingested by ``book_ingest.update_book_store``."""
+    from book_ingest import update_book_store
+
+    return rebuild(
+        root,
+        lambda directory: update_book_store(books_dir, directory, model_name=model_name),
+        keep,
+    )
+
+
+def start_rebuild(root, books_dir=DEFAULT_BOOKS_DIR, model_name=None, log_path=None):
+    """Run ``rebuild_books`` in a separate process and return its ``Popen``.
+
+    Parsing and embedding run outside the caller, so a chat process keeps
+    answering from the live version meanwhile. Output goes to ``log_path``
+    (default ``<root>/rebuild.log``).
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--root", root, "rebuild"]
+    command += ["--books", books_dir]
+    if model_name:
+        command += ["--model", model_name]
+    os.makedirs(root, exist_ok=True)
+    log = open(log_path or os.path.join(root, "rebuild.log"), "a", encoding="utf-8")
+    try:
+        return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=current_dir)
+    finally:
+        log.close()
+
+
+class VersionedRetriever(BaseRetriever):
+    """Retriever that follows the ``CURRENT`` pointer of a versioned store.
+
+    ``make_retriever(store_dir)`` builds the retriever for one version. Every
+    query stats the pointer file (a few microseconds); when it changes, the new
+    version is opened and warmed with one ``warm_query`` on a background
+    thread while queries keep going to the old one, then swapped in. If the
+    old one has already been pruned, the query waits for the swap instead. Open
+    stores should come from ``runtime.get_vector_store`` so the embedding model
+    is shared and only the new store's files are loaded; ``release(store_dir)``
+    is called with the retired version's directory, e.g.
+    ``runtime.release_vector_store``.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    root: str
+    make_retriever: Callable[[str], BaseRetriever]
+    release: Callable[[str], None] | None = None
+    warm_query: str | None = "warm up"
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _current: BaseRetriever = PrivateAttr()
+    _store_dir: str = PrivateAttr()
+    _version: str | None = PrivateAttr()
+    _seen: tuple | None = PrivateAttr()
+    _loading: threading.Thread | None = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._seen = self._pointer_stamp()
+        store_dir = current_store_dir(self.root)
+        if store_dir is None:
+            raise FileNotFoundError(f"No store in {self.root}; run a rebuild first.")
+        self._current = self.make_retriever(store_dir)
+        self._store_dir = store_dir
+        self._version = (read_pointer(self.root) or {}).get("version")
+
+    @property
+    def version(self):
+        """Name of the version being served (None for an unversioned store)."""
+        return self._version
+
+    @property
+    def store_dir(self):
+        return self._store_dir
+
+    def _pointer_stamp(self):
+        try:
+            stat = os.stat(os.path.join(self.root, CURRENT_NAME))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def refresh(self, wait=False):
+        """Start loading a newly published version, if any; ``wait`` blocks until swapped."""
+        stamp = self._pointer_stamp()
+        with self._lock:
+            if stamp == self._seen or (self._loading and self._loading.is_alive()):
+                loading = self._loading
+            else:
+                self._seen = stamp
+                loading = self._loading = threading.Thread(
+                    target=self._load, name="store-version-load", daemon=True
+                )
+                loading.start()
+        if wait and loading is not None:
+            loading.join()
+
+    def _load(self):
+        pointer = read_pointer(self.root)
+        if pointer is None or pointer["version"] == self._version:
+            return
+        store_dir = os.path.join(self.root, pointer["path"])
+        started = time.perf_counter()
+        try:
+            retriever = self.make_retriever(store_dir)
+            if self.warm_query:
+                retriever.invoke(self.warm_query)
+        except Exception:
+            logger.exception(
+                "Could not open store version %s; still serving %s",
+                pointer["version"],
+                self._version,
+            )
+            with self._lock:
+                # Forget the pointer so the next query tries this version again
+                self._seen = None
+            return
+        with self._lock:
+            retired = self._store_dir
+            self._current, self._store_dir, self._version = (
+                retriever, store_dir, pointer["version"]
+            )
+        logger.info(
+            "Switched to store version %s in %.2f s",
+            pointer["version"],
+            time.perf_counter() - started,
+        )
+        if self.release is not None and retired != store_dir:
+            self.release(retired)
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        self.refresh()
+        if not os.path.isdir(self._store_dir):
+            # Pruned by later rebuilds (``publish`` keeps only the newest
+            # versions) while this process was idle: wait for the live one
+            self.refresh(wait=True)
+        retriever = self._current
+        return retriever.invoke(query, config={"callbacks": run_manager.get_child()}, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild or inspect a versioned book store.")
+    parser.add_argument("--root", default=DEFAULT_STORE_ROOT)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("rebuild", help="Ingest books/ into a new version and publish it")
+    build.add_argument("--books", default=DEFAULT_BOOKS_DIR)
+    build.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    build.add_argument("--keep", type=int, default=DEFAULT_KEEP_VERSIONS)
+    build.add_argument("--background", action="store_true", help="Run in a detached process")
+    commands.add_parser("status", help="Show the live version and the versions on disk")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        if args.background:
+            process = start_rebuild(args.root, args.books, args.model)
+            print(f"Rebuilding in process {process.pid}; log in {args.root}/rebuild.log")
+            return
+        version = rebuild_books(args.root, args.books, args.model, args.keep)
+        print(f"Published {version}" if version else "Store is up to date; nothing published.")
+        return
+
+    print(f"Live store: {current_store_dir(args.root)}")
+    print(f"Pointer: {read_pointer(args.root)}")
+    print(f"Versions on disk: {list_versions(args.root)}")
+
+
+if __name__ == "__main__":
+    main()